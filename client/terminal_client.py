@@ -4,6 +4,15 @@ import websocket
 import threading
 import time
 import sys
+import os
+import json
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.audio_device import AudioDeviceManager
+from modules import audio_codec
+from modules.playback import JitterBuffer, PlaybackThread
+from modules.uplink_gate import UplinkGate, ACTIVITY_END
 
 # --- ഓഡിയോ കോൺഫിഗറേഷനുകൾ (Audio Configurations) ---
 # PyAudio ഇൻപുട്ടിനുള്ള സ്ഥിരമായ കോൺഫിഗറേഷനുകൾ
@@ -16,11 +25,31 @@ RATE = 16000 # Gemini API പ്രതീക്ഷിക്കുന്ന ഓ
 # (ഇത് സാധാരണയായി 24000Hz ആണ്)
 GEMINI_OUTPUT_RATE = 24000 
 
-# --- WebSocket കോൺഫിഗറേഷൻ ---
-WS_URL = "ws://127.0.0.1:5000/connect"
+# അപ്‌ലിങ്ക് കംപ്രഷൻ: 'pcm', 'flac' അല്ലെങ്കിൽ 'ogg_opus' (proxy decodes back to PCM)
+UPLINK_CODEC = audio_codec.check_codec(os.getenv("UPLINK_CODEC", "pcm"))
+uplink_stats = audio_codec.TransportStats()
 
-# PyAudio ഇൻസ്റ്റൻസ്
-p = pyaudio.PyAudio()
+# VAD ഗേറ്റിംഗ്: സംസാരം മാത്രം അയയ്ക്കുന്നു, നിശ്ശബ്ദത activity_start/activity_end സന്ദേശങ്ങളാകുന്നു
+UPLINK_GATING = os.getenv("UPLINK_GATING", "false").lower() in ("1", "true", "yes")
+
+# --- WebSocket കോൺഫിഗറേഷൻ ---
+WS_URL = f"ws://127.0.0.1:5000/connect?codec={UPLINK_CODEC}&gating={int(UPLINK_GATING)}"
+
+# സെഷൻ മുഴുവൻ തുറന്നിരിക്കുന്ന ഓഡിയോ ഉപകരണങ്ങൾ (Mic + Speaker, opened once)
+devices = AudioDeviceManager(rate=RATE,
+                             chunk=CHUNK,
+                             channels=CHANNELS,
+                             format=FORMAT,
+                             output_rate=GEMINI_OUTPUT_RATE)
+
+# ജെമിനി ഓഡിയോയ്ക്കുള്ള ജിറ്റർ ബഫർ: WebSocket ത്രെഡ് ഇവിടെ ചേർക്കുന്നു,
+# പ്ലേബാക്ക് ത്രെഡ് സ്പീക്കറിലേക്ക് എഴുതുന്നു (receive never blocks on the speaker)
+playback_buffer = JitterBuffer(rate=GEMINI_OUTPUT_RATE,
+                               sample_width=devices.sample_width,
+                               channels=CHANNELS,
+                               target_ms=120,
+                               max_ms=3000)
+playback_thread = PlaybackThread(playback_buffer, devices.write)
 
 # ഗ്ലോബൽ സ്റ്റേറ്റുകൾ
 ws_connected = threading.Event()
@@ -30,21 +59,8 @@ ws_connected = threading.Event()
 # --------------------------
 
 try:
-    # PyAudio ഇൻപുട്ട് സ്ട്രീം (മൈക്രോഫോൺ)
-    stream_in = p.open(format=FORMAT,
-                        channels=CHANNELS,
-                        rate=RATE,
-                        input=True,
-                        frames_per_buffer=CHUNK,
-                        input_device_index=None) # ഓട്ടോമാറ്റിക് ആയി ഡിഫോൾട്ട് ഇൻപുട്ട് ഉപകരണം തിരഞ്ഞെടുക്കുന്നു
-    
-    # PyAudio ഔട്ട്പുട്ട് സ്ട്രീം (സ്പീക്കർ പ്ലേബാക്ക്)
-    stream_out = p.open(format=FORMAT,
-                         channels=CHANNELS,
-                         rate=GEMINI_OUTPUT_RATE, 
-                         output=True,
-                         frames_per_buffer=CHUNK,
-                         output_device_index=None) # ഓട്ടോമാറ്റിക് ആയി ഡിഫോൾട്ട് ഔട്ട്പുട്ട് ഉപകരണം തിരഞ്ഞെടുക്കുന്നു
+    # മൈക്രോഫോൺ (callback mode) + സ്പീക്കർ സ്ട്രീമുകൾ ഒരിക്കൽ മാത്രം തുറക്കുന്നു
+    devices.open()
 
     print(f"--- ഓഡിയോ സ്ട്രീമുകൾ സജ്ജമാക്കി (Mic: {RATE}Hz, Speaker: {GEMINI_OUTPUT_RATE}Hz) ---")
 
@@ -58,18 +74,43 @@ except Exception as e:
 # 2. മൈക്രോഫോൺ ഓഡിയോ അയക്കുന്ന ത്രെഡ്
 # --------------------------
 
+def send_events(ws, encoder, events):
+    """ഓഡിയോ (binary) അല്ലെങ്കിൽ കൺട്രോൾ (JSON text) സന്ദേശങ്ങൾ അയയ്ക്കുന്നു."""
+    for kind, payload in events:
+        if kind == 'audio':
+            # ആവശ്യമെങ്കിൽ കംപ്രസ് ചെയ്യുന്നു
+            payload = encoder.write(payload)
+            if payload and ws.connected:
+                ws.send(payload, opcode=websocket.ABNF.OPCODE_BINARY)
+        else:
+            if payload == ACTIVITY_END:
+                # ഓരോ സംസാരവും പ്രത്യേക കംപ്രസ്ഡ് സ്ട്രീം: ബാക്കി ഓഡിയോ activity_end-ന് മുമ്പ്
+                tail = encoder.flush()
+                if tail and ws.connected:
+                    ws.send(tail, opcode=websocket.ABNF.OPCODE_BINARY)
+            if ws.connected:
+                ws.send(json.dumps({"type": payload}))
+
+
 def audio_thread_function(ws):
     """മൈക്രോഫോണിൽ നിന്ന് ഓഡിയോ റീഡ് ചെയ്യുകയും WebSocket വഴി അയയ്ക്കുകയും ചെയ്യുന്നു."""
     print("🎤 ഓഡിയോ സ്ട്രീമിംഗ് ആരംഭിക്കുന്നു. സംസാരിക്കുക...")
+    window = devices.window()
+    encoder = audio_codec.StreamEncoder(UPLINK_CODEC, RATE, CHANNELS, stats=uplink_stats)
+    gate = UplinkGate(rate=RATE) if UPLINK_GATING else None
     
     while ws_connected.is_set():
         try:
             # മൈക്രോഫോണിൽ നിന്ന് ഓഡിയോ ഡാറ്റ റീഡ് ചെയ്യുന്നു
-            audio_data = stream_in.read(CHUNK, exception_on_overflow=False)
+            audio_data = window.read(timeout=0.5)
+            if audio_data is None:
+                continue
+            
+            # ഗേറ്റിംഗ് ഓണാണെങ്കിൽ സംസാരവും pre/post-roll-ഉം മാത്രം
+            events = gate.process(audio_data) if gate else [('audio', audio_data)]
             
             # WebSocket വഴി സെർവറിലേക്ക് അയക്കുന്നു
-            if ws.connected:
-                ws.send(audio_data, opcode=websocket.ABNF.OPCODE_BINARY)
+            send_events(ws, encoder, events)
             
         except IOError as e:
             # ഓഡിയോ ഓവർഫ്ലോ പോലുള്ള പിശകുകൾ സാധാരണമാണ്, അവ ഒഴിവാക്കുന്നു
@@ -81,6 +122,15 @@ def audio_thread_function(ws):
             print(f"ഓഡിയോ ത്രെഡ് പിശക്: {e}")
             break
             
+    if gate:
+        try:
+            send_events(ws, encoder, gate.flush())
+        except Exception:
+            pass
+        print(f"🔇 Uplink gating: {gate.summary()}")
+    encoder.close()
+    if UPLINK_CODEC != "pcm":
+        print(f"📦 Uplink ({UPLINK_CODEC}): {uplink_stats.summary()}")
     print("🎤 ഓഡിയോ ഇൻപുട്ട് സ്ട്രീം നിർത്തുന്നു.")
 
 
@@ -91,14 +141,8 @@ def audio_thread_function(ws):
 def on_message(ws, message):
     """സെർവറിൽ നിന്ന് ഡാറ്റ സ്വീകരിക്കുമ്പോൾ പ്രവർത്തിക്കുന്നു."""
     if isinstance(message, bytes):
-        # ജെമിനിയുടെ ഓഡിയോ പ്രതികരണം (Binary data)
-        try:
-            stream_out.write(message)
-        except IOError as e:
-            # പ്ലേബാക്ക് പിശകുകൾ ഒഴിവാക്കുന്നു
-            if 'Output overflowed' in str(e):
-                return
-            print(f"ഓഡിയോ പ്ലേബാക്ക് പിശക്: {e}")
+        # ജെമിനിയുടെ ഓഡിയോ പ്രതികരണം (Binary data) - പ്ലേബാക്ക് ത്രെഡിനായി ബഫറിലേക്ക്
+        playback_buffer.put(message)
             
     else:
         # ടെക്സ്റ്റ് ഡാറ്റ (ട്രാൻസ്ക്രിപ്റ്റ് അല്ലെങ്കിൽ സ്ട്രിംഗ് പ്രതികരണം)
@@ -146,6 +190,9 @@ if __name__ == "__main__":
                               on_error=on_error,
                               on_close=on_close)
     
+    # പ്ലേബാക്ക് ത്രെഡ് ആരംഭിക്കുന്നു
+    playback_thread.start()
+    
     # WebSocket റണ്ണിംഗ് ആരംഭിക്കുന്നു (ഒരു ബാക്ക്ഗ്രൗണ്ട് ത്രെഡിൽ റൺ ചെയ്യുന്നു)
     ws_thread = threading.Thread(target=ws.run_forever)
     ws_thread.daemon = True
@@ -162,10 +209,8 @@ if __name__ == "__main__":
         # ക്ലീനപ്പ്
         print("ക്ലീനപ്പ്...")
         ws_connected.clear()
-        stream_in.stop_stream()
-        stream_in.close()
-        stream_out.stop_stream()
-        stream_out.close()
-        p.terminate()
+        playback_thread.stop()
+        print(f"🔊 Playback buffer: {playback_buffer.stats()}")
+        devices.close()
         ws.close()
         print("ക്ലയിൻ്റ് വിജയകരമായി അടച്ചു.")
\ No newline at end of file
@@ -20,7 +20,36 @@ SILENCE_TIMEOUT = int(os.getenv('SILENCE_TIMEOUT', 120))
 USE_OFFLINE_TTS = True  # Set to True to use pyttsx3, False for gTTS
 TTS_RATE = 150  # Speech rate for pyttsx3
 TTS_VOLUME = 1.0  # Volume for pyttsx3
+TTS_CACHE_DIR = os.getenv('TTS_CACHE_DIR', 'tts_cache')  # Synthesized audio for repeated phrases
+TTS_CACHE_MAX_MB = int(os.getenv('TTS_CACHE_MAX_MB', 200))  # Per cache (each has its own subdirectory)
 
 # Conversation Settings
 BOT_NAME = "MYG Sales Assistant"
 WELCOME_MESSAGE = "Hello! Welcome to MYG Kerala. I'm your sales assistant. How can I help you today?"
+GOODBYE_MESSAGE = "Thank you for visiting MYG Kerala. Have a great day!"
+GREETING_REPLY = "Hello! How can I help you today?"  # Answer to a bare "hi" (no LLM call)
+
+# Spoken on most sessions; synthesized once at startup and served from the TTS cache
+CANNED_PHRASES = [WELCOME_MESSAGE, GOODBYE_MESSAGE, GREETING_REPLY]
+
+# LLM response cache (repeated queries about unchanged products skip Gemini)
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 256))
+RESPONSE_CACHE_TTL_S = int(os.getenv('RESPONSE_CACHE_TTL_S', 3600))
+
+# LLM prompt budget: estimated input tokens per turn, turns kept verbatim
+# (older ones are summarized) and the size cap of that running summary
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', 700))
+HISTORY_VERBATIM_TURNS = int(os.getenv('HISTORY_VERBATIM_TURNS', 2))
+HISTORY_SUMMARY_TOKENS = int(os.getenv('HISTORY_SUMMARY_TOKENS', 120))
+
+# Static prompt prefix: explicit Gemini context cache (falls back to a system
+# instruction when the model or prefix size does not allow caching; the
+# cache is tried again after LLM_CONTEXT_RETRY_S)
+LLM_CONTEXT_CACHE = os.getenv('LLM_CONTEXT_CACHE', 'true').lower() in ('1', 'true', 'yes')
+LLM_CONTEXT_CACHE_TTL_S = int(os.getenv('LLM_CONTEXT_CACHE_TTL_S', 3600))
+LLM_CONTEXT_RETRY_S = int(os.getenv('LLM_CONTEXT_RETRY_S', 600))
+
+# Async turn deadline (whole turn, or until the first streamed chunk) and the
+# share of it product retrieval may use
+LLM_TURN_DEADLINE_S = float(os.getenv('LLM_TURN_DEADLINE_S', 8))
+RETRIEVAL_TIMEOUT_S = float(os.getenv('RETRIEVAL_TIMEOUT_S', 0.5))
@@ -1,20 +1,21 @@
-from gtts import gTTS
-from playsound import playsound
 import os
-from google import genai
+from modules.llm_gateway import get_gateway
 import chromadb
 from chromadb.utils import embedding_functions
+from modules.response_pipeline import SpeechPipeline
+from modules.tts import default_player, speak_malayalam
 
 # ---------------- TTS ----------------
-def speak_malayalam(text):
-    tts = gTTS(text=text, lang='ml')
-    filename = "response.mp3"
-    tts.save(filename)
-    playsound(filename)
-    os.remove(filename)
+def speak_malayalam_stream(chunks):
+    """Speak a streamed reply, synthesizing each sentence while the previous one plays"""
+    player = default_player()
+    pipeline = SpeechPipeline(synthesize=player.render, play=player.play)
+    text = pipeline.speak(chunks)
+    print(f"⏱️ {pipeline.summary()}")
+    return text
 
 # ---------------- Gemini + RAG ----------------
-def gemini_response(user_text):
+def build_prompt(user_text):
     # Load your Chroma collection
     chroma_client = chromadb.PersistentClient(path="chroma_db")
     collection = chroma_client.get_or_create_collection(
@@ -45,15 +46,18 @@ def gemini_response(user_text):
 
     User query: "{user_text}"
     """
+    return prompt
+
+def gemini_response(user_text):
+    prompt = build_prompt(user_text)
 
     # Call Gemini
-    client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=prompt
-    )
+    return get_gateway(os.getenv("GEMINI_API_KEY")).generate(prompt, model="gemini-2.5-flash")
 
-    return response.text
+def gemini_response_stream(user_text):
+    """Yield the reply as text chunks while Gemini is still generating"""
+    prompt = build_prompt(user_text)
+    yield from get_gateway(os.getenv("GEMINI_API_KEY")).generate_stream(prompt, model="gemini-2.5-flash")
 
 # ---------------- Real-time STT ----------------
 # In your existing real-time STT loop, just replace:
@@ -61,3 +65,5 @@ def gemini_response(user_text):
 # with:
 # response = gemini_response(transcript)
 # speak_malayalam(response)
+# or, to start speaking after the first sentence:
+# speak_malayalam_stream(gemini_response_stream(transcript))
@@ -12,6 +12,7 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'modules'))
 
 from modules.speech_handler import SpeechHandler
 from modules.gemini_llm import GeminiHandler
+import config
 
 # Load environment variables
 load_dotenv()
@@ -41,6 +42,14 @@ def main():
         print(f"\n✗ Error initializing handlers: {e}")
         return
     
+    # Render the fixed welcome/goodbye lines once instead of on every session
+    speech.prewarm(config.CANNED_PHRASES)
+    if gemini.database:
+        speech.load_catalog([p['name'] for p in gemini.database['products']])
+    
+    # Streaming mode speaks the first sentence while Gemini is still generating
+    streaming = os.getenv('LLM_STREAMING', 'false').lower() in ('1', 'true', 'yes')
+    
     print("\n" + "="*70)
     print("SYSTEM READY - Starting conversation...")
     print("="*70)
@@ -64,23 +73,32 @@ def main():
             print("\n" + "="*70)
             print("SESSION ENDED - 2 minutes of silence detected")
             print("="*70)
-            speech.speak("Thank you for visiting MYG Kerala. Have a great day!")
+            speech.speak(config.GOODBYE_MESSAGE)
             break
         
-        # Check for exit keywords
-        if any(word in user_input.lower() for word in ['bye', 'goodbye', 'exit', 'quit', 'thank you bye']):
+        # Check for exit keywords (anywhere in the turn: "no thanks, bye", "I want to quit")
+        if 'goodbye' in gemini.router.terms(user_input):
             print("\n" + "="*70)
             print("SESSION ENDED - Customer said goodbye")
             print("="*70)
-            speech.speak("Thank you for visiting MYG Kerala. Have a great day!")
+            speech.speak(config.GOODBYE_MESSAGE)
             break
         
-        # Generate response from Gemini
-        print("\nBot: ", end="", flush=True)
-        bot_response = gemini.generate_response(user_input)
+        if streaming:
+            # Speak the response sentence by sentence as it is generated
+            speech.speak_stream(gemini.generate_response_stream(user_input))
+        else:
+            # Generate response from Gemini
+            print("\nBot: ", end="", flush=True)
+            bot_response = gemini.generate_response(user_input)
+            
+            # Bot speaks the response
+            speech.speak(bot_response)
         
-        # Bot speaks the response
-        speech.speak(bot_response)
+        if gemini.last_metrics and gemini.last_intent is None:
+            print(f"[LLM: first token {gemini.last_metrics['first_token_ms']:.0f} ms, "
+                  f"total {gemini.last_metrics['total_ms']:.0f} ms, "
+                  f"~{gemini.last_metrics['input_tokens']} input tokens]")
     
     # End of conversation
     if conversation_count >= max_conversations:
@@ -88,8 +106,19 @@ def main():
         print("SESSION ENDED - Maximum conversation limit reached")
         print("="*70)
     
+    speech.close()
+    
     print("\nConversation Summary:")
     print(f"Total exchanges: {conversation_count}")
+    llm = gemini.gateway.stats()
+    latency = llm['models'].get(gemini.model, {}).get('p50_ms')
+    print(f"LLM: {llm['http_requests']} requests over {llm['connections_opened']} connections, "
+          f"p50 {latency} ms")
+    cache = gemini.response_cache.stats()
+    print(f"Response cache: {cache['hits']} hits ({cache['hit_rate']:.0%}), "
+          f"{cache['saved_ms'] / 1000:.1f} s of generation saved")
+    routed = gemini.router.stats()
+    print(f"Answered locally: {routed['local']}/{routed['turns']} turns {routed['intents']}")
     print("\nThank you for using MYG Kerala AI Voice Sales Bot!")
 
 
@@ -1,14 +1,20 @@
 # myg_voicebot_combined.py
 import os
-import queue
-import pyaudio
 import requests
-from gtts import gTTS
-from playsound import playsound
 from google.cloud import speech
-from google import genai
 from dotenv import load_dotenv
 import time
+from modules.endpointing import Endpointer
+from modules.llm_gateway import get_gateway, StaticContext
+from modules.microphone_stream import MicrophoneStream
+from modules import audio_codec
+from modules.response_pipeline import SpeechPipeline
+from modules.tts_cache import TTSCache
+from modules.response_cache import ResponseCache
+from modules.intent_router import IntentRouter, MALAYALAM_TEMPLATES
+from modules.tts import GTTSBackend, GTTS_RATE, LocalBackend, TieredBackend
+from modules.tts_service import TTSService
+from modules.audio_device import AudioDeviceManager
 
 # ------------------ Load Environment ------------------
 load_dotenv()
@@ -19,15 +25,50 @@ API_URL = "http://127.0.0.1:8000"  # Synthetic MCP API
 # ------------------ Config ------------------
 RATE = 16000
 CHUNK = int(RATE / 10)  # 100ms
-SILENCE_THRESHOLD = 2.0  # seconds to wait before processing
+SILENCE_THRESHOLD = 2.0  # upper bound (seconds) on the adaptive end-of-turn wait
+
+# STT upload codec: 'pcm' (LINEAR16), 'flac' or 'ogg_opus'
+STT_CODEC = audio_codec.check_codec(os.getenv("STT_CODEC", "pcm"))
+upload_stats = audio_codec.TransportStats()
+
+# Adaptive end-of-turn wait, shortened when the transcript is stable
+endpointer = Endpointer(base_silence_ms=1000, min_silence_ms=300,
+                        max_silence_ms=SILENCE_THRESHOLD * 1000)
+
+# Stream Gemini replies sentence by sentence into TTS (set STREAM_TTS=false to disable)
+STREAM_TTS = os.getenv("STREAM_TTS", "true").lower() == "true"
+
+# Fixed replies, synthesized once and served from the TTS cache
+FALLBACK_REPLY = """നമസ്കാരം! ഞാൻ നിങ്ങളെ സഹായിക്കാൻ ഇവിടെയുണ്ട്. നിങ്ങൾക്ക് ഏത് തരം ഉൽപ്പന്നമാണ് വേണ്ടത്? Electronics, Home Appliances, Clothing, അതോ മറ്റെന്തെങ്കിലുമോ?"""
+ERROR_REPLY = "ക്ഷമിക്കണം, ഒരു പിശക് സംഭവിച്ചു. ദയവായി വീണ്ടും പറയാമോ?"
+CANNED_PHRASES = [FALLBACK_REPLY, MALAYALAM_TEMPLATES['greeting'], MALAYALAM_TEMPLATES['goodbye']]
+
+# Local TTS tier: short confirmations and error prompts play without a network
+# round trip, and gTTS requests slower than the budget fall back to it
+LOCAL_TTS_ENGINE = os.getenv("LOCAL_TTS_ENGINE", "espeak-ng")  # 'espeak-ng' or 'piper'
+LOCAL_TTS_VOICE = os.getenv("LOCAL_TTS_VOICE", "ml")  # espeak-ng voice or Piper model path
+TTS_LATENCY_BUDGET_MS = int(os.getenv("TTS_LATENCY_BUDGET_MS", 800))
+
+tts_cache = TTSCache(os.getenv("TTS_CACHE_DIR", "tts_cache"), name="mcp_voice_bot",
+                     max_disk_mb=int(os.getenv("TTS_CACHE_MAX_MB", 200)))
 
 # ------------------ TTS ------------------
+# gTTS -> in-memory MP3 -> PCM on one long-lived output stream; requests are
+# synthesized on a small worker pool ahead of playback
+tts_devices = AudioDeviceManager(rate=GTTS_RATE, output_rate=GTTS_RATE)
+tts_backend = TieredBackend(
+    primary=GTTSBackend(lang='ml', rate=tts_devices.output_rate, cache=tts_cache),
+    local=LocalBackend(engine=LOCAL_TTS_ENGINE, voice=LOCAL_TTS_VOICE, rate=tts_devices.output_rate),
+    budget_ms=TTS_LATENCY_BUDGET_MS,
+    local_classes=('short', 'error'),
+    error_phrases=[ERROR_REPLY]
+)
+tts_service = TTSService(tts_backend, tts_devices, workers=2, lookahead=2)
+
 def speak_malayalam(text):
-    tts = gTTS(text=text, lang='ml')
-    filename = "response.mp3"
-    tts.save(filename)
-    playsound(filename)
-    os.remove(filename)
+    tts_service.speak(text)
+
+speech_pipeline = SpeechPipeline(service=tts_service)
 
 # ------------------ MCP API ------------------
 def fetch_products(query=None, category=None, max_price=None, limit=3):
@@ -55,30 +96,77 @@ def fetch_products(query=None, category=None, max_price=None, limit=3):
         print(f"❌ API request failed: {e}")
     return []
 
+def fetch_product(product_id):
+    """Current record for one product (live price / stock for template replies)"""
+    response = requests.get(f"{API_URL}/product/{product_id}", timeout=1)
+    return response.json() if response.status_code == 200 else None
+
+# ------------------ Intent Router ------------------
+# Greetings, goodbyes and "price of X" / "is X in stock" are answered from
+# templates; product names are loaded from the API at startup
+intent_router = IntentRouter(MALAYALAM_TEMPLATES)
+
+def load_catalog():
+    try:
+        response = requests.get(f"{API_URL}/products", params={"limit": 10000}, timeout=5)
+        response.raise_for_status()
+        intent_router.load_catalog(response.json(), name_field="product_name", lookup=fetch_product)
+    except Exception as e:
+        print(f"⚠️ Catalog not loaded, only greetings/goodbyes are answered locally: {e}")
+
+def local_reply(user_text):
+    """Template reply for a deterministic turn, or None"""
+    route = intent_router.route(user_text)
+    if route.reply is not None:
+        print(f"⚡ Intent: {route.intent} ({route.elapsed_ms:.1f} ms)")
+    return route.reply
+
 # ------------------ Gemini ------------------
-def gemini_response(user_text):
-    # Check if greeting or casual conversation
-    greetings = ["നമസ്കാരം", "ഹലോ", "ഹായ്", "സുഖമല്ലേ", "എങ്ങനെയുണ്ട്"]
-    is_greeting = any(greeting in user_text for greeting in greetings)
-    
-    # Extract product keywords
-    product_keywords = ["ലാപ്ടോപ്പ്", "ലാപ്ടോപ്", "laptop", "മൊബൈൽ", "ഫോൺ", "mobile", "phone", "കമ്പ്യൂട്ടർ", "computer"]
-    has_product_intent = any(keyword in user_text.lower() for keyword in product_keywords)
+GEMINI_MODEL = "gemini-2.0-flash-exp"
+
+# Assistant instructions are identical on every turn: registered once as a
+# cached context / system instruction (see main()) instead of resent inline
+SHOPPING_INSTRUCTIONS = """You are a helpful and friendly shopping assistant speaking Malayalam. Your role is to help users find the right products.
+
+Instructions:
+1. Be warm and conversational
+2. Recommend the most relevant products from the list you are given
+3. Ask clarifying questions to understand their needs better (budget, preferred brand, specific features)
+4. Mention key features and prices
+5. If multiple options exist, ask what matters most to them
+6. Always respond in natural, friendly Malayalam
+
+Keep your response concise and engaging."""
+
+static_context = StaticContext(get_gateway(GEMINI_KEY), GEMINI_MODEL,
+                               ttl_s=int(os.getenv("LLM_CONTEXT_CACHE_TTL_S", 3600)),
+                               use_cache=os.getenv("LLM_CONTEXT_CACHE", "true").lower() == "true",
+                               retry_s=int(os.getenv("LLM_CONTEXT_RETRY_S", 600)))
+
+# Replies to repeated queries, keyed by the query and the products fetched
+# for it; a price or stock change in the API results invalidates the entry
+response_cache = ResponseCache(max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 256)),
+                               ttl_s=int(os.getenv("RESPONSE_CACHE_TTL_S", 3600)))
+
+def build_prompt(user_text):
+    """
+    Returns (prompt, None, products) for Gemini, or (None, reply, []) when a
+    canned reply is used without calling the model
+    """
+    # Greeting / product terms (bare greetings never get here - see local_reply)
+    terms = intent_router.terms(user_text)
+    is_greeting = 'greeting' in terms
+    has_product_intent = bool(terms & {'category', 'product'})
     
     if is_greeting and not has_product_intent:
         prompt = f"""
-You are a friendly Malayalam-speaking shopping assistant. The user greeted you.
+The user greeted you.
 
 User said: "{user_text}"
 
 Respond warmly in Malayalam and ask how you can help them today. Keep it friendly and conversational.
 """
-        client = genai.Client(api_key=GEMINI_KEY)
-        response = client.models.generate_content(
-            model="gemini-2.0-flash-exp",
-            contents=prompt
-        )
-        return response.text
+        return prompt, None, []
     
     # Fetch products
     top_products = fetch_products(query=user_text, limit=5)
@@ -91,7 +179,7 @@ Respond warmly in Malayalam and ask how you can help them today. Keep it friendl
             top_products = fetch_products(category="Electronics", limit=5)
     
     if not top_products:
-        return """നമസ്കാരം! ഞാൻ നിങ്ങളെ സഹായിക്കാൻ ഇവിടെയുണ്ട്. നിങ്ങൾക്ക് ഏത് തരം ഉൽപ്പന്നമാണ് വേണ്ടത്? Electronics, Home Appliances, Clothing, അതോ മറ്റെന്തെങ്കിലുമോ?"""
+        return None, FALLBACK_REPLY, []
 
     # Prepare context for Gemini
     context_text = ""
@@ -101,81 +189,54 @@ Respond warmly in Malayalam and ask how you can help them today. Keep it friendl
                         f"Highlights: {p.get('highlights', 'N/A')} | Stock: {p.get('stock_status', 'Available')}\n"
 
     prompt = f"""
-You are a helpful and friendly shopping assistant speaking Malayalam. Your role is to help users find the right products.
-
 Available products:
 {context_text}
 
 User query: "{user_text}"
+"""
+    return prompt, None, top_products
 
-Instructions:
-1. Be warm and conversational
-2. Recommend the most relevant products from the list above
-3. Ask clarifying questions to understand their needs better (budget, preferred brand, specific features)
-4. Mention key features and prices
-5. If multiple options exist, ask what matters most to them
-6. Always respond in natural, friendly Malayalam
+def gemini_response(user_text):
+    reply = local_reply(user_text)
+    if reply is not None:
+        return reply
+    prompt, reply, products = build_prompt(user_text)
+    if reply is not None:
+        return reply
+    version = static_context.version  # Instructions the reply is built on
+    cached = response_cache.get(user_text, products, context=version)
+    if cached is not None:
+        return cached
+    started = time.perf_counter()
+    answer = get_gateway(GEMINI_KEY).generate(prompt, model=GEMINI_MODEL, context=static_context)
+    response_cache.put(user_text, products, None, answer, (time.perf_counter() - started) * 1000, version)
+    return answer
 
-Keep your response concise and engaging.
-"""
-    
-    client = genai.Client(api_key=GEMINI_KEY)
-    response = client.models.generate_content(
-        model="gemini-2.0-flash-exp",
-        contents=prompt
-    )
-    return response.text
+def gemini_response_stream(user_text):
+    """Yield the reply as text chunks while Gemini is still generating"""
+    reply = local_reply(user_text)
+    if reply is not None:
+        yield reply
+        return
+    prompt, reply, products = build_prompt(user_text)
+    if reply is not None:
+        yield reply
+        return
+    version = static_context.version
+    cached = response_cache.get(user_text, products, context=version)
+    if cached is not None:
+        yield cached
+        return
+    started = time.perf_counter()
+    parts = []
+    for chunk in get_gateway(GEMINI_KEY).generate_stream(prompt, model=GEMINI_MODEL, context=static_context):
+        parts.append(chunk)
+        yield chunk
+    response_cache.put(user_text, products, None, "".join(parts), (time.perf_counter() - started) * 1000,
+                       version)
 
 # ------------------ Real-time STT ------------------
-class MicrophoneStream:
-    def __init__(self, rate, chunk):
-        self._rate = rate
-        self._chunk = chunk
-        self._buff = queue.Queue()
-        self.closed = True
-
-    def __enter__(self):
-        self._audio_interface = pyaudio.PyAudio()
-        self._audio_stream = self._audio_interface.open(
-            format=pyaudio.paInt16,
-            channels=1,
-            rate=self._rate,
-            input=True,
-            frames_per_buffer=self._chunk,
-            stream_callback=self._fill_buffer,
-        )
-        self.closed = False
-        return self
-
-    def __exit__(self, type, value, traceback):
-        self._audio_stream.stop_stream()
-        self._audio_stream.close()
-        self.closed = True
-        self._buff.put(None)
-        self._audio_interface.terminate()
-
-    def _fill_buffer(self, in_data, frame_count, time_info, status_flags):
-        self._buff.put(in_data)
-        return None, pyaudio.paContinue
-
-    def generator(self):
-        while not self.closed:
-            chunk = self._buff.get()
-            if chunk is None:
-                return
-            data = [chunk]
-            while True:
-                try:
-                    chunk = self._buff.get(block=False)
-                    if chunk is None:
-                        return
-                    data.append(chunk)
-                except queue.Empty:
-                    break
-            yield b''.join(data)
-
 def listen_print_loop(responses):
-    last_transcript_time = None
     pending_transcript = ""
     
     for response in responses:
@@ -191,46 +252,46 @@ def listen_print_loop(responses):
         
         if result.is_final:
             pending_transcript = transcript
-            last_transcript_time = time.time()
             print(f"🗣️ You said: {transcript}")
         else:
-            # Check if user paused
-            if pending_transcript and last_transcript_time:
-                elapsed = time.time() - last_transcript_time
-                if elapsed >= SILENCE_THRESHOLD:
-                    # Process the pending transcript
-                    user_text = pending_transcript
-                    print(f"\n💭 Processing: {user_text}")
-                    
+            endpointer.update_transcript(transcript)
+        
+        # Process once the adaptive silence window has passed since the last change
+        if pending_transcript:
+            time.sleep(endpointer.remaining_wait())
+            user_text = pending_transcript
+            metrics = endpointer.finish_turn()
+            print(f"\n💭 Processing: {user_text} (endpoint {metrics['endpoint_latency_ms']:.0f} ms)")
+            if STT_CODEC != "pcm":
+                print(f"📦 STT upload ({STT_CODEC}): {upload_stats.summary()}")
+            upload_stats.reset()
+            
+            try:
+                if STREAM_TTS:
+                    answer = speech_pipeline.speak(gemini_response_stream(user_text))
+                    print(f"🤖 Gemini: {answer}")
+                    print(f"⏱️ {speech_pipeline.summary()}\n")
+                else:
                     answer = gemini_response(user_text)
                     print(f"🤖 Gemini: {answer}\n")
                     speak_malayalam(answer)
-                    
-                    # Reset
-                    pending_transcript = ""
-                    last_transcript_time = None
-                    print("🎤 Listening...")
-        
-        # Also process immediately on final if no new speech for threshold time
-        if result.is_final and pending_transcript:
-            time.sleep(SILENCE_THRESHOLD)
-            if pending_transcript:  # Still no new speech
-                user_text = pending_transcript
-                print(f"\n💭 Processing: {user_text}")
-                
-                answer = gemini_response(user_text)
-                print(f"🤖 Gemini: {answer}\n")
-                speak_malayalam(answer)
-                
-                pending_transcript = ""
-                last_transcript_time = None
-                print("🎤 Listening...")
+            except Exception as e:
+                print(f"❌ Response failed: {e}")
+                speak_malayalam(ERROR_REPLY)
+            
+            # Reset
+            pending_transcript = ""
+            endpointer.start_turn()
+            cache = response_cache.stats()
+            print(f"🗄️ Response cache: {cache['hits']}/{cache['hits'] + cache['misses']} hits, "
+                  f"{cache['saved_ms'] / 1000:.1f} s saved")
+            print("🎤 Listening...")
 
 # ------------------ Main ------------------
 def main():
     client = speech.SpeechClient()
     config = speech.RecognitionConfig(
-        encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
+        encoding=getattr(speech.RecognitionConfig.AudioEncoding, audio_codec.stt_encoding(STT_CODEC)),
         sample_rate_hertz=RATE,
         language_code="ml-IN",
         enable_automatic_punctuation=True,
@@ -241,13 +302,26 @@ def main():
         single_utterance=False
     )
 
+    load_catalog()
+    static_context.update(SHOPPING_INSTRUCTIONS)
+    tts_backend.prewarm(CANNED_PHRASES)
+
     print("🎤 നമസ്കാരം! Speak Malayalam now... (Ctrl+C to stop)")
 
+    encoder = audio_codec.StreamEncoder(STT_CODEC, RATE, stats=upload_stats)
+
     with MicrophoneStream(RATE, CHUNK) as stream:
         audio_generator = stream.generator()
-        requests_stream = (speech.StreamingRecognizeRequest(audio_content=chunk) for chunk in audio_generator)
+        encoded_stream = (encoder.write(chunk) for chunk in audio_generator)
+        requests_stream = (speech.StreamingRecognizeRequest(audio_content=data) for data in encoded_stream if data)
         responses = client.streaming_recognize(streaming_config, requests_stream)
-        listen_print_loop(responses)
+        try:
+            listen_print_loop(responses)
+        finally:
+            encoder.close()
+            static_context.close()
+            tts_service.close()
+            tts_devices.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,73 @@
+"""
+Audio Buffer Module
+In-memory capture buffer for PCM audio (no temp files on the hot path)
+"""
+
+import io
+import wave
+
+
+class CaptureBuffer:
+    """
+    Growable PCM buffer backed by a single preallocated bytearray.
+
+    Appends copy into the existing storage and only reallocate (doubling)
+    when capacity runs out, so a buffer reused across turns settles at one
+    allocation. clear() keeps the capacity.
+    """
+
+    def __init__(self, rate=16000, channels=1, sample_width=2, initial_seconds=30):
+        self.rate = rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self._data = bytearray(int(rate * channels * sample_width * initial_seconds))
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def capacity(self):
+        return len(self._data)
+
+    @property
+    def duration(self):
+        """Captured audio length in seconds"""
+        return self._length / (self.rate * self.channels * self.sample_width)
+
+    def clear(self):
+        """Forget captured audio but keep the allocation"""
+        self._length = 0
+
+    def append(self, chunk):
+        """Copy a chunk of PCM into the buffer"""
+        size = len(chunk)
+        if not size:
+            return
+        end = self._length + size
+        if end > len(self._data):
+            self._grow(end)
+        self._data[self._length:end] = chunk
+        self._length = end
+
+    def _grow(self, needed):
+        new_capacity = max(needed, len(self._data) * 2)
+        self._data.extend(bytes(new_capacity - len(self._data)))
+
+    def view(self):
+        """Zero-copy view of the captured audio (valid until the next append)"""
+        return memoryview(self._data)[:self._length]
+
+    def getvalue(self):
+        """Captured audio as bytes"""
+        return bytes(self.view())
+
+    def to_wav(self):
+        """Wrap captured audio in an in-memory WAV container (for archiving)"""
+        out = io.BytesIO()
+        with wave.open(out, 'wb') as wf:
+            wf.setnchannels(self.channels)
+            wf.setsampwidth(self.sample_width)
+            wf.setframerate(self.rate)
+            wf.writeframes(self.view())
+        return out.getvalue()
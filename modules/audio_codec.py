@@ -0,0 +1,264 @@
+"""
+Audio Codec Module
+Optional FLAC / OGG_OPUS compression for audio leaving the process
+(Google STT uploads and the terminal client WebSocket uplink), and
+in-memory decoding of TTS MP3s
+
+The codecs run ffmpeg (a system package, not pip); MP3 decoding runs in
+process with miniaudio when it is installed and falls back to ffmpeg.
+"""
+
+import shutil
+import subprocess
+import threading
+
+try:
+    import miniaudio
+except ImportError:
+    miniaudio = None
+
+# Codec name -> Google STT encoding and ffmpeg output arguments
+CODECS = {
+    'pcm': {
+        'stt_encoding': 'LINEAR16',
+        'ffmpeg_args': None,
+    },
+    'flac': {
+        'stt_encoding': 'FLAC',
+        'ffmpeg_args': ['-c:a', 'flac', '-f', 'flac'],
+    },
+    'ogg_opus': {
+        'stt_encoding': 'OGG_OPUS',
+        # Small Ogg pages so streamed audio is not held back in the muxer
+        'ffmpeg_args': ['-c:a', 'libopus', '-b:a', '24k', '-application', 'voip',
+                        '-frame_duration', '20', '-page_duration', '20000', '-f', 'ogg'],
+    },
+}
+
+FFMPEG = 'ffmpeg'
+
+
+def require_ffmpeg():
+    """Fail with an actionable message instead of a bare FileNotFoundError"""
+    if shutil.which(FFMPEG) is None:
+        raise RuntimeError(f"'{FFMPEG}' not found on PATH. Install ffmpeg (apt install ffmpeg / "
+                           f"brew install ffmpeg), or use the 'pcm' codec and pip install miniaudio "
+                           f"for MP3 decoding.")
+
+
+def check_codec(codec):
+    """Validate a codec name"""
+    if codec not in CODECS:
+        raise ValueError(f"Unknown codec '{codec}', expected one of {list(CODECS)}")
+    return codec
+
+
+def stt_encoding(codec):
+    """Name of the RecognitionConfig.AudioEncoding for a codec"""
+    return CODECS[check_codec(codec)]['stt_encoding']
+
+
+def _pcm_args(rate, channels):
+    return ['-f', 's16le', '-ar', str(rate), '-ac', str(channels)]
+
+
+def _encoder_command(codec, rate, channels):
+    return ([FFMPEG, '-hide_banner', '-loglevel', 'error', '-fflags', 'nobuffer']
+            + _pcm_args(rate, channels) + ['-i', 'pipe:0']
+            + CODECS[codec]['ffmpeg_args'] + ['-flush_packets', '1', 'pipe:1'])
+
+
+def _decoder_command(codec, rate, channels):
+    return ([FFMPEG, '-hide_banner', '-loglevel', 'error', '-fflags', 'nobuffer',
+             '-probesize', '32', '-i', 'pipe:0']
+            + _pcm_args(rate, channels) + ['pipe:1'])
+
+
+class TransportStats:
+    """Bytes before and after compression"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.pcm_bytes = 0
+        self.encoded_bytes = 0
+
+    def add(self, pcm_bytes=0, encoded_bytes=0):
+        self.pcm_bytes += pcm_bytes
+        self.encoded_bytes += encoded_bytes
+
+    @property
+    def saved_bytes(self):
+        return self.pcm_bytes - self.encoded_bytes
+
+    def summary(self):
+        saved = self.saved_bytes
+        percent = saved / self.pcm_bytes * 100 if self.pcm_bytes else 0.0
+        return f"{self.encoded_bytes / 1024:.1f} KB sent, {saved / 1024:.1f} KB saved ({percent:.0f}%)"
+
+
+def encode(pcm, codec='pcm', rate=16000, channels=1, stats=None):
+    """Compress a complete utterance (batch STT)"""
+    check_codec(codec)
+    if codec == 'pcm':
+        data = bytes(pcm)
+    else:
+        require_ffmpeg()
+        result = subprocess.run(_encoder_command(codec, rate, channels),
+                                input=bytes(pcm), stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, check=True)
+        data = result.stdout
+    if stats is not None:
+        stats.add(len(pcm), len(data))
+    return data
+
+
+def decode(data, rate=16000, channels=1):
+    """Decode a complete in-memory file (MP3, WAV, ...) to 16-bit PCM"""
+    if miniaudio is not None:
+        # In process: no ffmpeg start-up per utterance
+        try:
+            decoded = miniaudio.decode(bytes(data), output_format=miniaudio.SampleFormat.SIGNED16,
+                                       nchannels=channels, sample_rate=rate)
+            return decoded.samples.tobytes()
+        except miniaudio.DecodeError:
+            pass  # Format miniaudio does not know: try ffmpeg
+    require_ffmpeg()
+    command = ([FFMPEG, '-hide_banner', '-loglevel', 'error', '-i', 'pipe:0']
+               + _pcm_args(rate, channels) + ['pipe:1'])
+    result = subprocess.run(command, input=bytes(data), stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, check=True)
+    return result.stdout
+
+
+class _FfmpegPipe:
+    """
+    Long-running ffmpeg process fed through stdin.
+    Output is collected on a reader thread so write() never blocks on it,
+    or handed to on_output as soon as it is produced.
+    """
+
+    def __init__(self, command, on_output=None):
+        require_ffmpeg()
+        self._on_output = on_output
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE,
+                                         stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self._output = bytearray()
+        self._lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read_output, daemon=True)
+        self._reader.start()
+
+    def _read_output(self):
+        while True:
+            data = self._process.stdout.read1(4096)
+            if not data:
+                break
+            if self._on_output is not None:
+                self._on_output(data)
+                continue
+            with self._lock:
+                self._output += data
+
+    def _take(self):
+        with self._lock:
+            data = bytes(self._output)
+            self._output.clear()
+        return data
+
+    def write(self, data):
+        """Feed input and return whatever output is ready"""
+        self._process.stdin.write(data)
+        self._process.stdin.flush()
+        return self._take()
+
+    def close(self):
+        """Finish the stream and return the remaining output"""
+        try:
+            self._process.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        self._reader.join(timeout=2)
+        self._process.wait(timeout=2)
+        return self._take()
+
+
+class StreamEncoder:
+    """Incremental PCM -> codec encoder for streaming hops"""
+
+    def __init__(self, codec='pcm', rate=16000, channels=1, stats=None):
+        self.codec = check_codec(codec)
+        self.stats = stats if stats is not None else TransportStats()
+        self._command = None if codec == 'pcm' else _encoder_command(codec, rate, channels)
+        self._pipe = None if codec == 'pcm' else _FfmpegPipe(self._command)
+
+    def write(self, pcm):
+        data = pcm if self._pipe is None else self._pipe.write(pcm)
+        self.stats.add(len(pcm), len(data))
+        return data
+
+    def flush(self):
+        """End the current stream (returns its tail) and start a new one"""
+        data = self.close()
+        if self._command is not None:
+            self._pipe = _FfmpegPipe(self._command)
+        return data
+
+    def close(self):
+        if self._pipe is None:
+            return b""
+        data = self._pipe.close()
+        self.stats.add(0, len(data))
+        return data
+
+
+class StreamDecoder:
+    """
+    Incremental codec -> PCM decoder (e.g. at the proxy)
+    With on_output, decoded PCM is delivered from the reader thread as soon
+    as ffmpeg produces it instead of being returned by the next write().
+    """
+
+    def __init__(self, codec='pcm', rate=16000, channels=1, stats=None, on_output=None):
+        self.codec = check_codec(codec)
+        self.stats = stats if stats is not None else TransportStats()
+        self._on_output = on_output
+        self._command = None if codec == 'pcm' else _decoder_command(codec, rate, channels)
+        self._pipe = None if codec == 'pcm' else self._open()
+
+    def _open(self):
+        return _FfmpegPipe(self._command, on_output=self._deliver if self._on_output else None)
+
+    def _deliver(self, pcm):
+        self.stats.add(len(pcm), 0)
+        self._on_output(pcm)
+
+    def write(self, data):
+        # With on_output the pipe delivers (and counts) PCM itself
+        pcm = data if self._pipe is None else self._pipe.write(data)
+        self.stats.add(len(pcm), len(data))
+        if pcm and self._on_output is not None:
+            self._on_output(pcm)
+            return b""
+        return pcm
+
+    def flush(self):
+        """
+        End the current stream and start a new one (the sender flushed its
+        encoder). Everything decoded so far has been delivered to on_output
+        when this returns; without on_output it is returned.
+        """
+        pcm = self.close()
+        if self._command is not None:
+            self._pipe = self._open()
+        if pcm and self._on_output is not None:
+            self._on_output(pcm)
+            return b""
+        return pcm
+
+    def close(self):
+        if self._pipe is None:
+            return b""
+        pcm = self._pipe.close()
+        self.stats.add(len(pcm), 0)
+        return pcm
@@ -0,0 +1,237 @@
+"""
+Audio Device Module
+Long-lived PyAudio session: devices are opened once and shared across turns
+"""
+
+import collections
+import threading
+import time
+
+import pyaudio
+
+from modules.resample import StreamingResampler
+
+
+class AudioDeviceManager:
+    """
+    Owns the PyAudio instance plus one input and one output stream.
+
+    Capture runs in callback mode for the whole session and fills a ring of
+    recent chunks. Each turn reads from its own CaptureWindow, so PortAudio
+    is never re-initialized between turns and audio arriving just before a
+    window opens can still be included via backlog_ms.
+
+    If a device does not support the requested rate it is opened at its
+    native rate and audio is converted once here (modules.resample) instead
+    of relying on PortAudio/host resampling. Only 16-bit mono is converted.
+    """
+
+    def __init__(self, rate=16000, chunk=1024, channels=1, format=pyaudio.paInt16,
+                 output_rate=None, ring_seconds=5, input_device_index=None,
+                 output_device_index=None):
+        self.rate = rate
+        self.chunk = chunk
+        self.channels = channels
+        self.format = format
+        self.output_rate = output_rate or rate
+        self.input_device_index = input_device_index
+        self.output_device_index = output_device_index
+        self.sample_width = pyaudio.get_sample_size(format)
+
+        ring_chunks = max(1, int(ring_seconds * rate / chunk))
+        self._ring = collections.deque(maxlen=ring_chunks)
+        self._next_seq = 0  # Sequence number of the next chunk to arrive
+        self._cond = threading.Condition()
+
+        self._audio = None
+        self._stream_in = None
+        self._stream_out = None
+
+        # Native device rates and converters (None when no conversion is needed)
+        self.input_device_rate = rate
+        self.output_device_rate = self.output_rate
+        self._in_resampler = None
+        self._out_resampler = None
+
+        # Device open latency in milliseconds
+        self.latency = {}
+
+    # ---------- Lifecycle ----------
+
+    def open(self, input=True, output=True):
+        """Initialize PortAudio and open the requested streams"""
+        if self._audio is None:
+            started = time.perf_counter()
+            self._audio = pyaudio.PyAudio()
+            self.latency['init_ms'] = (time.perf_counter() - started) * 1000
+
+        if input and self._stream_in is None:
+            self.input_device_rate = self._device_rate(self.rate, input=True)
+            if self.input_device_rate != self.rate:
+                self._in_resampler = StreamingResampler(self.input_device_rate, self.rate)
+            started = time.perf_counter()
+            self._stream_in = self._audio.open(
+                format=self.format,
+                channels=self.channels,
+                rate=self.input_device_rate,
+                input=True,
+                frames_per_buffer=int(self.chunk * self.input_device_rate / self.rate),
+                input_device_index=self.input_device_index,
+                stream_callback=self._fill_ring,
+            )
+            self.latency['input_open_ms'] = (time.perf_counter() - started) * 1000
+
+        if output and self._stream_out is None:
+            self.output_device_rate = self._device_rate(self.output_rate, input=False)
+            if self.output_device_rate != self.output_rate:
+                self._out_resampler = StreamingResampler(self.output_rate, self.output_device_rate)
+            started = time.perf_counter()
+            self._stream_out = self._audio.open(
+                format=self.format,
+                channels=self.channels,
+                rate=self.output_device_rate,
+                output=True,
+                frames_per_buffer=self.chunk,
+                output_device_index=self.output_device_index,
+            )
+            self.latency['output_open_ms'] = (time.perf_counter() - started) * 1000
+
+        print("✓ Audio devices opened (" +
+              ", ".join(f"{k}: {v:.1f}" for k, v in self.latency.items()) + ")")
+        for name, device_rate, rate in (("input", self.input_device_rate, self.rate),
+                                        ("output", self.output_device_rate, self.output_rate)):
+            if device_rate != rate:
+                print(f"  {name} device runs at {device_rate} Hz, converting to/from {rate} Hz")
+        return self
+
+    def _device_rate(self, rate, input):
+        """rate if the device supports it, else the device's native rate"""
+        if self.format != pyaudio.paInt16 or self.channels != 1:
+            return rate
+        index = self.input_device_index if input else self.output_device_index
+        try:
+            if input:
+                self._audio.is_format_supported(rate, input_device=index,
+                                                input_channels=self.channels,
+                                                input_format=self.format)
+            else:
+                self._audio.is_format_supported(rate, output_device=index,
+                                                output_channels=self.channels,
+                                                output_format=self.format)
+            return rate
+        except ValueError:
+            if index is None:
+                info = (self._audio.get_default_input_device_info() if input
+                        else self._audio.get_default_output_device_info())
+            else:
+                info = self._audio.get_device_info_by_index(index)
+            return int(info['defaultSampleRate'])
+
+    def close(self):
+        """Stop streams and release PortAudio"""
+        for stream in (self._stream_in, self._stream_out):
+            if stream is not None:
+                try:
+                    stream.stop_stream()
+                    stream.close()
+                except Exception:
+                    pass
+        self._stream_in = None
+        self._stream_out = None
+
+        if self._audio is not None:
+            self._audio.terminate()
+            self._audio = None
+
+        # Wake any reader blocked on the ring
+        with self._cond:
+            self._cond.notify_all()
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    @property
+    def is_open(self):
+        return self._stream_in is not None
+
+    # ---------- Capture ----------
+
+    def _fill_ring(self, in_data, frame_count, time_info, status_flags):
+        """PortAudio callback: store the chunk and wake readers"""
+        if self._in_resampler is not None:
+            in_data = self._in_resampler.process_bytes(in_data)
+        with self._cond:
+            self._ring.append(in_data)
+            self._next_seq += 1
+            self._cond.notify_all()
+        return None, pyaudio.paContinue
+
+    def window(self, backlog_ms=0):
+        """
+        Start a per-turn read window
+        Args:
+            backlog_ms: Include this much already-captured audio
+        """
+        if not self.is_open:
+            self.open(output=False)
+        backlog = int(backlog_ms / 1000 * self.rate / self.chunk)
+        with self._cond:
+            start = max(self._next_seq - backlog, self._next_seq - len(self._ring))
+        return CaptureWindow(self, start)
+
+    def _read(self, seq, timeout):
+        """Return (chunk, next_seq, dropped) for a window cursor"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: seq < self._next_seq or not self.is_open,
+                                       timeout=timeout):
+                return None, seq, 0
+            if seq >= self._next_seq:
+                return None, seq, 0
+
+            # Reader fell behind the ring: skip to the oldest chunk still held
+            oldest = self._next_seq - len(self._ring)
+            dropped = 0
+            if seq < oldest:
+                dropped = oldest - seq
+                seq = oldest
+            return self._ring[seq - oldest], seq + 1, dropped
+
+    # ---------- Playback ----------
+
+    def write(self, data):
+        """Play PCM on the shared output stream (blocking)"""
+        if self._stream_out is None:
+            self.open(input=False)
+        if self._out_resampler is not None:
+            data = self._out_resampler.process_bytes(data)
+        self._stream_out.write(data)
+
+
+class CaptureWindow:
+    """Sequential reader over the device manager's capture ring"""
+
+    def __init__(self, manager, start_seq):
+        self._manager = manager
+        self._seq = start_seq
+        self.dropped_chunks = 0
+
+    def read(self, timeout=1.0):
+        """Next captured chunk, or None if nothing arrived within timeout"""
+        chunk, self._seq, dropped = self._manager._read(self._seq, timeout)
+        self.dropped_chunks += dropped
+        return chunk
+
+    def __iter__(self):
+        while self._manager.is_open:
+            chunk = self.read()
+            if chunk is not None:
+                yield chunk
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        pass
@@ -0,0 +1,131 @@
+"""
+Barge-in Module
+Keeps listening while the bot talks and cancels playback when the customer
+starts speaking
+"""
+
+import threading
+
+from modules.vad import VoiceActivityDetector
+
+
+class BargeInMonitor:
+    """
+    Watches the shared microphone during playback.
+
+    When the VAD detects speech, on_barge_in callbacks fire (to cancel
+    playback) and the monitor stops reading. take() then returns the capture
+    window - positioned right after the detected onset - together with the
+    pre-roll + onset audio, so the next listen() continues the same utterance
+    without losing its start.
+
+    There is no echo cancellation. Instead, a frame only counts as speech
+    if the VAD says so and it is louder than the bot's own voice picked up
+    by the mic: echo_ratio times the tracked playback level, and at least
+    energy_threshold. Default onset (90 ms) plus the capture read keeps
+    the interruption around 100 ms.
+    """
+
+    def __init__(self, devices, rate=16000, frame_ms=30, onset_ms=90,
+                 aggressiveness=3, energy_threshold=800, echo_ratio=2.5, warmup_ms=150,
+                 preroll_ms=300):
+        """
+        Args:
+            onset_ms: Speech needed before playback is cancelled
+            energy_threshold: Minimum mean amplitude of a speech frame
+            echo_ratio: How much louder than the playback echo speech must be
+            warmup_ms: Playback heard before barge-in is armed (echo level)
+        """
+        self.devices = devices
+        self.energy_threshold = energy_threshold
+        self.echo_ratio = echo_ratio
+        self.warmup_ms = warmup_ms
+        self.echo_level = None  # Mic level while the bot talks
+        self._heard_ms = 0.0
+        self.vad = VoiceActivityDetector(
+            rate=rate,
+            frame_ms=frame_ms,
+            aggressiveness=aggressiveness,
+            preroll_ms=preroll_ms,
+            onset_ms=onset_ms,
+            energy_threshold=energy_threshold,
+            energy_gate=True
+        )
+        self.triggered = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._window = None
+        self._audio = b""
+        self._callbacks = []
+
+    def on_barge_in(self, callback):
+        """Register callback() to run when speech is detected"""
+        self._callbacks.append(callback)
+
+    def start(self):
+        """Begin monitoring (call right before playback starts)"""
+        self.stop()
+        self.vad.reset()
+        self.vad.energy_threshold = self.energy_threshold
+        self.echo_level = None
+        self._heard_ms = 0.0
+        self.triggered.clear()
+        self._stop.clear()
+        self._audio = b""
+        self._window = self.devices.window()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            data = self._window.read(timeout=0.05)
+            if data is None:
+                continue
+            if not self._track_echo(data):
+                continue
+            voiced = self.vad.process(data)
+            if self.vad.speech_started:
+                self._audio = voiced
+                self.triggered.set()
+                for callback in self._callbacks:
+                    callback()
+                return
+
+    def _track_echo(self, data):
+        """
+        Follow the playback level picked up by the mic. The first
+        warmup_ms of playback only measure it (no barge-in); after that,
+        only audio below the threshold updates it, so a customer talking
+        over the bot does not raise it.
+        Returns False while warming up.
+        """
+        energy = self.vad.frame_energy(data)
+        self._heard_ms += len(data) / 2 / self.vad.rate * 1000
+        if self.echo_level is None:
+            self.echo_level = energy
+        elif self._heard_ms <= self.warmup_ms:
+            self.echo_level = max(energy, self.echo_level)
+        elif energy <= self.vad.energy_threshold:
+            self.echo_level += 0.1 * (energy - self.echo_level)
+        self.vad.energy_threshold = max(self.energy_threshold, self.echo_level * self.echo_ratio)
+        return self._heard_ms > self.warmup_ms
+
+    def stop(self):
+        """Stop monitoring (call when playback finishes)"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def take(self):
+        """
+        (window, audio) captured by a barge-in, or None
+        Clears the result so it is handed out only once.
+        """
+        if not self.triggered.is_set():
+            return None
+        self.triggered.clear()
+        result = (self._window, self._audio)
+        self._window = None
+        self._audio = b""
+        return result
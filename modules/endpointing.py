@@ -0,0 +1,259 @@
+"""
+Endpointing Module
+Adaptive end-of-turn detection: noise-floor tracking and a trailing-silence
+window that shrinks for fast speakers and stable transcripts
+"""
+
+import time
+from array import array
+
+from modules.vad import VoiceActivityDetector
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class Endpointer:
+    """
+    Decides when the customer has finished speaking.
+
+    The noise floor is calibrated from the first calibration_ms of audio in
+    a session and then tracked on every non-speech chunk. The VAD energy
+    threshold (and webrtcvad mode) follow the floor, and the trailing-silence
+    window is recomputed from the speaker's rate and transcript stability.
+    """
+
+    def __init__(self, vad=None, base_silence_ms=800, min_silence_ms=300,
+                 max_silence_ms=2000, calibration_ms=500, threshold_ratio=3.0,
+                 min_threshold=300, reference_rate=4.0, stable_ms=400):
+        """
+        Args:
+            vad: VoiceActivityDetector to adapt (optional for transcript-only use)
+            base_silence_ms: Trailing silence for an average speaker
+            min_silence_ms / max_silence_ms: Bounds for the adaptive window
+            calibration_ms: Audio used for the initial noise-floor estimate
+            threshold_ratio: Speech threshold as a multiple of the noise floor
+            min_threshold: Lowest energy threshold ever used
+            reference_rate: Speech bursts per second of an average speaker
+            stable_ms: Interim transcript unchanged this long counts as stable
+        """
+        self.vad = vad
+        self.base_silence_ms = base_silence_ms
+        self.min_silence_ms = min_silence_ms
+        self.max_silence_ms = max_silence_ms
+        self.calibration_ms = calibration_ms
+        self.threshold_ratio = threshold_ratio
+        self.min_threshold = min_threshold
+        self.reference_rate = reference_rate
+        self.stable_ms = stable_ms
+
+        self.noise_floor = None
+        self._calibrated_ms = 0.0
+
+        # Per-turn endpoint metrics, most recent last
+        self.history = []
+
+        self.start_turn()
+
+    # ---------- Noise floor ----------
+
+    @staticmethod
+    def chunk_energy(chunk):
+        """Mean absolute amplitude of 16-bit PCM"""
+        if np is not None:
+            samples = np.frombuffer(chunk, dtype=np.int16)
+            return float(np.abs(samples.astype(np.int32)).mean()) if samples.size else 0.0
+        samples = array('h', chunk)
+        return sum(map(abs, samples)) / len(samples) if samples else 0.0
+
+    @property
+    def calibrated(self):
+        return self._calibrated_ms >= self.calibration_ms
+
+    def observe(self, chunk, rate=16000):
+        """Update the noise floor from a chunk captured outside of speech"""
+        if not chunk or (self.vad is not None and self.vad.in_speech):
+            return
+
+        energy = self.chunk_energy(chunk)
+        duration_ms = len(chunk) / 2 / rate * 1000
+
+        if self.noise_floor is None:
+            self.noise_floor = energy
+        elif not self.calibrated:
+            # Fast average while calibrating, then slow tracking
+            weight = duration_ms / max(self._calibrated_ms + duration_ms, 1)
+            self.noise_floor += (energy - self.noise_floor) * weight
+        elif energy < self.noise_floor * self.threshold_ratio:
+            self.noise_floor += (energy - self.noise_floor) * 0.05
+        self._calibrated_ms += duration_ms
+
+        self._adapt_vad()
+
+    def calibrate(self, chunks, rate=16000):
+        """Estimate the noise floor from room audio captured at session start"""
+        for chunk in chunks:
+            self.observe(chunk, rate)
+        print(f"✓ Noise floor calibrated: {self.noise_floor or 0:.0f}")
+
+    def _adapt_vad(self):
+        if self.vad is None or self.noise_floor is None:
+            return
+        self.vad.energy_threshold = max(self.min_threshold,
+                                        self.noise_floor * self.threshold_ratio)
+        # Noisy showroom: filter harder
+        self.vad.set_aggressiveness(3 if self.noise_floor > self.min_threshold else 2)
+
+    # ---------- Turn tracking ----------
+
+    def start_turn(self):
+        """Reset per-turn state"""
+        self._transcript = ""
+        self._transcript_changed = None
+        self._last_speech_time = None
+        self.silence_ms = self.base_silence_ms
+
+    def update_transcript(self, text):
+        """Record an interim transcript (streaming STT)"""
+        if text != self._transcript:
+            self._transcript = text
+            self._transcript_changed = time.time()
+
+    def mark_speech(self, at=None):
+        """Record that speech was heard just now (or at the given time.time())"""
+        self._last_speech_time = time.time() if at is None else at
+
+    def speech_rate(self):
+        """Speech bursts per second since onset (None if unknown)"""
+        if self.vad is None or self.vad.speech_frames < 10:
+            return None
+        seconds = self.vad.speech_frames * self.vad.frame_ms / 1000
+        return self.vad.speech_bursts / seconds
+
+    def transcript_stable(self):
+        return (self._transcript_changed is not None and
+                (time.time() - self._transcript_changed) * 1000 >= self.stable_ms)
+
+    def required_silence_ms(self):
+        """Trailing silence needed to end the current turn"""
+        silence = self.base_silence_ms
+
+        rate = self.speech_rate()
+        if rate:
+            # Fast speakers pause briefly between phrases, slow ones longer
+            silence *= min(1.5, max(0.6, self.reference_rate / rate))
+
+        if self.transcript_stable():
+            silence *= 0.6
+
+        self.silence_ms = min(self.max_silence_ms, max(self.min_silence_ms, silence))
+        return self.silence_ms
+
+    def update(self):
+        """Push the current silence window into the VAD hangover"""
+        if self.vad is not None:
+            self.vad.set_hangover_ms(self.required_silence_ms())
+
+    def remaining_wait(self):
+        """Seconds still to wait before ending the turn (streaming, no VAD)"""
+        reference = self._transcript_changed or self._last_speech_time
+        if reference is None:
+            return 0.0
+        elapsed_ms = (time.time() - reference) * 1000
+        return max(0.0, self.required_silence_ms() - elapsed_ms) / 1000
+
+    def finish_turn(self):
+        """
+        Record endpoint metrics for the turn (call when the turn is decided)
+        Endpoint latency is the time from the last voiced frame (or, without
+        a VAD, the last transcript change) to the decision.
+        """
+        reference = self._last_speech_time or self._transcript_changed
+        latency_ms = (time.time() - reference) * 1000 if reference else 0.0
+
+        metrics = {
+            "endpoint_latency_ms": round(latency_ms, 1),
+            "silence_window_ms": round(self.silence_ms, 1),
+            "noise_floor": round(self.noise_floor or 0, 1),
+            "speech_rate": self.speech_rate(),
+        }
+        self.history.append(metrics)
+        return metrics
+
+    @property
+    def last_metrics(self):
+        return self.history[-1] if self.history else None
+
+
+class UtteranceDetector:
+    """
+    Per-chunk capture logic shared by SpeechHandler.listen and the offline
+    benchmark: VAD framing, noise-floor tracking and adaptive hangover.
+    """
+
+    def __init__(self, rate=16000, frame_ms=30, preroll_ms=300, energy_threshold=500,
+                 base_silence_ms=800, min_silence_ms=300, max_silence_ms=2000):
+        self.rate = rate
+        self.vad = VoiceActivityDetector(
+            rate=rate,
+            frame_ms=frame_ms,
+            preroll_ms=preroll_ms,
+            hangover_ms=base_silence_ms,
+            energy_threshold=energy_threshold,
+            energy_gate=True  # The tracked noise floor applies with webrtcvad too
+        )
+        self.endpointer = Endpointer(
+            vad=self.vad,
+            base_silence_ms=base_silence_ms,
+            min_silence_ms=min_silence_ms,
+            max_silence_ms=max_silence_ms
+        )
+
+    def start_turn(self):
+        self.vad.reset()
+        self.endpointer.start_turn()
+
+    def calibrate(self, window, duration_ms=None):
+        """
+        Measure the room's noise floor from live capture before the first turn
+        Args:
+            window: Capture window to read ambient audio from
+            duration_ms: Audio to read (defaults to the endpointer's calibration_ms)
+        """
+        duration_ms = duration_ms or self.endpointer.calibration_ms
+        needed = int(self.rate * duration_ms / 1000) * 2
+        chunks = []
+        while needed > 0:
+            data = window.read(timeout=duration_ms / 1000 + 0.5)
+            if data is None:
+                break
+            chunks.append(data)
+            needed -= len(data)
+        self.endpointer.calibrate(chunks, self.rate)
+
+    def feed(self, chunk):
+        """Process one captured chunk; returns the audio that belongs to the utterance"""
+        if not chunk:
+            return b""
+        self.endpointer.observe(chunk, self.rate)
+        started, voiced_frames = self.vad.speech_started, self.vad.voiced_frames
+        voiced = self.vad.process(chunk)
+        if self.vad.voiced_frames > voiced_frames or self.vad.speech_started != started:
+            # The last voiced frame ended trailing_silence_ms before the end of this chunk
+            self.endpointer.mark_speech(time.time() - self.vad.trailing_silence_ms / 1000)
+        if self.vad.in_speech:
+            self.endpointer.update()
+        return voiced
+
+    @property
+    def speech_started(self):
+        return self.vad.speech_started
+
+    @property
+    def speech_ended(self):
+        return self.vad.speech_ended
+
+    def finish_turn(self):
+        return self.endpointer.finish_turn()
@@ -3,34 +3,88 @@ Gemini LLM Handler Module
 Handles conversation with Gemini AI and database queries
 """
 
-from google import genai
+import asyncio
 import json
 import sys
 import os
+import time
 
 # Add parent directory to path to import from modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import config
+from modules.llm_gateway import get_gateway
+from modules.response_cache import ResponseCache, product_id
+from modules.intent_router import IntentRouter, ENGLISH_TEMPLATES
+from modules.prompt_builder import ConversationMemory, PromptBuilder
+
 class GeminiHandler:
+    """
+    One conversation with the sales bot. Many handlers (one per customer)
+    can share a process and the pooled gateway; the async API
+    (agenerate_response, astream_response) serves them from one event loop
+    without a thread per customer. A handler runs one turn at a time.
+    """
+    
+    ERROR_RESPONSE = "I'm sorry, I encountered an error. Could you please repeat that?"
+    TIMEOUT_RESPONSE = "Sorry, that is taking longer than expected. Could you please ask again?"
+    
     def __init__(self, api_key, database_path='data/products.json'):
         """Initialize Gemini LLM client"""
         
-        # Initialize Gemini client
-        self.client = genai.Client(api_key=api_key)
+        # Shared Gemini client (pooled connections reused across turns)
+        self.gateway = get_gateway(api_key)
+        self.client = self.gateway.client
         self.model = 'gemini-2.0-flash-exp'
         
+        # Replies to repeated queries; entries quoting a product are dropped
+        # when its price or stock changes
+        self.response_cache = ResponseCache(max_entries=config.RESPONSE_CACHE_MAX_ENTRIES,
+                                            ttl_s=config.RESPONSE_CACHE_TTL_S)
+        
+        # Greetings, goodbyes and price/stock questions about a named product
+        # are answered from templates without calling Gemini
+        self.router = IntentRouter(dict(ENGLISH_TEMPLATES, greeting=config.GREETING_REPLY,
+                                        goodbye=config.GOODBYE_MESSAGE))
+        self.last_intent = None  # Intent of the last turn (None when Gemini answered)
+        
+        # Instructions, store info, categories and offers are the same on
+        # every turn: registered once (context cache / system instruction)
+        # and re-registered only when that part of the catalog changes
+        # (shared by every handler on the same database)
+        self.static_context = self.gateway.static_context(
+            f"sales:{os.path.abspath(database_path)}", self.model,
+            ttl_s=config.LLM_CONTEXT_CACHE_TTL_S,
+            use_cache=config.LLM_CONTEXT_CACHE,
+            retry_s=config.LLM_CONTEXT_RETRY_S
+        )
+        
+        # Product retrieval: the local catalog plus any add_retrieval_source()
+        self.retrieval_sources = [("catalog", self.find_products)]
+        self.last_retrieval = {}  # Source -> ms (or 'timeout' / 'error') for the last async turn
+        
         # Load product database
-        try:
-            with open(database_path, 'r', encoding='utf-8') as f:
-                self.database = json.load(f)
+        self.database_path = database_path
+        self._database_mtime = None
+        self.database = None
+        if self.refresh_database():
             print(f"✓ Gemini Handler initialized with {len(self.database['products'])} products")
-        except FileNotFoundError:
-            print(f"✗ Error: Database not found at {database_path}")
-            self.database = None
         
         # Conversation history
         self.conversation_history = []
         
+        # Prompt assembly under a per-turn token budget; turns older than the
+        # last HISTORY_VERBATIM_TURNS are folded into a running summary
+        self.prompt_builder = PromptBuilder(
+            budget_tokens=config.PROMPT_TOKEN_BUDGET,
+            memory=ConversationMemory(keep_turns=config.HISTORY_VERBATIM_TURNS,
+                                      summary_tokens=config.HISTORY_SUMMARY_TOKENS)
+        )
+        
+        # Per-call timings (first_token_ms, total_ms), most recent last
+        self.last_metrics = None
+        self.metrics_history = []
+        
         # System prompt for sales bot
         self.system_prompt = """You are a friendly and helpful sales assistant for MYG Kerala, an electronics retail store.
 
@@ -49,72 +103,230 @@ Guidelines:
 - Be friendly and natural
 
 You are speaking, not writing, so be concise!"""
+        
+        self._update_static_context()
     
     
-    def get_database_context(self, query):
-        """Search database and return relevant products"""
+    def refresh_database(self):
+        """
+        (Re)load the product database if the file changed since the last load
+        Cached replies about products whose price or stock changed are dropped.
+        Returns True if the database was loaded.
+        """
+        try:
+            mtime = os.path.getmtime(self.database_path)
+            if mtime == self._database_mtime:
+                return False
+            with open(self.database_path, 'r', encoding='utf-8') as f:
+                database = json.load(f)
+        except FileNotFoundError:
+            if self._database_mtime is None:
+                print(f"✗ Error: Database not found at {self.database_path}")
+            return False
+        except (OSError, ValueError) as e:
+            print(f"✗ Error loading database: {e}")
+            return False
+        
+        reloaded = self.database is not None
+        if reloaded:
+            dropped = self.response_cache.update_catalog(database['products'])
+            print(f"✓ Product database reloaded ({dropped} cached replies invalidated)")
+        self.database = database
+        self._database_mtime = mtime
+        self.router.load_catalog(database['products'])
+        if reloaded:
+            self._update_static_context()
+        return True
+    
+    
+    def _update_static_context(self):
+        """Register the per-session constant prompt prefix (no-op if unchanged)"""
+        sections = [self.system_prompt]
+        if self.database:
+            store = self.database.get('store_info', {})
+            if store:
+                sections.append(f"Store: {store.get('name')} - {store.get('type')}, {store.get('location')}\n"
+                                f"Specialization: {store.get('specialization')}")
+            categories = ", ".join(c.replace('_', ' ').title() for c in self.database.get('categories', []))
+            if categories:
+                sections.append(f"Product categories: {categories}")
+            offers = self.database.get('active_offers') or []
+            if offers:
+                sections.append("Active Offers:\n" + "\n".join(
+                    f"- {offer['title']}: {offer['description']}" for offer in offers))
+        self.static_context.update("\n\n".join(sections))
+    
+    
+    def find_products(self, query):
+        """Products whose name, brand or category contains the query"""
         if not self.database:
-            return "Database not available"
+            return []
         
         query_lower = query.lower()
-        context = []
-        
-        # Find relevant products
         relevant_products = []
         for product in self.database['products']:
             if (query_lower in product['name'].lower() or 
                 query_lower in product['brand'].lower() or
                 query_lower in product['category'].replace('_', ' ').lower()):
                 relevant_products.append(product)
+        return relevant_products
+    
+    
+    def add_retrieval_source(self, name, source):
+        """
+        Add a product source (e.g. the MCP search API or a vector store)
+        Args:
+            source: query -> list of product dicts; coroutine functions run on
+                    the event loop, plain functions in a worker thread. The
+                    sync API only uses plain functions.
+        """
+        self.retrieval_sources.append((name, source))
+    
+    
+    def get_database_context(self, query, relevant_products=None):
+        """Search database and return relevant products"""
+        if not self.database:
+            return "Database not available"
+        
+        if relevant_products is None:
+            relevant_products = self.find_products(query)
+        context = []
         
         if relevant_products:
             context.append(f"Found {len(relevant_products)} products:")
             for p in relevant_products[:3]:
-                savings = p['original_price'] - p['price']
-                context.append(f"- {p['name']} (₹{p['price']:,})")
-                if p['discount'] > 0:
+                # Extra retrieval sources may use the MCP API schema (product_name, stock_status)
+                context.append(f"- {p.get('name') or p.get('product_name')} (₹{p['price']:,})")
+                if p.get('discount', 0) > 0:
+                    savings = p['original_price'] - p['price']
                     context.append(f"  {p['discount']}% OFF - Save ₹{savings:,}")
+                if p.get('stock_status'):
+                    context.append(f"  {p['stock_status']}")
         else:
             context.append("Available categories:")
             for cat in self.database['categories'][:4]:
                 context.append(f"- {cat.replace('_', ' ').title()}")
         
-        # Add offers
-        if self.database['active_offers']:
-            context.append("\nActive Offers:")
-            for offer in self.database['active_offers']:
-                context.append(f"- {offer['title']}: {offer['description']}")
-        
+        # Active offers are part of the static context
         return "\n".join(context)
     
     
+    def _answer_locally(self, user_input, started):
+        """Template reply for a deterministic turn (recorded in history), or None"""
+        self.refresh_database()
+        route = self.router.route(user_input)
+        self.last_intent = route.intent
+        if route.reply is None:
+            return None
+        self._record_metrics(started, None, 1, intent=route.intent)
+        self.conversation_history.append({"user": user_input, "bot": route.reply})
+        return route.reply
+    
+    
+    def _retrieve(self, user_input):
+        """
+        Products the prompt will quote and the history it is built from
+        (together with the query, these determine the reply - the cache key)
+        """
+        self.refresh_database()
+        results = []
+        for name, source in self.retrieval_sources:
+            if asyncio.iscoroutinefunction(source):
+                continue
+            try:
+                results.append(source(user_input))
+            except Exception as e:
+                print(f"⚠️ Retrieval source '{name}' failed: {e}")
+        return self._merge_products(results), self.conversation_history
+    
+    
+    async def _aretrieve(self, user_input, deadline):
+        """
+        _retrieve with every source queried concurrently; sources still
+        running at the deadline are cancelled and left out
+        """
+        loop = asyncio.get_running_loop()
+        
+        async def query(source):
+            if asyncio.iscoroutinefunction(source):
+                return await source(user_input)
+            return await asyncio.to_thread(source, user_input)
+        
+        started = loop.time()
+        tasks = {asyncio.ensure_future(query(source)): name for name, source in self.retrieval_sources}
+        timings = {}
+        for task in tasks:
+            task.add_done_callback(
+                lambda t, name=tasks[task]: timings.setdefault(name, round((loop.time() - started) * 1000, 1)))
+        done, pending = await asyncio.wait(tasks, timeout=max(0.0, deadline - loop.time()))
+        for task in pending:
+            task.cancel()  # Thread-backed sources finish in the background, unused
+        
+        results = []
+        self.last_retrieval = {}
+        for task, name in tasks.items():
+            if task in pending:
+                self.last_retrieval[name] = 'timeout'
+            elif task.exception() is not None:
+                print(f"⚠️ Retrieval source '{name}' failed: {task.exception()}")
+                self.last_retrieval[name] = 'error'
+            else:
+                results.append(task.result())
+                self.last_retrieval[name] = timings.get(name)
+        return self._merge_products(results), self.conversation_history
+    
+    
+    @staticmethod
+    def _merge_products(results, limit=3):
+        """First `limit` distinct products, in source order"""
+        products = {}
+        for result in results:
+            for product in result or []:
+                products.setdefault(product_id(product), product)
+        return list(products.values())[:limit]
+    
+    
+    def _build_prompt(self, user_input, products=None):
+        """Prompt with database context, history summary and recent turns, within the token budget"""
+        
+        # Get database context
+        db_context = self.get_database_context(user_input, products)
+        
+        # The system prompt is sent through the static context
+        return self.prompt_builder.build(
+            "",
+            db_context,
+            self.conversation_history,
+            user_input,
+            "Assistant (keep response SHORT - you are speaking out loud):"
+        )
+    
+    
     def generate_response(self, user_input):
         """Generate response from Gemini"""
         
-        # Get database context
-        db_context = self.get_database_context(user_input)
+        started = time.perf_counter()
+        reply = self._answer_locally(user_input, started)
+        if reply is not None:
+            return reply
+        products, history = self._retrieve(user_input)
         
-        # Build prompt
-        prompt = f"""{self.system_prompt}
-
-Database Info:
-{db_context}
-
-Recent conversation:
-{self._format_history()}
-
-User: {user_input}
-
-Assistant (keep response SHORT - you are speaking out loud):"""
+        # Repeated query about unchanged products: no Gemini call
+        version = self.static_context.version  # Offers / instructions the reply is built on
+        cached = self.response_cache.get(user_input, products, history, version)
+        if cached is not None:
+            self._record_metrics(started, None, 1, cached=True)
+            self.conversation_history.append({"user": user_input, "bot": cached})
+            return cached
+        
+        prompt = self._build_prompt(user_input, products)
         
         try:
             # Generate response
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=prompt
-            )
-            
-            bot_response = response.text.strip()
+            bot_response = self.gateway.generate(prompt, model=self.model, context=self.static_context).strip()
+            self._record_metrics(started, None, 1)
+            self.response_cache.put(user_input, products, history, bot_response,
+                                    self.last_metrics['total_ms'], version)
             
             # Save to history
             self.conversation_history.append({
@@ -126,32 +338,199 @@ Assistant (keep response SHORT - you are speaking out loud):"""
             
         except Exception as e:
             print(f"Error generating response: {e}")
-            return "I'm sorry, I encountered an error. Could you please repeat that?"
+            return self.ERROR_RESPONSE
     
     
-    def _format_history(self):
-        """Format conversation history for context"""
-        if not self.conversation_history:
-            return "No previous conversation"
+    def generate_response_stream(self, user_input):
+        """
+        Yield the response as text chunks while Gemini is still generating
+        History is recorded once the stream finishes; timings go to last_metrics.
+        """
+        self.last_metrics = None  # Stays None if the stream is abandoned
+        started = time.perf_counter()
+        reply = self._answer_locally(user_input, started)
+        if reply is not None:
+            yield reply
+            return
+        products, history = self._retrieve(user_input)
         
-        # Get last 3 exchanges
-        recent = self.conversation_history[-3:]
-        formatted = []
-        for exchange in recent:
-            formatted.append(f"User: {exchange['user']}")
-            formatted.append(f"Bot: {exchange['bot']}")
+        version = self.static_context.version
+        cached = self.response_cache.get(user_input, products, history, version)
+        if cached is not None:
+            self._record_metrics(started, None, 1, cached=True)
+            self.conversation_history.append({"user": user_input, "bot": cached})
+            yield cached
+            return
         
-        return "\n".join(formatted)
+        prompt = self._build_prompt(user_input, products)
+        first_token = None
+        parts = []
+        
+        try:
+            for chunk in self.gateway.generate_stream(prompt, model=self.model, context=self.static_context):
+                if first_token is None:
+                    first_token = time.perf_counter()
+                parts.append(chunk)
+                yield chunk
+        except Exception as e:
+            print(f"Error generating response: {e}")
+            if not parts:
+                yield self.ERROR_RESPONSE
+            return
+        
+        self._record_metrics(started, first_token, len(parts))
+        bot_response = "".join(parts).strip()
+        self.response_cache.put(user_input, products, history, bot_response,
+                                self.last_metrics['total_ms'], version)
+        self.conversation_history.append({
+            "user": user_input,
+            "bot": bot_response
+        })
+    
+    
+    async def agenerate_response(self, user_input, deadline_s=None):
+        """
+        Async generate_response on the genai async client
+        Args:
+            deadline_s: Budget for the whole turn (default LLM_TURN_DEADLINE_S);
+                        retrieval gets at most RETRIEVAL_TIMEOUT_S of it
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (deadline_s or config.LLM_TURN_DEADLINE_S)
+        started = time.perf_counter()
+        
+        # Database reload may re-register the static context (network call)
+        await asyncio.to_thread(self.refresh_database)
+        reply = self._answer_locally(user_input, started)
+        if reply is not None:
+            return reply
+        products, history = await self._aretrieve(
+            user_input, min(deadline, loop.time() + config.RETRIEVAL_TIMEOUT_S))
+        
+        version = self.static_context.version
+        cached = self.response_cache.get(user_input, products, history, version)
+        if cached is not None:
+            self._record_metrics(started, None, 1, cached=True)
+            self.conversation_history.append({"user": user_input, "bot": cached})
+            return cached
+        
+        prompt = self._build_prompt(user_input, products)
+        
+        try:
+            bot_response = await asyncio.wait_for(
+                self.gateway.agenerate(prompt, model=self.model, context=self.static_context),
+                timeout=max(0.0, deadline - loop.time())
+            )
+        except asyncio.TimeoutError:
+            print(f"Response deadline exceeded after {(time.perf_counter() - started) * 1000:.0f} ms")
+            return self.TIMEOUT_RESPONSE
+        except Exception as e:
+            print(f"Error generating response: {e}")
+            return self.ERROR_RESPONSE
+        
+        bot_response = bot_response.strip()
+        self._record_metrics(started, None, 1)
+        self.response_cache.put(user_input, products, history, bot_response,
+                                self.last_metrics['total_ms'], version)
+        self.conversation_history.append({
+            "user": user_input,
+            "bot": bot_response
+        })
+        return bot_response
+    
+    
+    async def astream_response(self, user_input, deadline_s=None):
+        """
+        Async variant of generate_response_stream
+        The deadline applies until the first chunk; once speech can start
+        the rest of the reply is not cut off.
+        """
+        self.last_metrics = None  # Stays None if the stream is abandoned
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (deadline_s or config.LLM_TURN_DEADLINE_S)
+        started = time.perf_counter()
+        
+        await asyncio.to_thread(self.refresh_database)
+        reply = self._answer_locally(user_input, started)
+        if reply is not None:
+            yield reply
+            return
+        products, history = await self._aretrieve(
+            user_input, min(deadline, loop.time() + config.RETRIEVAL_TIMEOUT_S))
+        
+        version = self.static_context.version
+        cached = self.response_cache.get(user_input, products, history, version)
+        if cached is not None:
+            self._record_metrics(started, None, 1, cached=True)
+            self.conversation_history.append({"user": user_input, "bot": cached})
+            yield cached
+            return
+        
+        prompt = self._build_prompt(user_input, products)
+        first_token = None
+        parts = []
+        stream = self.gateway.astream(prompt, model=self.model, context=self.static_context)
+        
+        try:
+            while True:
+                if first_token is None:
+                    chunk = await asyncio.wait_for(stream.__anext__(),
+                                                   timeout=max(0.0, deadline - loop.time()))
+                    first_token = time.perf_counter()
+                else:
+                    chunk = await stream.__anext__()
+                parts.append(chunk)
+                yield chunk
+        except StopAsyncIteration:
+            pass
+        except asyncio.TimeoutError:
+            print(f"Response deadline exceeded after {(time.perf_counter() - started) * 1000:.0f} ms")
+            yield self.TIMEOUT_RESPONSE
+            return
+        except Exception as e:
+            print(f"Error generating response: {e}")
+            if not parts:
+                yield self.ERROR_RESPONSE
+            return
+        finally:
+            await stream.aclose()
+        
+        self._record_metrics(started, first_token, len(parts))
+        bot_response = "".join(parts).strip()
+        self.response_cache.put(user_input, products, history, bot_response,
+                                self.last_metrics['total_ms'], version)
+        self.conversation_history.append({
+            "user": user_input,
+            "bot": bot_response
+        })
+    
+    
+    def _record_metrics(self, started, first_token, chunks, cached=False, intent=None):
+        """Time to first token and total generation time for the last call"""
+        total_ms = (time.perf_counter() - started) * 1000
+        self.last_metrics = {
+            # Without streaming the first token arrives with the whole reply
+            "first_token_ms": round((first_token - started) * 1000 if first_token else total_ms, 1),
+            "total_ms": round(total_ms, 1),
+            "chunks": chunks,
+            "cached": cached,
+            "intent": intent,
+            # Estimated prompt tokens (only when Gemini was called)
+            "input_tokens": self.prompt_builder.last_report.get("total") if not (cached or intent) else 0,
+        }
+        self.metrics_history.append(self.last_metrics)
     
     
     def get_welcome_message(self):
-        """Generate welcome message"""
-        return "Hello! Welcome to MYG Kerala. I'm your sales assistant. How can I help you today?"
+        """Generate welcome message (fixed text, so it is served from the TTS cache)"""
+        return config.WELCOME_MESSAGE
     
     
     def reset_conversation(self):
         """Clear conversation history"""
         self.conversation_history = []
+        self.prompt_builder.reset()
+        self.last_intent = None
 
 
 # Test the module
@@ -180,5 +559,34 @@ if __name__ == "__main__":
         response = handler.generate_response(query)
         print(f"Bot: {response}")
     
+    # Test streaming
+    print("\n3. Streaming:")
+    print("Bot: ", end="", flush=True)
+    for chunk in handler.generate_response_stream("Do you have any TV offers?"):
+        print(chunk, end="", flush=True)
+    print(f"\n{handler.last_metrics}")
+    
+    # Same first-turn query again: served from the response cache
+    handler.reset_conversation()
+    handler.generate_response(test_queries[0])
+    handler.reset_conversation()
+    handler.generate_response(test_queries[0])
+    print(f"\n4. Repeated query: {handler.last_metrics}")
+    print(handler.response_cache.stats())
+    
+    # Several customers served concurrently from one event loop
+    async def customer(query):
+        conversation = GeminiHandler(API_KEY)
+        reply = await conversation.agenerate_response(query)
+        return reply, conversation.last_metrics, conversation.last_retrieval
+    
+    async def serve():
+        return await asyncio.gather(*(customer(q) for q in
+                                      ["Show me laptops", "Any Samsung phones?", "Which TV is cheapest?"]))
+    
+    print("\n5. Concurrent conversations (async):")
+    for reply, metrics, retrieval in asyncio.run(serve()):
+        print(f"Bot: {reply}\n   {metrics} {retrieval}")
+    
     print("\n" + "="*60)
     print("Gemini Handler test complete!")
@@ -0,0 +1,332 @@
+"""
+Intent Router Module
+Answers deterministic turns (greeting, goodbye, price / stock of a named
+product) from templates and the catalog; everything else goes to the LLM
+"""
+
+import collections
+import os
+import sys
+import time
+
+# Add parent directory to path to import from modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.response_cache import normalize_query
+
+# Lexicons are matched on normalize_query() text. English terms must be whole
+# words; Malayalam terms may carry suffixes (ലാപ്ടോപ്പ് -> ലാപ്ടോപ്പിന്റെ).
+LEXICONS = {
+    'greeting': ["hello", "hi", "hey", "hai", "good morning", "good afternoon", "good evening",
+                 "namaste", "namaskaram",
+                 "നമസ്കാരം", "ഹലോ", "ഹായ്", "സുഖമല്ലേ", "എങ്ങനെയുണ്ട്"],
+    'goodbye': ["bye", "goodbye", "good bye", "bye bye", "exit", "quit", "see you", "thank you bye",
+                "ബൈ", "പോട്ടെ", "പിന്നെ കാണാം"],
+    'price': ["price", "cost", "how much", "rate", "mrp",
+              "വില", "എത്ര രൂപ", "എത്രയാ", "എത്രയാണ്"],
+    'stock': ["stock", "in stock", "available", "availability",
+              "സ്റ്റോക്ക്", "ലഭ്യമാണോ", "ലഭ്യം", "ഉണ്ടോ"],
+    'category': ["laptop", "laptops", "mobile", "mobiles", "phone", "phones", "computer", "tv",
+                 "television", "tablet", "headphone", "headphones", "speaker", "camera",
+                 "ലാപ്ടോപ്പ്", "ലാപ്ടോപ്", "മൊബൈൽ", "ഫോൺ", "കമ്പ്യൂട്ടർ", "ടിവി"],
+    # Open-ended requests always go to the LLM
+    'open': ["compare", "better", "best", "recommend", "suggest", "which", "vs", "versus",
+             "under", "below", "budget", "difference", "cheaper", "offer", "offers", "discount",
+             "നല്ലത്", "ഏതാണ്", "താരതമ്യം", "ബജറ്റ്", "കുറഞ്ഞ", "ഓഫർ"],
+}
+
+# Words that may accompany a greeting / goodbye answered locally ("hi there",
+# "ok thank you bye"); any other word sends the turn to the LLM
+FILLER_WORDS = {"there", "bot", "ok", "okay", "thanks", "thank", "you", "so", "sir", "madam",
+                "all", "again", "then", "and", "dear", "friend", "everyone", "team", "myg",
+                "ശരി", "നന്ദി", "എന്നാൽ", "ചേട്ടാ", "ചേച്ചി", "സർ"}
+
+ENGLISH_TEMPLATES = {
+    'greeting': "Hello! How can I help you today?",
+    'goodbye': "Thank you for visiting MYG Kerala. Have a great day!",
+    'price': "The {name} is priced at ₹{price:,}.",
+    'in_stock': "Yes, the {name} is in stock at ₹{price:,}. Would you like to know more about it?",
+    'out_of_stock': "Sorry, the {name} is currently out of stock. Can I suggest something similar?",
+}
+
+MALAYALAM_TEMPLATES = {
+    'greeting': "നമസ്കാരം! ഞാൻ നിങ്ങളെ എങ്ങനെ സഹായിക്കണം?",
+    'goodbye': "MYG സന്ദർശിച്ചതിന് നന്ദി! നല്ലൊരു ദിവസം ആശംസിക്കുന്നു.",
+    'price': "{name} ന്റെ വില ₹{price:,} ആണ്.",
+    'in_stock': "അതെ, {name} സ്റ്റോക്കിൽ ഉണ്ട്. വില ₹{price:,} ആണ്.",
+    'out_of_stock': "ക്ഷമിക്കണം, {name} ഇപ്പോൾ സ്റ്റോക്കിൽ ഇല്ല. സമാനമായ മറ്റൊന്ന് നിർദ്ദേശിക്കട്ടെ?",
+}
+
+Route = collections.namedtuple('Route', 'intent reply product elapsed_ms')
+
+
+class AhoCorasick:
+    """Multi-pattern matcher: all lexicon terms and product aliases in one pass"""
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+    def add(self, pattern, value):
+        state = 0
+        for char in pattern:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append((len(pattern), value))
+
+    def build(self):
+        """Compute failure links (breadth first); call after the last add()"""
+        queue = collections.deque(self._goto[0].values())  # Depth 1 fails to the root
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(char, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def search(self, text):
+        """Yield (start, end, value) for every occurrence"""
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for length, value in self._out[state]:
+                yield i + 1 - length, i + 1, value
+
+
+def in_stock(product):
+    """products.json 'in_stock'/'stock' or MCP API 'stock_status'"""
+    if 'in_stock' in product:
+        return bool(product['in_stock'])
+    if 'stock_status' in product:
+        return str(product['stock_status']).strip().lower() == 'in stock'
+    return product.get('stock', 0) > 0
+
+
+class IntentRouter:
+    """
+    Classifies a turn with one Aho-Corasick pass over the lexicons and the
+    catalog's product names, and answers it from templates when it is
+    deterministic:
+      greeting - a short greeting with nothing but filler words around it
+      goodbye  - a goodbye with nothing but filler words around it
+      price / stock - a price or stock term and exactly one product named
+    Anything open-ended (budgets, comparisons, categories without a product)
+    returns Route(intent=None, reply=None, ...) for the LLM.
+    """
+
+    def __init__(self, templates=ENGLISH_TEMPLATES, lexicons=LEXICONS, max_greeting_words=5):
+        """
+        Args:
+            templates: Replies per intent ('greeting', 'goodbye', 'price', 'in_stock', 'out_of_stock')
+            lexicons: Term lists per category (see LEXICONS)
+            max_greeting_words: Longer turns that start with a greeting go to the LLM
+        """
+        self.templates = dict(templates)
+        self.lexicons = lexicons
+        self.max_greeting_words = max_greeting_words
+        self._products = {}  # id -> product
+        self._name_field = 'name'
+        self._lookup = None
+        self._matcher = None
+        self._build([])
+
+        # Metrics
+        self.counts = collections.Counter()
+        self.route_ms = 0.0
+
+    # ---------- Catalog ----------
+
+    def load_catalog(self, products, name_field='name', id_field='id', lookup=None):
+        """
+        Register product names (and unique shorter prefixes, "hp pavilion")
+        Args:
+            lookup: Optional product id -> current product, for live price/stock
+        """
+        self._name_field = name_field
+        self._lookup = lookup
+        self._products = {str(p[id_field]): p for p in products if p.get(name_field)}
+        self._build(self._aliases())
+        print(f"✓ Intent router: {len(self._products)} products")
+
+    def _aliases(self):
+        """(alias, product id): full names plus prefixes of 2+ words owned by one product"""
+        owners = collections.defaultdict(set)
+        for pid, product in self._products.items():
+            words = normalize_query(product[self._name_field]).split()
+            for n in range(2, len(words) + 1):
+                owners[' '.join(words[:n])].add(pid)
+        return [(alias, next(iter(pids))) for alias, pids in owners.items() if len(pids) == 1]
+
+    def _build(self, aliases):
+        matcher = AhoCorasick()
+        for category, terms in self.lexicons.items():
+            for term in terms:
+                matcher.add(normalize_query(term), (category, None))
+        for alias, pid in aliases:
+            matcher.add(alias, ('product', pid))
+        matcher.build()
+        self._matcher = matcher
+
+    # ---------- Classification ----------
+
+    def matches(self, text):
+        """
+        Non-overlapping matches in normalized text, longest first
+        Returns [(category, product id or None)]
+        """
+        return [value for _, _, value in self._spans(normalize_query(text))]
+
+    def _spans(self, normalized):
+        """Non-overlapping (start, end, (category, product id)) in normalized text"""
+        found = []
+        for start, end, value in self._matcher.search(normalized):
+            if start > 0 and normalized[start - 1] != ' ':
+                continue
+            # Malayalam words take suffixes; English ones must end at a word boundary
+            if normalized[start:end].isascii() and end < len(normalized) and normalized[end] != ' ':
+                continue
+            found.append((start, end, value))
+
+        result = []
+        taken = []
+        for start, end, value in sorted(found, key=lambda m: (m[0] - m[1], m[0])):
+            if any(start < t_end and t_start < end for t_start, t_end in taken):
+                continue
+            taken.append((start, end))
+            result.append((start, end, value))
+        return result
+
+    def terms(self, text):
+        """Categories present in text ('greeting', 'category', 'product', ...)"""
+        return {category for category, _ in self.matches(text)}
+
+    def _only(self, normalized, spans, category):
+        """
+        True if every word is a term of category or a filler word
+        (so "hi there" is a greeting, "hi, do you sell iphones" is not)
+        """
+        covered = set()
+        for start, end, (matched, _) in spans:
+            if matched == category:
+                # A suffixed Malayalam match covers the rest of its word
+                while end < len(normalized) and normalized[end] != ' ':
+                    end += 1
+                covered.update(range(start, end))
+        position = 0
+        for word in normalized.split(' '):
+            if not set(range(position, position + len(word))) <= covered and word not in FILLER_WORDS:
+                return False
+            position += len(word) + 1
+        return True
+
+    def classify(self, text):
+        """(intent or None, product or None)"""
+        normalized = normalize_query(text)
+        spans = self._spans(normalized)
+        found = [value for _, _, value in spans]
+        categories = {category for category, _ in found}
+        products = {pid for category, pid in found if category == 'product'}
+
+        if 'open' in categories or len(products) > 1:
+            return None, None
+        if len(products) == 1:
+            if categories & {'price', 'stock'}:
+                intent = 'stock' if 'stock' in categories else 'price'
+                return intent, self._current(products.pop())
+            return None, None
+        if 'goodbye' in categories and self._only(normalized, spans, 'goodbye'):
+            return 'goodbye', None
+        if ('greeting' in categories and len(normalized.split()) <= self.max_greeting_words
+                and self._only(normalized, spans, 'greeting')):
+            return 'greeting', None
+        return None, None
+
+    def _current(self, pid):
+        product = self._products[pid]
+        if self._lookup is not None:
+            try:
+                product = self._lookup(pid) or product
+            except Exception as e:
+                print(f"⚠️ Product lookup failed, using catalog snapshot: {e}")
+        return product
+
+    # ---------- Answering ----------
+
+    def route(self, text):
+        """Route(intent, reply, product, elapsed_ms); reply is None for LLM turns"""
+        started = time.perf_counter()
+        intent, product = self.classify(text)
+        reply = self._reply(intent, product)
+        if reply is None:
+            intent = None
+        elapsed = (time.perf_counter() - started) * 1000
+        self.counts[intent or 'llm'] += 1
+        self.route_ms += elapsed
+        return Route(intent, reply, product, round(elapsed, 2))
+
+    def _reply(self, intent, product):
+        if intent is None:
+            return None
+        key = intent
+        if intent == 'stock':
+            key = 'in_stock' if in_stock(product) else 'out_of_stock'
+        template = self.templates.get(key)
+        if template is None:
+            return None
+        if product is None:
+            return template
+        fields = dict(product)
+        fields['name'] = product[self._name_field]
+        try:
+            fields['price'] = int(product.get('price', 0))
+            return template.format(**fields)
+        except (KeyError, ValueError, TypeError):
+            return None  # Incomplete product record: let the LLM answer
+
+    def stats(self):
+        turns = sum(self.counts.values())
+        local = turns - self.counts['llm']
+        return {
+            "turns": turns,
+            "local": local,
+            "local_rate": round(local / turns, 3) if turns else 0.0,
+            "intents": {k: v for k, v in self.counts.items() if k != 'llm'},
+            "avg_route_ms": round(self.route_ms / turns, 3) if turns else 0.0,
+        }
+
+
+# Test the module
+if __name__ == "__main__":
+    import json
+
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'products.json')
+    with open(path, 'r', encoding='utf-8') as f:
+        catalog = json.load(f)['products']
+
+    router = IntentRouter()
+    router.load_catalog(catalog)
+    for text in ["Hello!", "hi there, I want a laptop", "What is the price of the HP Pavilion?",
+                 "Is the iPhone 15 Pro in stock?", "MacBook Air M3 വില എത്രയാ", "Samsung Galaxy S24 Ultra ലഭ്യമാണോ",
+                 "which is better, iPhone 15 Pro or Samsung Galaxy S24 Ultra", "laptop under 80000",
+                 "ok thank you bye", "this is quite nice", "നമസ്കാരം", "hi there",
+                 "hi, do you sell iphones", "hey what is the warranty", "hello where is your store",
+                 "hello can you repeat that", "bye the way, is delivery free"]:
+        route = router.route(text)
+        print(f"{text[:40]:<42} {str(route.intent):<9} {route.elapsed_ms:6.2f} ms  {route.reply}")
+    print(router.stats())
+
+    # Ending the session only needs a goodbye term somewhere in the turn
+    for text in ["no thanks, bye", "exit please", "I want to quit", "good bye", "is the bypass on"]:
+        print(f"{text:<20} ends session: {'goodbye' in router.terms(text)}")
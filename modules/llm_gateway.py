@@ -0,0 +1,628 @@
+"""
+LLM Gateway Module
+One process-wide Gemini client per API key: pooled keep-alive connections,
+per-model settings and timeouts, sync/async calls, latency stats and the
+static prompt prefix registered once per catalog version
+"""
+
+import collections
+import hashlib
+import os
+import threading
+import time
+
+import httpx
+from google import genai
+from google.genai import errors, types
+
+DEFAULT_MODEL = 'gemini-2.0-flash-exp'
+
+
+class LatencyStats:
+    """Request latencies for one model (recent window for percentiles)"""
+
+    def __init__(self, window=200):
+        self.requests = 0
+        self.errors = 0
+        self.latencies_ms = collections.deque(maxlen=window)
+        self.first_token_ms = collections.deque(maxlen=window)
+
+    def record(self, latency_ms, first_token_ms=None, error=False):
+        self.requests += 1
+        if error:
+            self.errors += 1
+            return
+        self.latencies_ms.append(latency_ms)
+        if first_token_ms is not None:
+            self.first_token_ms.append(first_token_ms)
+
+    @staticmethod
+    def _percentile(values, p):
+        if not values:
+            return None
+        ordered = sorted(values)
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 1)
+
+    def summary(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "p50_ms": self._percentile(self.latencies_ms, 50),
+            "p95_ms": self._percentile(self.latencies_ms, 95),
+            "first_token_p50_ms": self._percentile(self.first_token_ms, 50),
+        }
+
+
+class LLMGateway:
+    """
+    Wraps a single genai.Client whose httpx pools stay open between turns,
+    so only the first request pays for client setup and the TLS handshake.
+
+    Per-model settings (temperature, max_output_tokens, timeout_s, ...) are
+    applied to every call for that model and can be overridden per call.
+    Set GEMINI_BASE_URL to point the gateway at a local stand-in server.
+    """
+
+    def __init__(self, api_key, base_url=None, timeout_s=30, max_connections=10,
+                 keepalive_s=120):
+        """
+        Args:
+            base_url: API endpoint override (tests / proxies)
+            timeout_s: Default request timeout
+            max_connections: Connection pool size (sync and async each)
+            keepalive_s: How long idle connections are kept open
+        """
+        self.base_url = base_url or os.getenv('GEMINI_BASE_URL') or None
+        self.timeout_s = timeout_s
+        self._settings = {}
+        self._contexts = {}  # name -> StaticContext shared by every conversation
+        self._stats = collections.defaultdict(LatencyStats)
+        self._lock = threading.Lock()
+        self.connections_opened = 0  # New TCP connections (the rest were reused)
+        self.http_requests = 0
+
+        limits = httpx.Limits(max_connections=max_connections,
+                              max_keepalive_connections=max_connections,
+                              keepalive_expiry=keepalive_s)
+        self.client = genai.Client(
+            api_key=api_key,
+            http_options=types.HttpOptions(
+                base_url=self.base_url,
+                timeout=int(timeout_s * 1000),
+                client_args={'limits': limits,
+                             'event_hooks': {'request': [self._trace_request]}},
+                async_client_args={'limits': limits,
+                                   'event_hooks': {'request': [self._atrace_request]}},
+            )
+        )
+
+    # ---------- Connection tracing ----------
+
+    def _on_trace(self, event, info):
+        if event == 'connection.connect_tcp.complete':
+            with self._lock:
+                self.connections_opened += 1
+
+    def _trace_request(self, request):
+        with self._lock:
+            self.http_requests += 1
+        request.extensions['trace'] = self._on_trace
+
+    async def _atrace_request(self, request):
+        async def trace(event, info):
+            self._on_trace(event, info)
+        with self._lock:
+            self.http_requests += 1
+        request.extensions['trace'] = trace
+
+    # ---------- Per-model configuration ----------
+
+    def configure(self, model, **settings):
+        """
+        Set defaults for a model
+        Args:
+            timeout_s: Request timeout for this model
+            **settings: Any GenerateContentConfig field (temperature, max_output_tokens, ...)
+        """
+        self._settings.setdefault(model, {}).update(settings)
+
+    def _config(self, model, overrides):
+        settings = dict(self._settings.get(model, {}))
+        settings.update(overrides)
+        timeout_s = settings.pop('timeout_s', None)
+        if timeout_s is not None:
+            settings['http_options'] = types.HttpOptions(timeout=int(timeout_s * 1000))
+        return types.GenerateContentConfig(**settings) if settings else None
+
+    def static_context(self, name, model=DEFAULT_MODEL, **options):
+        """
+        StaticContext shared under a name, so concurrent conversations with
+        the same prefix use one cache (options apply on first use)
+        """
+        with self._lock:
+            context = self._contexts.get(name)
+            if context is None:
+                context = self._contexts[name] = StaticContext(self, model, **options)
+            return context
+
+    def _request(self, model, contents, context, overrides):
+        """(contents, config, context mode) with the static context applied"""
+        if context is None:
+            return contents, self._config(model, overrides), None
+        mode, settings = context.overrides()
+        settings.update(overrides)
+        return context.apply(contents, mode), self._config(model, settings), mode
+
+    async def _arequest(self, model, contents, context, overrides):
+        """_request() for the event loop (the cache is refreshed with the async client)"""
+        if context is None:
+            return contents, self._config(model, overrides), None
+        mode, settings = await context.aoverrides()
+        settings.update(overrides)
+        return context.apply(contents, mode), self._config(model, settings), mode
+
+    def _record(self, model, started, first_token=None, error=False):
+        elapsed = (time.perf_counter() - started) * 1000
+        ttft = (first_token - started) * 1000 if first_token is not None else None
+        with self._lock:
+            self._stats[model].record(elapsed, ttft, error)
+
+    # ---------- Sync API ----------
+
+    # Calls take an optional StaticContext; if the API rejects it (e.g. an
+    # expired cache) the context degrades one step for a while and the call
+    # is retried.
+
+    def generate(self, contents, model=DEFAULT_MODEL, context=None, **overrides):
+        """Complete reply text"""
+        started = time.perf_counter()
+        while True:
+            prompt, config, mode = self._request(model, contents, context, overrides)
+            try:
+                response = self.client.models.generate_content(
+                    model=model, contents=prompt, config=config)
+                break
+            except Exception as e:
+                if context is not None and context.degrade(e, mode):
+                    continue
+                self._record(model, started, error=True)
+                raise
+        self._record(model, started)
+        return response.text
+
+    def generate_stream(self, contents, model=DEFAULT_MODEL, context=None, **overrides):
+        """Yield reply text chunks as they are generated"""
+        started = time.perf_counter()
+        first_token = None
+        while True:
+            prompt, config, mode = self._request(model, contents, context, overrides)
+            try:
+                for chunk in self.client.models.generate_content_stream(
+                        model=model, contents=prompt, config=config):
+                    if chunk.text:
+                        if first_token is None:
+                            first_token = time.perf_counter()
+                        yield chunk.text
+                break
+            except Exception as e:
+                if first_token is None and context is not None and context.degrade(e, mode):
+                    continue
+                self._record(model, started, error=True)
+                raise
+        self._record(model, started, first_token)
+
+    # ---------- Async API ----------
+    # The pooled async connections belong to the event loop that first uses
+    # them, so make async calls from one long-lived loop.
+
+    async def agenerate(self, contents, model=DEFAULT_MODEL, context=None, **overrides):
+        started = time.perf_counter()
+        while True:
+            prompt, config, mode = await self._arequest(model, contents, context, overrides)
+            try:
+                response = await self.client.aio.models.generate_content(
+                    model=model, contents=prompt, config=config)
+                break
+            except Exception as e:
+                if context is not None and context.degrade(e, mode):
+                    continue
+                self._record(model, started, error=True)
+                raise
+        self._record(model, started)
+        return response.text
+
+    async def astream(self, contents, model=DEFAULT_MODEL, context=None, **overrides):
+        started = time.perf_counter()
+        first_token = None
+        while True:
+            prompt, config, mode = await self._arequest(model, contents, context, overrides)
+            try:
+                async for chunk in await self.client.aio.models.generate_content_stream(
+                        model=model, contents=prompt, config=config):
+                    if chunk.text:
+                        if first_token is None:
+                            first_token = time.perf_counter()
+                        yield chunk.text
+                break
+            except Exception as e:
+                if first_token is None and context is not None and context.degrade(e, mode):
+                    continue
+                self._record(model, started, error=True)
+                raise
+        self._record(model, started, first_token)
+
+    # ---------- Stats ----------
+
+    def stats(self):
+        """Per-model latency summary plus connection reuse"""
+        with self._lock:
+            per_model = {model: s.summary() for model, s in self._stats.items()}
+            requests, opened = self.http_requests, self.connections_opened
+        return {
+            "http_requests": requests,
+            "connections_opened": opened,
+            "connection_reuse": round(1 - opened / requests, 3) if requests else 0.0,
+            "models": per_model,
+        }
+
+    def close(self):
+        for context in list(self._contexts.values()):
+            context.close()
+        self.client.close()
+
+
+class StaticContext:
+    """
+    Static prompt prefix (instructions, store info, offers) that is sent once
+    per version instead of being repeated inline on every call.
+
+    Modes, best first:
+      'cache'  - explicit cached context, calls reference it by name
+      'system' - sent as system_instruction (kept apart from the turn, so
+                 the API's implicit prefix caching applies)
+      'inline' - prepended to the prompt
+    A failed cache creation, or a call the API rejects because of the
+    context itself (cache not found / expired, caching or system
+    instructions not supported), degrades one step; the best mode is tried
+    again after retry_s. update() with a new version starts over.
+    The async API refreshes the cache through the async client, so an
+    expired cache never blocks the event loop.
+    The cache belongs to one model: use the context only with that model.
+    """
+
+    MODES = ('cache', 'system', 'inline')
+
+    def __init__(self, gateway, model=DEFAULT_MODEL, ttl_s=3600, use_cache=True, retry_s=600):
+        """
+        Args:
+            gateway: LLMGateway whose client creates the cache
+            model: Model the cached context is created for
+            ttl_s: Cache lifetime (re-created when it runs out)
+            use_cache: False to go straight to system_instruction
+            retry_s: Cooldown before a degraded context tries its best mode again
+        """
+        self.gateway = gateway
+        self.model = model
+        self.ttl_s = ttl_s
+        self.use_cache = use_cache
+        self.retry_s = retry_s
+        self.text = ""
+        self.version = None
+        self.mode = 'inline'
+        self.cache_name = None
+        self._cache_expires = 0.0
+        self._retry_at = 0.0
+        self._refreshing = None  # Version whose cache is being created
+        self._lock = threading.Lock()
+        self.refreshes = 0
+
+    @property
+    def best_mode(self):
+        return 'cache' if self.use_cache else 'system'
+
+    def update(self, text, version=None):
+        """
+        Register the prefix; no-op if the version is unchanged
+        Args:
+            version: Catalog / template version (defaults to a hash of text)
+        Returns:
+            True if the context was (re)registered
+        """
+        version = version or hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+        with self._lock:
+            if version == self.version:
+                return False
+            old_cache = self.cache_name
+            self.text = text
+            self.version = version
+            self.mode = 'system'
+            self.cache_name = None
+            self._retry_at = 0.0
+            self._refreshing = version if self.use_cache else None
+            self.refreshes += 1
+        self._delete_cache(old_cache)
+        if self.use_cache:
+            self._create_cache(version, text)
+        print(f"✓ Static context {version[:8]} registered ({self.mode})")
+        return True
+
+    def overrides(self):
+        """(mode, GenerateContentConfig fields) for the next call"""
+        claim = self._claim_refresh()
+        if claim is not None:
+            self._create_cache(*claim)
+        return self._settings()
+
+    async def aoverrides(self):
+        """overrides() for the event loop: the cache is re-created with the async client"""
+        claim = self._claim_refresh()
+        if claim is not None:
+            version, text = claim
+            cache = error = None
+            try:
+                cache = await self.gateway.client.aio.caches.create(
+                    model=self.model, config=self._cache_config(version, text))
+            except Exception as e:
+                error = e
+            finally:
+                self._cache_created(version, cache, error)
+        return self._settings()
+
+    def _claim_refresh(self):
+        """
+        (version, text) if the caller should create the cache now, else None.
+        One caller at a time; meanwhile the others keep using the current
+        mode (an expiring cache has 30 s left).
+        """
+        with self._lock:
+            if self._refreshing is not None or not self.text:
+                return None
+            now = time.monotonic()
+            if self.mode == 'cache':
+                if now <= self._cache_expires:
+                    return None
+            elif self.mode == self.best_mode or now < self._retry_at:
+                return None
+            elif not self.use_cache:
+                self.mode = 'system'  # Cooldown over: try the best mode again
+                return None
+            else:
+                self.mode = 'system'
+            self._refreshing = self.version
+            return self.version, self.text
+
+    def _settings(self):
+        with self._lock:
+            if self.mode == 'cache':
+                return 'cache', {'cached_content': self.cache_name}
+            if self.mode == 'system' and self.text:
+                return 'system', {'system_instruction': self.text}
+            return self.mode, {}
+
+    def apply(self, contents, mode=None):
+        """Contents with the prefix prepended in 'inline' mode"""
+        if (mode or self.mode) == 'inline' and self.text and isinstance(contents, str):
+            return f"{self.text}\n\n{contents}"
+        return contents
+
+    def degrade(self, error, mode=None):
+        """
+        Step down after a call in the given mode failed because of the context
+        Returns True if the call should be retried
+        """
+        mode = mode or self.mode
+        with self._lock:
+            if self.MODES.index(self.mode) > self.MODES.index(mode):
+                return True  # Another call already stepped down
+            if self.mode != mode or not self._rejects(error, mode):
+                return False
+            self.mode = self.MODES[self.MODES.index(mode) + 1]
+            self.cache_name = None
+            self._retry_at = time.monotonic() + self.retry_s
+        print(f"⚠️ Static context rejected ({error}), using {self.mode} for {self.retry_s}s")
+        return True
+
+    @staticmethod
+    def _rejects(error, mode):
+        """Whether the API rejected the call because of the context in this mode"""
+        if not isinstance(error, errors.ClientError):
+            return False  # Server errors, timeouts: not the context's fault
+        message = str(error).lower()
+        if mode == 'cache':
+            # cachedContent not found / expired, or a model without caching
+            return getattr(error, 'code', None) == 404 or 'cache' in message
+        if mode == 'system':
+            return 'system' in message and 'instruction' in message
+        return False
+
+    def _cache_config(self, version, text):
+        return types.CreateCachedContentConfig(
+            system_instruction=text,
+            ttl=f"{int(self.ttl_s)}s",
+            display_name=f"static-{version}"
+        )
+
+    def _create_cache(self, version, text):
+        """Create the explicit cache (claimed refresh, lock not held)"""
+        cache = error = None
+        try:
+            cache = self.gateway.client.caches.create(
+                model=self.model, config=self._cache_config(version, text))
+        except Exception as e:
+            error = e
+        finally:
+            self._cache_created(version, cache, error)
+
+    def _cache_created(self, version, cache, error):
+        """Finish a claimed refresh; leaves mode 'system' on failure"""
+        stale = None
+        with self._lock:
+            if self._refreshing == version:
+                self._refreshing = None
+            if version != self.version:
+                stale = cache.name if cache is not None else None  # Prefix changed meanwhile
+            elif cache is not None:
+                # The cache it replaces is about to expire on its own
+                self.cache_name = cache.name
+                self.mode = 'cache'
+                self._cache_expires = time.monotonic() + self.ttl_s - 30
+            elif error is not None:
+                self.mode = 'system'
+                self.cache_name = None
+                self._retry_at = time.monotonic() + self.retry_s
+        if error is not None:
+            # e.g. the prefix is below the model's minimum cacheable size
+            print(f"⚠️ Context cache unavailable, using system instruction: {error}")
+        self._delete_cache(stale)
+
+    def _delete_cache(self, name):
+        if name is None:
+            return
+        try:
+            self.gateway.client.caches.delete(name=name)
+        except Exception:
+            pass  # Expires on its own
+
+    def close(self):
+        with self._lock:
+            name, self.cache_name = self.cache_name, None
+        self._delete_cache(name)
+
+
+_gateways = {}
+_gateways_lock = threading.Lock()
+
+
+def get_gateway(api_key=None, **options):
+    """
+    Process-wide gateway for an API key (defaults to GEMINI_API_KEY)
+    Options only apply when the gateway is first created.
+    """
+    api_key = api_key or os.getenv('GEMINI_API_KEY')
+    with _gateways_lock:
+        gateway = _gateways.get(api_key)
+        if gateway is None:
+            gateway = _gateways[api_key] = LLMGateway(api_key, **options)
+        return gateway
+
+
+# Test the module against a local stand-in server
+if __name__ == "__main__":
+    import asyncio
+    import json
+    import socket
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    connections = []
+    submitted = []  # Estimated tokens per generate request (~4 characters each)
+    cached = {}
+
+    def text_tokens(node):
+        """Tokens of every 'text' field in a request body"""
+        if isinstance(node, dict):
+            return sum(len(v) // 4 if k == 'text' and isinstance(v, str) else text_tokens(v)
+                       for k, v in node.items())
+        if isinstance(node, list):
+            return sum(text_tokens(v) for v in node)
+        return 0
+
+    class StandIn(BaseHTTPRequestHandler):
+        """Minimal generateContent / streamGenerateContent / cachedContents endpoint (HTTP/1.1 keep-alive)"""
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connections.append(self.client_address)
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            if self.path.split('?')[0].endswith('/cachedContents'):
+                name = f"cachedContents/{len(cached) + 1}"
+                cached[name] = text_tokens(request)
+                self._send({"name": name, "model": request.get("model")}, "application/json")
+                return
+            if request.get('cachedContent') and request['cachedContent'] not in cached:
+                self._send({"error": {"code": 404, "message": "cache not found", "status": "NOT_FOUND"}},
+                           "application/json", status=404)
+                return
+            submitted.append(text_tokens(request))
+            reply = {"candidates": [{"content": {"role": "model", "parts": [{"text": "Hello! "}]},
+                                     "finishReason": "STOP"}]}
+            if 'streamGenerateContent' in self.path:
+                self._send(b"".join(b"data: " + json.dumps(reply).encode() + b"\r\n\r\n" for _ in range(3)),
+                           "text/event-stream")
+            else:
+                self._send(reply, "application/json")
+
+        def do_DELETE(self):
+            cached.pop(self.path.split('/v1beta/')[-1].split('?')[0], None)
+            self._send({}, "application/json")
+
+        def _send(self, body, content_type, status=200):
+            if not isinstance(body, bytes):
+                body = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    gateway = LLMGateway("test-key", base_url=f"http://127.0.0.1:{server.server_port}")
+    gateway.configure(DEFAULT_MODEL, temperature=0.3, timeout_s=5)
+
+    for _ in range(20):
+        gateway.generate("Hi")
+    print("stream:", "".join(gateway.generate_stream("Hi")))
+
+    async def run_async():
+        replies = await asyncio.gather(*(gateway.agenerate("Hi") for _ in range(5)))
+        chunks = [chunk async for chunk in gateway.astream("Hi")]
+        return replies, chunks
+
+    print("async:", asyncio.run(run_async()))
+    print(f"{gateway.stats()['http_requests']} requests over {len(connections)} TCP connections (server side)")
+    print(json.dumps(gateway.stats(), indent=2))
+
+    # Static prefix: tokens submitted per turn in each mode
+    prefix = "You are a friendly sales assistant for MYG Kerala. " * 40
+    turn = "User: Do you have Samsung TVs?\n\nAssistant:"
+    for mode, use_cache in (('inline', None), ('system', False), ('cache', True)):
+        context = None
+        if use_cache is not None:
+            context = StaticContext(gateway, use_cache=use_cache)
+            context.update(prefix)
+        submitted.clear()
+        for _ in range(5):
+            gateway.generate(turn if context else f"{prefix}\n\n{turn}", context=context)
+        print(f"{mode:<7} {sum(submitted) / len(submitted):6.0f} tokens submitted per turn")
+
+    # Cache deleted behind the gateway's back: the call falls back and succeeds
+    cached.clear()
+    print("after cache loss:", gateway.generate(turn, context=context).strip(), f"(mode {context.mode})")
+
+    # Server errors leave the mode alone; after the cooldown the cache is back
+    print("500 degrades:", context.degrade(errors.ServerError(500, {"error": {"message": "internal"}}), 'system'))
+    context.retry_s = 0
+    context._retry_at = 0.0
+    gateway.generate(turn, context=context)
+    print(f"after cooldown: mode {context.mode}")
+
+    # Expired cache on the event loop: re-created once, through the async
+    # client (a fresh gateway, its async connections belong to this loop)
+    async def run_expired():
+        loop_gateway = LLMGateway("test-key", base_url=f"http://127.0.0.1:{server.server_port}")
+        loop_context = StaticContext(loop_gateway)
+        loop_context.update(prefix)
+        loop_context._cache_expires = 0.0
+        created = len(cached)
+        await asyncio.gather(*(loop_gateway.agenerate(turn, context=loop_context) for _ in range(5)))
+        return loop_context.mode, len(cached) - created
+    print("async refresh: mode %s, %d cache(s) created" % asyncio.run(run_expired()))
+    server.shutdown()
@@ -0,0 +1,149 @@
+"""
+Microphone Stream Module
+Shared real-time capture for streaming STT: bounded buffer, fixed-size
+frames and drop/late accounting
+"""
+
+import collections
+import threading
+import time
+
+import pyaudio
+
+
+class MicrophoneStream:
+    """
+    Opens a recording stream as a generator yielding fixed-size audio frames.
+
+    The callback buffer is bounded (max_buffer_ms). When a downstream stage
+    stalls, overflow_policy decides what is dropped instead of letting memory
+    grow:
+        'drop_oldest' - discard the oldest buffered audio (keeps latency low)
+        'drop_newest' - discard incoming audio (keeps the start of speech)
+
+    generator() re-frames whatever was captured into frame_ms frames, so
+    STT requests have a steady size (20/50/100 ms) rather than bursts.
+    """
+
+    OVERFLOW_POLICIES = ('drop_oldest', 'drop_newest')
+
+    def __init__(self, rate, chunk, frame_ms=100, max_buffer_ms=2000,
+                 overflow_policy='drop_oldest', late_ms=500):
+        """
+        Args:
+            rate: Sample rate
+            chunk: PortAudio frames per buffer
+            frame_ms: Size of frames yielded by generator()
+            max_buffer_ms: Audio held before overflow_policy applies
+            overflow_policy: 'drop_oldest' or 'drop_newest'
+            late_ms: Frames older than this when yielded count as late
+        """
+        if overflow_policy not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"overflow_policy must be one of {self.OVERFLOW_POLICIES}")
+
+        self._rate = rate
+        self._chunk = chunk
+        self._frame_bytes = int(rate * frame_ms / 1000) * 2
+        self._max_bytes = int(rate * max_buffer_ms / 1000) * 2
+        self._overflow_policy = overflow_policy
+        self._late_s = late_ms / 1000
+
+        self._buff = collections.deque()  # (data, capture_time)
+        self._buffered_bytes = 0
+        self._cond = threading.Condition()
+        self.closed = True
+
+        # Counters
+        self.captured_chunks = 0
+        self.dropped_bytes = 0
+        self.dropped_chunks = 0
+        self.yielded_frames = 0
+        self.late_frames = 0
+
+    def __enter__(self):
+        self._audio_interface = pyaudio.PyAudio()
+        self._audio_stream = self._audio_interface.open(
+            format=pyaudio.paInt16,
+            channels=1,
+            rate=self._rate,
+            input=True,
+            frames_per_buffer=self._chunk,
+            stream_callback=self._fill_buffer,
+        )
+        self.closed = False
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self._audio_stream.stop_stream()
+        self._audio_stream.close()
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        self._audio_interface.terminate()
+
+    def _fill_buffer(self, in_data, frame_count, time_info, status_flags):
+        """Continuously collect data from the audio stream (PortAudio thread)."""
+        now = time.monotonic()
+        with self._cond:
+            self.captured_chunks += 1
+            if self._buffered_bytes + len(in_data) > self._max_bytes:
+                if self._overflow_policy == 'drop_newest':
+                    self._drop(len(in_data))
+                    return None, pyaudio.paContinue
+                while self._buff and self._buffered_bytes + len(in_data) > self._max_bytes:
+                    old, _ = self._buff.popleft()
+                    self._buffered_bytes -= len(old)
+                    self._drop(len(old))
+            self._buff.append((in_data, now))
+            self._buffered_bytes += len(in_data)
+            self._cond.notify()
+        return None, pyaudio.paContinue
+
+    def _drop(self, size):
+        self.dropped_chunks += 1
+        self.dropped_bytes += size
+
+    def generator(self):
+        """Yield frame_ms frames until the stream is closed."""
+        pending = bytearray()
+        oldest = None  # Capture time of the oldest audio in pending
+        newest = None  # Capture time of the last chunk added to pending
+
+        while True:
+            with self._cond:
+                while not self._buff and not self.closed:
+                    self._cond.wait()
+                if not self._buff and self.closed:
+                    break
+                while self._buff and len(pending) < self._frame_bytes:
+                    data, captured = self._buff.popleft()
+                    self._buffered_bytes -= len(data)
+                    if oldest is None:
+                        oldest = captured
+                    newest = captured
+                    pending += data
+
+            while len(pending) >= self._frame_bytes:
+                frame = bytes(pending[:self._frame_bytes])
+                del pending[:self._frame_bytes]
+                if time.monotonic() - oldest > self._late_s:
+                    self.late_frames += 1
+                self.yielded_frames += 1
+                yield frame
+                # Leftover audio always comes from the last chunk added
+                oldest = newest if pending else None
+
+        if pending:
+            self.yielded_frames += 1
+            yield bytes(pending)
+
+    def stats(self):
+        """Capture counters"""
+        return {
+            "captured_chunks": self.captured_chunks,
+            "yielded_frames": self.yielded_frames,
+            "dropped_chunks": self.dropped_chunks,
+            "dropped_ms": self.dropped_bytes / 2 / self._rate * 1000,
+            "late_frames": self.late_frames,
+            "buffered_ms": self._buffered_bytes / 2 / self._rate * 1000,
+        }
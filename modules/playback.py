@@ -0,0 +1,140 @@
+"""
+Playback Module
+Jitter buffer and dedicated playback thread so audio output never blocks
+the thread that receives it
+"""
+
+import threading
+import time
+
+
+class JitterBuffer:
+    """
+    Bounded PCM buffer between a bursty producer (network) and a steady
+    consumer (sound card).
+
+    Playback starts (and restarts after an underrun) only once target_ms of
+    audio is buffered, unless no new audio has arrived for idle_flush_ms -
+    then the tail of a reply is played as-is. When more than max_ms is
+    buffered the oldest audio is dropped (overrun).
+    """
+
+    def __init__(self, rate=24000, sample_width=2, channels=1, target_ms=120,
+                 max_ms=2000, frame_ms=20, idle_flush_ms=60):
+        self._bytes_per_ms = rate * sample_width * channels / 1000
+        self._align = sample_width * channels
+        self.frame_bytes = int(self._bytes_per_ms * frame_ms) // self._align * self._align
+        self.target_bytes = int(self._bytes_per_ms * target_ms)
+        self.max_bytes = int(self._bytes_per_ms * max_ms) // self._align * self._align
+        self.idle_flush_s = idle_flush_ms / 1000
+        self.underrun_window_s = 0.5
+
+        self._data = bytearray()
+        self._cond = threading.Condition()
+        self._playing = False
+        self._last_put = 0.0
+        self._dry_since = None
+
+        # Metrics
+        self.underruns = 0
+        self.overruns = 0
+        self.dropped_bytes = 0
+        self._depth_samples = 0
+        self._depth_total_ms = 0.0
+        self.max_depth_ms = 0.0
+
+    @property
+    def depth_ms(self):
+        return len(self._data) / self._bytes_per_ms
+
+    def put(self, data):
+        """Add received audio (never blocks)"""
+        now = time.monotonic()
+        with self._cond:
+            # Audio arriving shortly after the buffer ran dry means playback starved
+            if self._dry_since is not None and now - self._dry_since < self.underrun_window_s:
+                self.underruns += 1
+            self._dry_since = None
+
+            self._data += data
+            overflow = len(self._data) - self.max_bytes
+            if overflow > 0:
+                overflow += -overflow % self._align  # Keep whole samples
+                del self._data[:overflow]
+                self.overruns += 1
+                self.dropped_bytes += overflow
+            self._last_put = now
+            self.max_depth_ms = max(self.max_depth_ms, self.depth_ms)
+            self._cond.notify()
+
+    def clear(self):
+        """Drop everything buffered (e.g. playback cancelled)"""
+        with self._cond:
+            self._data.clear()
+            self._playing = False
+            self._dry_since = None
+
+    def _ready(self):
+        if self._playing:
+            return len(self._data) > 0
+        if len(self._data) >= self.target_bytes:
+            return True
+        # Nothing more is coming for now: play the remainder
+        return bool(self._data) and time.monotonic() - self._last_put >= self.idle_flush_s
+
+    def get(self, timeout=0.1):
+        """Next frame to play, or None if nothing is ready within timeout"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._ready():
+                if self._playing and not self._data:
+                    # Ran dry: rebuild target depth before resuming
+                    self._playing = False
+                    self._dry_since = time.monotonic()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(min(remaining, self.idle_flush_s))
+
+            self._playing = True
+            self._depth_samples += 1
+            self._depth_total_ms += self.depth_ms
+            frame = bytes(self._data[:self.frame_bytes])
+            del self._data[:self.frame_bytes]
+            return frame
+
+    def stats(self):
+        return {
+            "depth_ms": round(self.depth_ms, 1),
+            "avg_depth_ms": round(self._depth_total_ms / self._depth_samples, 1) if self._depth_samples else 0.0,
+            "max_depth_ms": round(self.max_depth_ms, 1),
+            "underruns": self.underruns,
+            "overruns": self.overruns,
+            "dropped_ms": round(self.dropped_bytes / self._bytes_per_ms, 1),
+        }
+
+
+class PlaybackThread(threading.Thread):
+    """Drains a JitterBuffer into a blocking write(frame) function"""
+
+    def __init__(self, buffer, write):
+        super().__init__(daemon=True)
+        self.buffer = buffer
+        self._write = write
+        self._running = threading.Event()
+        self._running.set()
+
+    def run(self):
+        while self._running.is_set():
+            frame = self.buffer.get(timeout=0.1)
+            if frame is None:
+                continue
+            try:
+                self._write(frame)
+            except IOError as e:
+                if 'Output overflowed' not in str(e):
+                    print(f"Playback error: {e}")
+
+    def stop(self):
+        self._running.clear()
+        self.join(timeout=1)
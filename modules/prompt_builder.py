@@ -0,0 +1,197 @@
+"""
+Prompt Builder Module
+Assembles the per-turn LLM prompt under a token budget: instructions,
+retrieved context, a rolling summary of older turns and the latest turns
+verbatim
+"""
+
+import re
+
+# Prices, budgets and model numbers are what later turns refer back to
+_FACTS = re.compile(r'(?:₹|\bRs\.?\s?)\s?\d[\d,]*|\b\d{4,}\b|\b\d+\s?(?:GB|TB|inch)\b|\d+"', re.IGNORECASE)
+
+
+def estimate_tokens(text):
+    """
+    Rough token count without a tokenizer round trip: ~4 characters per
+    token for English, ~2 for Malayalam and other non-Latin scripts
+    """
+    if not text:
+        return 0
+    non_ascii = sum(1 for c in text if ord(c) > 127)
+    return (len(text) - non_ascii + 3) // 4 + (non_ascii + 1) // 2
+
+
+def truncate_tokens(text, budget):
+    """Cut text at a word boundary so it fits the budget"""
+    if estimate_tokens(text) <= budget:
+        return text
+    words = text.split()
+    while words and estimate_tokens(" ".join(words) + " ...") > budget:
+        words.pop()
+    return " ".join(words) + " ..." if words else ""
+
+
+def summarize_exchange(exchange, max_chars=90):
+    """
+    One summary line for a finished exchange: what the customer asked plus
+    the prices / specs the bot quoted (extractive, no LLM call)
+    """
+    asked = exchange['user'].strip()
+    if len(asked) > max_chars:
+        asked = asked[:max_chars].rsplit(' ', 1)[0] + " ..."
+    facts = list(dict.fromkeys(m.group(0).strip() for m in _FACTS.finditer(exchange['bot'])))
+    line = f"Customer asked: {asked}"
+    if facts:
+        line += f" (bot quoted {', '.join(facts[:4])})"
+    return line
+
+
+class ConversationMemory:
+    """
+    Rolling history: the last keep_turns exchanges stay verbatim, older ones
+    are folded into a summary one exchange at a time (never re-summarized
+    from scratch), and the summary is capped at summary_tokens by dropping
+    its oldest lines.
+    """
+
+    def __init__(self, keep_turns=2, summary_tokens=120, summarize=summarize_exchange):
+        """
+        Args:
+            keep_turns: Most recent exchanges kept verbatim
+            summary_tokens: Cap for the running summary
+            summarize: exchange -> summary line
+        """
+        self.keep_turns = keep_turns
+        self.summary_tokens = summary_tokens
+        self.summarize = summarize
+        self.summary_lines = []
+        self._folded = 0  # Exchanges of the history already in the summary
+
+    def update(self, history):
+        """Fold exchanges that dropped out of the verbatim window into the summary"""
+        if len(history) < self._folded:
+            self.reset()  # History was cleared
+        foldable = max(0, len(history) - self.keep_turns)
+        for exchange in history[self._folded:foldable]:
+            self.summary_lines.append(self.summarize(exchange))
+        self._folded = max(self._folded, foldable)
+        while self.summary_lines and estimate_tokens(self.summary) > self.summary_tokens:
+            self.summary_lines.pop(0)
+
+    @property
+    def summary(self):
+        return "\n".join(self.summary_lines)
+
+    def recent(self, history):
+        return history[self._folded:]
+
+    def reset(self):
+        self.summary_lines = []
+        self._folded = 0
+
+
+class PromptBuilder:
+    """
+    Fits the prompt into budget_tokens. Instructions, the user's turn and
+    the answer cue are always included; the rest is filled in priority
+    order - retrieved context, the latest exchange, the summary, then the
+    other verbatim exchanges - and trimmed when it does not fit.
+    """
+
+    def __init__(self, budget_tokens=700, memory=None):
+        """
+        Args:
+            budget_tokens: Input token budget per turn
+            memory: ConversationMemory for the history sections
+        """
+        self.budget_tokens = budget_tokens
+        self.memory = memory or ConversationMemory()
+        self.last_report = {}  # Estimated tokens per section of the last prompt
+
+    def build(self, system, context, history, user_input, cue):
+        """
+        Args:
+            system: Static instructions ("" when sent separately)
+            context: Retrieved database context (trimmed line by line)
+            history: Full conversation history [{'user', 'bot'}, ...]
+            user_input: This turn
+            cue: Closing line that asks for the answer
+        Returns:
+            The prompt string
+        """
+        self.memory.update(history)
+        user_block = f"User: {user_input}"
+        remaining = self.budget_tokens - sum(map(estimate_tokens, (system, user_block, cue)))
+
+        # Context: whole lines, in order, while they fit
+        context_lines = []
+        for line in context.split("\n"):
+            cost = estimate_tokens(line) + 1
+            if cost > remaining:
+                break
+            context_lines.append(line)
+            remaining -= cost
+
+        # Latest exchange first, then the summary, then older verbatim turns
+        recent = self.memory.recent(history)
+        exchanges = []
+        if recent:
+            latest = self._format(recent[-1])
+            if estimate_tokens(latest) > remaining:
+                latest = truncate_tokens(latest, max(0, remaining))
+            if latest:
+                exchanges.append(latest)
+                remaining -= estimate_tokens(latest)
+
+        summary = self.memory.summary
+        if estimate_tokens(summary) > remaining:
+            summary = truncate_tokens(summary, max(0, remaining))
+        remaining -= estimate_tokens(summary)
+
+        for exchange in reversed(recent[:-1]):
+            text = self._format(exchange)
+            if estimate_tokens(text) > remaining:
+                break
+            exchanges.insert(0, text)
+            remaining -= estimate_tokens(text)
+
+        conversation = "\n".join(exchanges) or "No previous conversation"
+        sections = [system] if system else []
+        sections.append("Database Info:\n" + "\n".join(context_lines))
+        if summary:
+            sections.append(f"Earlier in the conversation:\n{summary}")
+        sections += [f"Recent conversation:\n{conversation}", user_block, cue]
+        prompt = "\n\n".join(sections)
+
+        self.last_report = {
+            "system": estimate_tokens(system),
+            "context": estimate_tokens("\n".join(context_lines)),
+            "summary": estimate_tokens(summary),
+            "history": estimate_tokens(conversation),
+            "total": estimate_tokens(prompt),
+            "budget": self.budget_tokens,
+        }
+        return prompt
+
+    @staticmethod
+    def _format(exchange):
+        return f"User: {exchange['user']}\nBot: {exchange['bot']}"
+
+    def reset(self):
+        self.memory.reset()
+
+
+# Test the module
+if __name__ == "__main__":
+    builder = PromptBuilder(budget_tokens=260, memory=ConversationMemory(keep_turns=2, summary_tokens=60))
+    system = "You are a friendly sales assistant for MYG Kerala. Keep answers short."
+    context = "\n".join(f"- Product {i} (₹{i * 10000:,})" for i in range(1, 8))
+    history = []
+    for turn in range(10):
+        user_input = f"Tell me about option {turn}, my budget is {50000 + turn * 5000}"
+        prompt = builder.build(system, context, history, user_input, "Assistant:")
+        print(f"turn {turn + 1:2}: {builder.last_report}")
+        history.append({"user": user_input,
+                        "bot": f"Product {turn} costs ₹{turn * 10000 + 4999:,} with 16GB RAM. Anything else?"})
+    print("\n" + prompt)
@@ -0,0 +1,139 @@
+"""
+Resample Module
+NumPy streaming polyphase resampler and int16/float32 conversion helpers,
+so audio devices can run at their native rate and convert once
+"""
+
+from math import gcd
+
+import numpy as np
+
+
+# ---------- Format conversion ----------
+
+def int16_to_float32(data):
+    """16-bit PCM bytes -> float32 samples in [-1, 1)"""
+    return np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def float32_to_int16(samples):
+    """float32 samples -> clipped 16-bit PCM bytes"""
+    scaled = np.clip(np.rint(np.asarray(samples) * 32768.0), -32768, 32767)
+    return scaled.astype(np.int16).tobytes()
+
+
+def to_mono(samples, channels):
+    """Average interleaved channels"""
+    if channels == 1:
+        return samples
+    return samples.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+
+
+def from_mono(samples, channels):
+    """Duplicate mono samples into interleaved channels"""
+    if channels == 1:
+        return samples
+    return np.repeat(samples, channels)
+
+
+# ---------- Resampling ----------
+
+class StreamingResampler:
+    """
+    Rational-ratio polyphase FIR resampler for mono audio.
+
+    Keeps the filter history and the output phase between calls, so audio
+    can be converted chunk by chunk with no clicks at chunk boundaries.
+    Each call is one vectorized gather + multiply-accumulate.
+    """
+
+    def __init__(self, in_rate, out_rate, taps_per_phase=16, rolloff=0.9, kaiser_beta=8.0):
+        """
+        Args:
+            in_rate / out_rate: Sample rates in Hz
+            taps_per_phase: Filter length per polyphase branch (quality vs CPU)
+            rolloff: Passband edge as a fraction of the lower Nyquist frequency
+        """
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        divisor = gcd(in_rate, out_rate)
+        self.up = out_rate // divisor
+        self.down = in_rate // divisor
+        self.taps_per_phase = taps_per_phase
+
+        # Windowed-sinc low-pass at the upsampled rate
+        num_taps = taps_per_phase * self.up
+        cutoff = rolloff * 0.5 * min(1.0 / self.up, 1.0 / self.down)
+        n = np.arange(num_taps) - (num_taps - 1) / 2
+        taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(num_taps, kaiser_beta)
+        taps *= self.up / taps.sum()
+
+        # phases[p, k] multiplies x[i - k] for output phase p
+        self._phases = taps.reshape(taps_per_phase, self.up).T.astype(np.float32)
+        self._offsets = np.arange(taps_per_phase)
+
+        self.reset()
+
+    def reset(self):
+        """Forget history (e.g. between unrelated streams)"""
+        self._history = np.zeros(self.taps_per_phase - 1, dtype=np.float32)
+        self._t = 0  # Next output position, in upsampled samples from the chunk start
+
+    @property
+    def passthrough(self):
+        return self.up == self.down
+
+    def process(self, samples):
+        """Resample a float32 chunk; returns the float32 output available so far"""
+        samples = np.asarray(samples, dtype=np.float32)
+        if self.passthrough:
+            return samples
+
+        count = len(samples)
+        span = count * self.up
+        if span <= self._t:
+            self._t -= span
+            self._history = np.concatenate((self._history, samples))[-(self.taps_per_phase - 1):]
+            return np.zeros(0, dtype=np.float32)
+
+        outputs = -(-(span - self._t) // self.down)  # ceil
+        t = self._t + self.down * np.arange(outputs)
+        index = t // self.up + (self.taps_per_phase - 1)
+        phase = t % self.up
+
+        extended = np.concatenate((self._history, samples))
+        window = extended[index[:, None] - self._offsets[None, :]]
+        result = np.einsum('ij,ij->i', window, self._phases[phase])
+
+        self._t = self._t + self.down * outputs - span
+        self._history = extended[-(self.taps_per_phase - 1):]
+        return result.astype(np.float32, copy=False)
+
+    def process_bytes(self, data):
+        """Resample 16-bit PCM bytes"""
+        if self.passthrough:
+            return data
+        return float32_to_int16(self.process(int16_to_float32(data)))
+
+
+# Test the module
+if __name__ == "__main__":
+    import time
+
+    print("Resampler benchmark (1024-sample chunks, 60 s of audio)")
+    print("=" * 60)
+
+    for in_rate, out_rate in [(48000, 16000), (44100, 16000), (16000, 24000), (24000, 48000)]:
+        resampler = StreamingResampler(in_rate, out_rate)
+        t = np.arange(in_rate * 60) / in_rate
+        signal = (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+        pcm = float32_to_int16(signal)
+
+        started = time.perf_counter()
+        produced = 0
+        for offset in range(0, len(pcm), 2048):
+            produced += len(resampler.process_bytes(pcm[offset:offset + 2048])) // 2
+        elapsed = time.perf_counter() - started
+
+        print(f"{in_rate:>6} -> {out_rate:<6} {produced / out_rate:6.2f} s out, "
+              f"{60 / elapsed:7.0f}x real time")
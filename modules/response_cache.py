@@ -0,0 +1,219 @@
+"""
+Response Cache Module
+Caches LLM replies for repeated customer queries, keyed by the normalized
+query, the products retrieved for it, the recent conversation and the
+version of the static prompt (instructions, offers)
+"""
+
+import collections
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+
+# Fields whose change makes a cached reply about a product stale
+VERSION_FIELDS = ('price', 'original_price', 'discount', 'stock', 'in_stock', 'stock_status')
+
+
+def normalize_query(text):
+    """
+    Case-folded NFC text without punctuation, so "Laptop under 50,000?" and
+    "laptop under 50000" share an entry (Malayalam vowel signs are kept)
+    """
+    text = unicodedata.normalize('NFC', text).casefold()
+    text = re.sub(r'(?<=\d),(?=\d)', '', text)  # 50,000 -> 50000
+    text = ''.join(c if not unicodedata.category(c).startswith(('P', 'S')) else ' ' for c in text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def product_id(product):
+    """Catalog ID (products.json 'id', MCP API 'id'/'product_id')"""
+    for field in ('id', 'product_id'):
+        if product.get(field) is not None:
+            return str(product[field])
+    return str(product.get('name') or product.get('product_name'))
+
+
+def product_version(product):
+    """Fingerprint of a product's price and stock fields"""
+    values = {field: product.get(field) for field in VERSION_FIELDS if field in product}
+    return hashlib.sha256(json.dumps(values, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def history_fingerprint(history):
+    """Fingerprint of the exchanges that go into the prompt ([{'user','bot'}, ...])"""
+    if not history:
+        return ''
+    raw = "\x1e".join(f"{normalize_query(h['user'])}\x1f{h['bot']}" for h in history)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]
+
+
+class ResponseCache:
+    """
+    LRU of LLM replies with a TTL.
+
+    Each entry remembers the price/stock fingerprint of the products it was
+    generated from. A lookup with the currently retrieved products misses
+    (and drops the entry) if any of them changed, so a reply never quotes
+    an old price. update_catalog() drops affected entries eagerly. The
+    static context version is part of the key, so a reply never outlives
+    the offers it was generated with.
+    """
+
+    def __init__(self, max_entries=256, ttl_s=3600):
+        """
+        Args:
+            max_entries: LRU capacity
+            ttl_s: Seconds a reply stays valid even if the catalog does not change
+        """
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._entries = collections.OrderedDict()  # key -> entry dict
+        self._by_product = collections.defaultdict(set)  # product id -> keys
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.saved_ms = 0.0
+
+    # ---------- Keys ----------
+
+    @staticmethod
+    def key(query, products=(), history=None, context=None):
+        ids = sorted(product_id(p) for p in products)
+        raw = "\x1f".join([normalize_query(query), ",".join(ids), history_fingerprint(history),
+                           str(context or '')])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    # ---------- Lookup ----------
+
+    def get(self, query, products=(), history=None, context=None):
+        """
+        Cached reply for the query with these retrieved products, or None
+        Args:
+            context: Static context version the reply must have been generated with
+        """
+        key = self.key(query, products, history, context)
+        current = {product_id(p): product_version(p) for p in products}
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if time.monotonic() - entry['created'] > self.ttl_s:
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            if entry['versions'] != current:
+                self._drop(key)
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_ms += entry['latency_ms']
+            return entry['response']
+
+    def put(self, query, products, history, response, latency_ms=0.0, context=None):
+        """
+        Store a reply
+        Args:
+            latency_ms: What generating it cost (credited to saved_ms on each hit)
+            context: Static context version it was generated with
+        """
+        if not response:
+            return
+        key = self.key(query, products, history, context)
+        versions = {product_id(p): product_version(p) for p in products}
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = {
+                'response': response,
+                'versions': versions,
+                'created': time.monotonic(),
+                'latency_ms': latency_ms,
+            }
+            for pid in versions:
+                self._by_product[pid].add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    # ---------- Invalidation ----------
+
+    def update_catalog(self, products):
+        """Drop entries that quote a product whose price or stock changed; returns the count"""
+        current = {product_id(p): product_version(p) for p in products}
+        dropped = 0
+        with self._lock:
+            for pid, version in current.items():
+                for key in list(self._by_product.get(pid, ())):
+                    entry = self._entries.get(key)
+                    if entry is not None and entry['versions'].get(pid) != version:
+                        self._drop(key)
+                        dropped += 1
+            self.invalidations += dropped
+        return dropped
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_product.clear()
+
+    def _drop(self, key):
+        """Remove an entry and its product index (caller holds the lock)"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for pid in entry['versions']:
+            keys = self._by_product.get(pid)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_product[pid]
+
+    # ---------- Metrics ----------
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "saved_ms": round(self.saved_ms, 1),
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "entries": len(self._entries),
+        }
+
+
+# Test the module
+if __name__ == "__main__":
+    cache = ResponseCache(max_entries=2, ttl_s=60)
+    laptop = {"id": "LP001", "name": "HP Pavilion 15", "price": 54999, "stock": 8, "in_stock": True}
+
+    print(normalize_query("  Laptop under 50,000?? "), "|", normalize_query("ലാപ്ടോപ്പ് വേണം!"))
+
+    print("miss:", cache.get("Laptop under 60000?", [laptop]))
+    cache.put("Laptop under 60000?", [laptop], [], "The HP Pavilion 15 is ₹54,999.", latency_ms=850)
+    print("hit:", cache.get("laptop under 60000", [laptop]))
+
+    # Price drop: the cached reply quotes the old price
+    cheaper = dict(laptop, price=49999)
+    print("after price change:", cache.get("laptop under 60000", [cheaper]))
+
+    cache.put("laptop under 60000", [cheaper], [], "The HP Pavilion 15 is ₹49,999.", latency_ms=900)
+    print("stock update dropped:", cache.update_catalog([dict(cheaper, stock=0, in_stock=False)]))
+
+    # New offers in the static prompt: replies generated with the old ones miss
+    cache.put("any offers", [], [], "10% off on laptops.", latency_ms=800, context="offers-v1")
+    print("offers changed:", cache.get("any offers", [], [], context="offers-v2"))
+
+    cache.put("hello", [], [], "Hello! How can I help?", latency_ms=700)
+    cache.get("Hello!")
+    print(cache.stats())
@@ -0,0 +1,271 @@
+"""
+Response Pipeline Module
+Streams an LLM reply into TTS sentence by sentence, so sentence N+1 is
+synthesized while sentence N plays
+"""
+
+import queue
+import re
+import threading
+import time
+
+# Sentence ends: ASCII / Devanagari danda punctuation followed by whitespace, or a line break.
+# Malayalam uses the ASCII full stop, so "₹45,999.00" (no space after '.') is not split.
+_BOUNDARY = re.compile(r'(?<=[.!?।॥])\s+|\n+')
+# A full stop after these (or before a digit) does not end the sentence: "Rs. 45,999", "No. 1"
+_ABBREVIATION = re.compile(r'(?:\b(?:rs|dr|mr|mrs|ms|no|nos|st|sr|jr|vs|approx|inc|ltd|etc|e\.g|i\.e)\.)$',
+                           re.IGNORECASE)
+_MARKDOWN = re.compile(r'[*_#`>]+')
+
+_DONE = object()
+
+
+def split_sentences(chunks, min_chars=20, max_chars=200):
+    """
+    Re-chunk streamed text at sentence boundaries
+    Args:
+        chunks: Iterable of text fragments as they arrive from the model
+        min_chars: Shorter pieces are merged into the next one ("Yes. ")
+        max_chars: Longer pieces are cut at the last comma/space
+    Yields:
+        Sentences, as soon as each one is complete
+    """
+    pending = ""
+    for chunk in chunks:
+        if not chunk:
+            continue
+        pending += chunk
+        while True:
+            sentence, pending = _take_sentence(pending, min_chars, max_chars)
+            if sentence is None:
+                break
+            yield sentence
+
+    pending = pending.strip()
+    if pending:
+        yield pending
+
+
+def _take_sentence(text, min_chars, max_chars):
+    """(sentence, rest) if text holds a complete sentence, else (None, text)"""
+    for match in _BOUNDARY.finditer(text):
+        if match.group().startswith((' ', '\t')) and _continues(text, match):
+            continue
+        if len(text[:match.start()].strip()) >= min_chars:
+            return text[:match.start()].strip(), text[match.end():]
+
+    if len(text) > max_chars:
+        cut = max(text.rfind(',', 0, max_chars), text.rfind(' ', 0, max_chars))
+        if cut > min_chars:
+            return text[:cut + 1].strip(), text[cut + 1:]
+    return None, text
+
+
+def _continues(text, match):
+    """True if the full stop before match is an abbreviation or precedes a number"""
+    if text[match.start() - 1] != '.':
+        return False
+    if match.end() < len(text) and text[match.end()].isdigit():
+        return True
+    return _ABBREVIATION.search(text, 0, match.start()) is not None
+
+
+def clean_for_speech(text):
+    """Drop markdown the model may emit (bullets, bold) so TTS does not read it"""
+    return re.sub(r'\s+', ' ', _MARKDOWN.sub(' ', text)).strip()
+
+
+class SpeechPipeline:
+    """
+    Three overlapping stages connected by queues:
+    text stream -> sentences -> synthesize(sentence) -> play(audio)
+
+    synthesize and play are supplied by the caller, so the pipeline works
+    with any TTS engine and output path. Synthesis runs at most lookahead
+    sentences ahead of playback. Alternatively a TTSService can be given,
+    which then owns synthesis look-ahead and playback.
+    """
+
+    def __init__(self, synthesize=None, play=None, lookahead=2, min_chars=20, max_chars=200,
+                 cleanup=None, service=None):
+        """
+        Args:
+            synthesize: sentence -> audio (anything play() accepts)
+            play: audio -> None, blocking until played
+            lookahead: Synthesized sentences allowed to wait for playback
+            cleanup: Optional audio -> None for audio that is never played
+            service: modules.tts_service.TTSService used instead of synthesize/play
+        """
+        if service is None and (synthesize is None or play is None):
+            raise ValueError("SpeechPipeline needs synthesize and play, or a service")
+        self.service = service
+        self.synthesize = synthesize
+        self.play = play
+        self.cleanup = cleanup
+        self.lookahead = lookahead
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self._cancelled = threading.Event()
+        self.metrics = {}
+
+    def cancel(self):
+        """Stop after the sentence currently playing (e.g. barge-in)"""
+        self._cancelled.set()
+        if self.service is not None:
+            self.service.cancel()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def speak(self, chunks):
+        """
+        Speak a streamed reply; blocks until playback finishes or is cancelled
+        Returns:
+            The full text that was received from the stream
+        """
+        self._cancelled.clear()
+        if self.service is not None:
+            return self._speak_service(chunks)
+        started = time.perf_counter()
+        self.metrics = {"sentences": 0}
+        sentences = queue.Queue()
+        audio = queue.Queue(maxsize=self.lookahead)
+        received = []
+        errors = []
+
+        def mark(name):
+            self.metrics.setdefault(name, round((time.perf_counter() - started) * 1000, 1))
+
+        def produce():
+            try:
+                def tracked():
+                    for chunk in chunks:
+                        if chunk:
+                            mark("first_token_ms")
+                            received.append(chunk)
+                        yield chunk
+                for sentence in split_sentences(tracked(), self.min_chars, self.max_chars):
+                    if self.cancelled:
+                        break
+                    mark("first_sentence_ms")
+                    sentences.put(sentence)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                sentences.put(_DONE)
+
+        def synthesize():
+            try:
+                while True:
+                    sentence = sentences.get()
+                    if sentence is _DONE or self.cancelled:
+                        break
+                    text = clean_for_speech(sentence)
+                    if not text:
+                        continue
+                    result = self.synthesize(text)
+                    mark("first_synthesis_ms")
+                    audio.put(result)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                audio.put(_DONE)
+
+        threads = [threading.Thread(target=produce, daemon=True),
+                   threading.Thread(target=synthesize, daemon=True)]
+        for thread in threads:
+            thread.start()
+
+        # Playback stays on the calling thread
+        while True:
+            item = audio.get()
+            if item is _DONE:
+                break
+            if self.cancelled:
+                self._discard(item)
+                continue
+            mark("first_audio_ms")
+            self.play(item)
+            self.metrics["sentences"] += 1
+            self._discard(item)
+
+        for thread in threads:
+            thread.join(timeout=1)
+        self.metrics["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        if errors and not received:
+            raise errors[0]
+        for e in errors:
+            print(f"⚠️ Speech pipeline error: {e}")
+        return "".join(received)
+
+    def _speak_service(self, chunks):
+        """Submit sentences to the TTS service as they complete, then wait for playback"""
+        started = time.perf_counter()
+        self.metrics = {"sentences": 0}
+        received = []
+        requests = []
+
+        def tracked():
+            for chunk in chunks:
+                if chunk:
+                    self.metrics.setdefault("first_token_ms",
+                                            round((time.perf_counter() - started) * 1000, 1))
+                    received.append(chunk)
+                yield chunk
+
+        for sentence in split_sentences(tracked(), self.min_chars, self.max_chars):
+            # Cancelling the service directly (barge-in) also ends the reply
+            if self.cancelled or any(r.cancelled for r in requests):
+                break
+            text = clean_for_speech(sentence)
+            if text:
+                requests.append(self.service.submit(text))
+
+        for request in requests:
+            request.wait()
+        played = [r for r in requests if 'play_start' in r.timings and not r.cancelled]
+        self.metrics["sentences"] = len(played)
+        self.metrics["interrupted"] = any(r.cancelled for r in requests)
+        if requests and 'play_start' in requests[0].timings:
+            self.metrics["first_audio_ms"] = round((requests[0].timings['play_start'] - started) * 1000, 1)
+        self.metrics["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return "".join(received)
+
+    def _discard(self, item):
+        if self.cleanup is not None:
+            try:
+                self.cleanup(item)
+            except Exception:
+                pass
+
+    def summary(self):
+        m = self.metrics
+        return (f"first token {m.get('first_token_ms', 0):.0f} ms, "
+                f"first audio {m.get('first_audio_ms', 0):.0f} ms, "
+                f"total {m.get('total_ms', 0):.0f} ms, {m.get('sentences', 0)} sentences")
+
+
+# Test the module
+if __name__ == "__main__":
+    reply = ["നമസ്കാരം! ", "ഞങ്ങളുടെ പക്കൽ ", "മികച്ച ലാപ്ടോപ്പുകൾ ഉണ്ട്. HP Pavilion ", "₹45,999.00 ആണ് വില. ",
+             "Rs. 500 ", "കിഴിവും ലഭ്യമാണ്. ", "നിങ്ങളുടെ ബജറ്റ് എത്രയാണ്?"]
+    for sentence in split_sentences(reply):
+        print(f"- {sentence}")
+
+    # Abbreviations and prices stay in one sentence
+    price = ["The HP Pavilion 15 costs Rs. 45,999 with a 10% discount. ", "Dr. Fixit is at shop No. 4. Anything else?"]
+    sentences = list(split_sentences(price))
+    assert sentences == ["The HP Pavilion 15 costs Rs. 45,999 with a 10% discount.",
+                         "Dr. Fixit is at shop No. 4.", "Anything else?"], sentences
+    print(f"- {sentences[0]}")
+
+    def slow_stream():
+        for part in reply:
+            time.sleep(0.1)
+            yield part
+
+    pipeline = SpeechPipeline(synthesize=lambda s: (time.sleep(0.2), s)[1],
+                              play=lambda s: time.sleep(0.3))
+    pipeline.speak(slow_stream())
+    print(pipeline.summary())
@@ -0,0 +1,232 @@
+"""
+Segment TTS Module
+Concatenative synthesis for catalog values: prices and product names are
+spliced from pre-rendered audio, only the carrier phrases around them are
+synthesized
+"""
+
+import re
+import threading
+
+import numpy as np
+
+# ₹64,999 / Rs. 64,999 / INR 64999 (paise are dropped)
+PRICE = re.compile(r'(?:₹|\bRs\.?|\bINR)\s?(\d[\d,]*)(?:\.\d{1,2})?', re.IGNORECASE)
+
+ONES = ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine",
+        "ten", "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen",
+        "seventeen", "eighteen", "nineteen"]
+TENS = ["", "", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"]
+
+# Indian numbering: crore (10^7), lakh (10^5), thousand (10^3)
+MAGNITUDES = [(10 ** 7, "crore"), (10 ** 5, "lakh"), (1000, "thousand")]
+CURRENCY = "rupees"
+
+
+def _below_hundred(n):
+    if n < 20:
+        return ONES[n]
+    return TENS[n // 10] + ("" if n % 10 == 0 else " " + ONES[n % 10])
+
+
+def number_units(n):
+    """
+    Spoken units for a non-negative integer, Indian style
+    64999 -> ['sixty four', 'thousand', 'nine', 'hundred', 'ninety nine']
+    """
+    if n == 0:
+        return [ONES[0]]
+    units = []
+    for value, word in MAGNITUDES:
+        if n >= value:
+            count, n = divmod(n, value)
+            units += number_units(count) + [word]
+    if n >= 100:
+        units += [ONES[n // 100], "hundred"]
+        n %= 100
+    if n:
+        units.append(_below_hundred(n))
+    return units
+
+
+def price_units(amount):
+    return number_units(amount) + [CURRENCY]
+
+
+def all_units():
+    """Every unit number_units/price_units can produce"""
+    return ([_below_hundred(n) for n in range(100)] +
+            ["hundred"] + [word for _, word in MAGNITUDES] + [CURRENCY])
+
+
+class SegmentSynthesizer:
+    """
+    TTS backend wrapper (same render(text) -> PCM interface) that splits a
+    reply into carrier text, prices and catalog product names.
+
+    Number units and product names are rendered once (pre-warmed at catalog
+    load, persisted by the wrapped backend's cache) and kept as trimmed PCM
+    in memory, so "The Samsung 55\" QLED is ₹64,999" costs one synthesis
+    call for "The ... is" instead of one for the whole sentence - and none
+    once that carrier has been heard before.
+    """
+
+    def __init__(self, backend, unit_gap_ms=30, segment_gap_ms=90, silence_threshold=300):
+        """
+        Args:
+            backend: Wrapped TTS backend (render(text) -> 16-bit mono PCM)
+            unit_gap_ms: Pause between the words of a price
+            segment_gap_ms: Pause between carrier text and a spliced value
+            silence_threshold: Amplitude below which leading/trailing audio is trimmed
+        """
+        self.backend = backend
+        self.rate = backend.rate
+        self.max_workers = backend.max_workers
+        self.silence_threshold = silence_threshold
+        self._unit_gap = np.zeros(int(self.rate * unit_gap_ms / 1000), dtype=np.int16)
+        self._segment_gap = np.zeros(int(self.rate * segment_gap_ms / 1000), dtype=np.int16)
+
+        self._clips = {}  # Phrase -> trimmed PCM (int16 array)
+        self._lock = threading.Lock()
+        self._names = []
+        self._name_pattern = None
+
+        # Metrics
+        self.spliced_segments = 0
+        self.synthesized_segments = 0
+
+    # ---------- Catalog ----------
+
+    def load_catalog(self, names, background=True):
+        """
+        Register product names and pre-render them with all price units
+        Args:
+            names: Product names as they appear in replies
+        """
+        self._names = sorted({name.strip() for name in names if name and name.strip()},
+                             key=len, reverse=True)
+        if self._names:
+            self._name_pattern = re.compile(
+                '|'.join(re.escape(name) for name in self._names), re.IGNORECASE)
+        phrases = all_units() + self._names
+        print(f"✓ Segment TTS: {len(self._names)} product names, {len(all_units())} number units")
+        if hasattr(self.backend, 'prewarm'):
+            return self.backend.prewarm(phrases, background=background)
+        return None
+
+    def prewarm(self, phrases, background=True):
+        if hasattr(self.backend, 'prewarm'):
+            return self.backend.prewarm(phrases, background=background)
+        return None
+
+    # ---------- Segmentation ----------
+
+    def segments(self, text):
+        """
+        Split text into ('text', str), ('price', [units]) and ('name', str) segments
+        Prices are verbalized; product names keep their catalog spelling.
+        """
+        matches = []
+        for match in PRICE.finditer(text):
+            amount = int(match.group(1).replace(',', ''))
+            matches.append((match.start(), match.end(), 'price', price_units(amount)))
+        if self._name_pattern is not None:
+            for match in self._name_pattern.finditer(text):
+                name = next(n for n in self._names if n.lower() == match.group(0).lower())
+                matches.append((match.start(), match.end(), 'name', name))
+
+        result = []
+        position = 0
+        for start, end, kind, value in sorted(matches):
+            if start < position:
+                continue  # Overlaps an earlier match
+            carrier = text[position:start]
+            if re.search(r'\w', carrier):
+                result.append(('text', carrier.strip()))
+            result.append((kind, value))
+            position = end
+        tail = text[position:]
+        if re.search(r'\w', tail):
+            result.append(('text', tail.strip()))
+        return result
+
+    # ---------- Rendering ----------
+
+    def _clip(self, phrase):
+        """Trimmed PCM for a unit or product name"""
+        with self._lock:
+            clip = self._clips.get(phrase)
+        if clip is None:
+            clip = self._trim(np.frombuffer(self.backend.render(phrase), dtype=np.int16))
+            with self._lock:
+                self._clips[phrase] = clip
+        return clip
+
+    def _trim(self, samples):
+        """Drop leading/trailing silence, keeping 10 ms on each side"""
+        loud = np.flatnonzero(np.abs(samples.astype(np.int32)) > self.silence_threshold)
+        if loud.size == 0:
+            return samples
+        pad = int(self.rate * 0.01)
+        return samples[max(0, loud[0] - pad):loud[-1] + 1 + pad]
+
+    def render(self, text):
+        """Text -> PCM, splicing pre-rendered values into synthesized carrier text"""
+        parts = self.segments(text)
+        if all(kind == 'text' for kind, _ in parts):
+            self.synthesized_segments += 1
+            return self.backend.render(text)
+
+        pieces = []
+        for kind, value in parts:
+            if pieces:
+                pieces.append(self._segment_gap)
+            if kind == 'text':
+                self.synthesized_segments += 1
+                pieces.append(self._trim(np.frombuffer(self.backend.render(value), dtype=np.int16)))
+            elif kind == 'name':
+                self.spliced_segments += 1
+                pieces.append(self._clip(value))
+            else:
+                self.spliced_segments += 1
+                for i, unit in enumerate(value):
+                    if i:
+                        pieces.append(self._unit_gap)
+                    pieces.append(self._clip(unit))
+        return np.concatenate(pieces).astype(np.int16).tobytes()
+
+    def stats(self):
+        return {
+            "spliced_segments": self.spliced_segments,
+            "synthesized_segments": self.synthesized_segments,
+            "clips_in_memory": len(self._clips),
+        }
+
+
+# Test the module
+if __name__ == "__main__":
+    for amount in [0, 7, 64999, 149999, 1250000, 23456789]:
+        print(f"{amount:>10,}  {' '.join(price_units(amount))}")
+
+    class ToneBackend:
+        """Stand-in engine: 100 ms of tone per word, wrapped in silence"""
+        rate = 16000
+        max_workers = 1
+        calls = 0
+
+        def render(self, text):
+            ToneBackend.calls += 1
+            words = len(text.split())
+            tone = (np.sin(np.arange(1600 * words) * 0.1) * 8000).astype(np.int16)
+            silence = np.zeros(800, dtype=np.int16)
+            return np.concatenate([silence, tone, silence]).tobytes()
+
+    synth = SegmentSynthesizer(ToneBackend())
+    synth.load_catalog(['Samsung 55" 4K QLED Smart TV', 'LG 43" Full HD Smart LED TV'])
+    reply = 'The Samsung 55" 4K QLED Smart TV is ₹64,999, and the LG 43" Full HD Smart LED TV is Rs. 32,999.'
+    print(synth.segments(reply))
+    for turn in range(2):
+        ToneBackend.calls = 0
+        pcm = synth.render(reply)
+        print(f"turn {turn + 1}: {len(pcm) / 2 / 16000:.2f} s audio, {ToneBackend.calls} backend calls")
+    print(synth.stats())
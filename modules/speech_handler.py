@@ -3,32 +3,55 @@ Speech Handler Module
 Handles Text-to-Speech (pyttsx3) and Speech-to-Text (Google Cloud)
 """
 
-import pyttsx3
 import pyaudio
-import wave
 import os
+import sys
+import threading
 from google.cloud import speech
 import time
 
+# Add parent directory to path to import from modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.audio_buffer import CaptureBuffer
+from modules.audio_device import AudioDeviceManager
+from modules.endpointing import UtteranceDetector
+from modules import audio_codec
+from modules.barge_in import BargeInMonitor
+from modules.tts_cache import TTSCache
+from modules.tts import Pyttsx3Backend
+from modules.tts_service import TTSService
+from modules.segment_tts import SegmentSynthesizer
+from modules.response_pipeline import SpeechPipeline
+import config
+
 class SpeechHandler:
-    def __init__(self, google_credentials_path):
-        """Initialize TTS and STT clients"""
+    def __init__(self, google_credentials_path, streaming=None, barge_in=None):
+        """
+        Initialize TTS and STT clients
+        
+        Args:
+            google_credentials_path: Path to the Google Cloud service account JSON
+            streaming: Use streaming recognition (defaults to the STT_STREAMING env var)
+            barge_in: Let the customer interrupt speak() (defaults to the BARGE_IN env var, off)
+        """
         
         # Set up Google Cloud credentials
         os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = google_credentials_path
         
-        # Initialize Text-to-Speech (pyttsx3)
-        self.tts_engine = pyttsx3.init()
-        self.tts_engine.setProperty('rate', 150)  # Speed of speech
-        self.tts_engine.setProperty('volume', 1.0)  # Volume
-        
-        # Get available voices
-        voices = self.tts_engine.getProperty('voices')
-        if len(voices) > 0:
-            self.tts_engine.setProperty('voice', voices[0].id)  # Default voice
-        
         # Initialize Speech-to-Text client
         self.stt_client = speech.SpeechClient()
+        self.language_code = 'en-IN'  # English (India)
+        
+        # Streaming mode transcribes while the user speaks instead of after
+        if streaming is None:
+            streaming = os.getenv('STT_STREAMING', 'false').lower() in ('1', 'true', 'yes')
+        self.streaming = streaming
+        
+        # Upload codec: 'pcm' (LINEAR16), 'flac' or 'ogg_opus'
+        self.stt_codec = audio_codec.check_codec(os.getenv('STT_CODEC', 'pcm'))
+        self.transport = audio_codec.TransportStats()  # Upload bytes for the last turn
+        self.on_interim = None  # Optional callback(text) for interim transcripts
         
         # Audio recording settings
         self.CHUNK = 1024
@@ -36,16 +59,146 @@ class SpeechHandler:
         self.CHANNELS = 1
         self.RATE = 16000
         
-        print("✓ Speech Handler initialized")
+        # Microphone is opened once and shared by every listen() call
+        self.devices = AudioDeviceManager(
+            rate=self.RATE,
+            chunk=self.CHUNK,
+            channels=self.CHANNELS,
+            format=self.FORMAT
+        )
+        
+        # Voice activity detection (30 ms frames) + adaptive end-of-turn:
+        # noise floor tracking and a variable trailing-silence window
+        self.detector = UtteranceDetector(
+            rate=self.RATE,
+            frame_ms=30,
+            preroll_ms=300,
+            energy_threshold=500,
+            base_silence_ms=800,
+            min_silence_ms=300,
+            max_silence_ms=2000
+        )
+        self.vad = self.detector.vad
+        self.endpointer = self.detector.endpointer
+        
+        # Reused across turns so capture never touches the disk
+        self.capture = CaptureBuffer(rate=self.RATE, channels=self.CHANNELS,
+                                     sample_width=pyaudio.get_sample_size(self.FORMAT))
+        
+        # Set to True to keep the last utterance as an in-memory WAV (self.last_wav)
+        self.archive_audio = False
+        self.last_wav = None
+        
+        # Barge-in: keep listening while speaking, stop TTS when the customer talks.
+        # Off by default: without echo cancellation, loud speakers close to the
+        # mic can still interrupt the bot's own reply (use a headset)
+        if barge_in is None:
+            barge_in = os.getenv('BARGE_IN', 'false').lower() in ('1', 'true', 'yes')
+        self.barge_in_enabled = barge_in
+        self.barge_in = BargeInMonitor(self.devices, rate=self.RATE)
+        
+        # Text-to-Speech (pyttsx3) runs on its own thread: speech is rendered
+        # to PCM ahead of playback and played on the shared output stream.
+        # Rendered audio for repeated phrases (welcome, goodbye, ...) is cached.
+        self.tts_cache = TTSCache(config.TTS_CACHE_DIR, name='pyttsx3',
+                                  max_disk_mb=config.TTS_CACHE_MAX_MB, extension='.wav')
+        self.tts_backend = Pyttsx3Backend(
+            rate=self.devices.output_rate,
+            speech_rate=config.TTS_RATE,
+            volume=config.TTS_VOLUME,
+            lang=self.language_code,
+            cache=self.tts_cache
+        )
+        # Prices and catalog product names are spliced from pre-rendered clips
+        self.tts_segments = SegmentSynthesizer(self.tts_backend)
+        self.tts = TTSService(self.tts_segments, self.devices, lookahead=2)
+        if self.barge_in_enabled:
+            self.tts.on_start(self.barge_in.start)
+            self.tts.on_idle(self.barge_in.stop)
+        self.barge_in.on_barge_in(self.tts.cancel)
+        self.last_stream_metrics = {}  # SpeechPipeline metrics of the last speak_stream()
+        
+        # Room noise floor from ambient audio, before anyone has spoken
+        try:
+            self.detector.calibrate(self.devices.window())
+        except Exception as e:
+            print(f"⚠️ Noise floor calibration skipped: {e}")
+        
+        mode = "streaming" if self.streaming else "batch"
+        print(f"✓ Speech Handler initialized (VAD: {self.vad.backend}, STT: {mode})")
     
     
     def speak(self, text):
         """
         Convert text to speech and play it
+        Returns True if the customer interrupted (barge-in); the audio they
+        spoke is picked up by the next listen()
+        """
+        request = self.speak_async(text)
+        request.wait()
+        
+        if request.cancelled:
+            print("[Barge-in - customer started speaking]")
+            return True
+        return False
+    
+    
+    def speak_async(self, text):
+        """
+        Queue text and return immediately with a TTSRequest
+        The next queued utterances are synthesized while this one plays, so
+        retrieval / the next LLM call can run in the meantime.
         """
         print(f"\nBot: {text}")
-        self.tts_engine.say(text)
-        self.tts_engine.runAndWait()
+        return self.tts.submit(text)
+    
+    
+    def speak_stream(self, chunks):
+        """
+        Speak a streamed reply sentence by sentence as the text arrives
+        Returns (full text, True if the customer interrupted)
+        """
+        pipeline = SpeechPipeline(service=self.tts)
+        print("\nBot: ", end="", flush=True)
+        
+        def echo():
+            for chunk in chunks:
+                print(chunk, end="", flush=True)
+                yield chunk
+        
+        text = pipeline.speak(echo())
+        print()
+        self.last_stream_metrics = pipeline.metrics
+        
+        if pipeline.metrics.get("interrupted"):
+            print("[Barge-in - customer started speaking]")
+            return text, True
+        return text, False
+    
+    
+    def prewarm(self, phrases):
+        """Render canned phrases into the TTS cache (in the background)"""
+        self.tts_backend.prewarm(phrases)
+    
+    
+    def load_catalog(self, product_names):
+        """Pre-render product names and price words for spliced playback"""
+        self.tts_segments.load_catalog(product_names)
+    
+    
+    def _start_turn(self):
+        """
+        Reset per-turn state
+        Returns (window, audio): a barged-in utterance continues from the
+        monitor's window with its pre-roll + onset audio
+        """
+        self.capture.clear()
+        self.detector.start_turn()
+        
+        barged = self.barge_in.take()
+        if barged:
+            return barged
+        return self.devices.window(backlog_ms=100), b""
     
     
     def listen(self, timeout=120):
@@ -56,26 +209,17 @@ class SpeechHandler:
         Args:
             timeout: Maximum seconds to wait for speech (default 120 = 2 minutes)
         """
-        print("\nUser: ", end="", flush=True)
+        if self.streaming:
+            return self._listen_streaming(timeout)
         
-        audio = pyaudio.PyAudio()
+        print("\nUser: ", end="", flush=True)
         
-        # Open microphone stream
-        stream = audio.open(
-            format=self.FORMAT,
-            channels=self.CHANNELS,
-            rate=self.RATE,
-            input=True,
-            frames_per_buffer=self.CHUNK
-        )
+        # Per-turn window over the shared microphone (devices stay open between turns)
+        window, carried = self._start_turn()
         
         print("Listening...", end="", flush=True)
         
-        frames = []
-        silence_threshold = 500  # Amplitude threshold for silence
-        silence_duration = 0
-        max_silence = 3  # 3 seconds of silence = end of speech
-        recording = False
+        self.capture.append(self.detector.feed(carried))
         start_time = time.time()
         
         try:
@@ -86,58 +230,44 @@ class SpeechHandler:
                     print("\n[Timeout - 2 minutes of silence]")
                     return None
                 
-                data = stream.read(self.CHUNK, exception_on_overflow=False)
-                frames.append(data)
+                data = window.read(timeout=0.5)
+                if data is None:
+                    continue
                 
-                # Calculate audio level
-                audio_level = sum(abs(int.from_bytes(data[i:i+2], 'little', signed=True)) 
-                                for i in range(0, len(data), 2)) / len(data) * 2
+                # Keep only pre-roll + speech audio
+                voiced = self.detector.feed(data)
+                if voiced:
+                    self.capture.append(voiced)
                 
-                # Detect speech start
-                if audio_level > silence_threshold:
-                    recording = True
-                    silence_duration = 0
+                if self.vad.in_speech:
                     print(".", end="", flush=True)
-                else:
-                    if recording:
-                        silence_duration += 1
                 
-                # End recording after silence
-                if recording and silence_duration > max_silence * (self.RATE / self.CHUNK):
+                # End recording after trailing silence
+                if self.vad.speech_ended:
                     break
                 
         except KeyboardInterrupt:
             print("\n[Recording stopped by user]")
             return None
-        finally:
-            stream.stop_stream()
-            stream.close()
-            audio.terminate()
         
-        if not recording:
+        if not self.vad.speech_started:
             print("\n[No speech detected]")
             return None
         
-        # Save audio to temporary file
-        temp_audio = "temp_audio.wav"
-        wf = wave.open(temp_audio, 'wb')
-        wf.setnchannels(self.CHANNELS)
-        wf.setsampwidth(audio.get_sample_size(self.FORMAT))
-        wf.setframerate(self.RATE)
-        wf.writeframes(b''.join(frames))
-        wf.close()
+        self.detector.finish_turn()
+        
+        if self.archive_audio:
+            self.last_wav = self.capture.to_wav()
         
         # Transcribe using Google Cloud STT
         try:
-            with open(temp_audio, 'rb') as audio_file:
-                content = audio_file.read()
+            self.transport.reset()
+            content = audio_codec.encode(self.capture.view(), self.stt_codec,
+                                         self.RATE, self.CHANNELS, stats=self.transport)
+            self._report_transport()
             
             audio_data = speech.RecognitionAudio(content=content)
-            config = speech.RecognitionConfig(
-                encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
-                sample_rate_hertz=self.RATE,
-                language_code='en-IN',  # English (India)
-            )
+            config = self._recognition_config()
             
             response = self.stt_client.recognize(config=config, audio=audio_data)
             
@@ -153,10 +283,143 @@ class SpeechHandler:
         except Exception as e:
             print(f"\n[Error transcribing: {e}]")
             return None
+    
+    
+    def _listen_streaming(self, timeout):
+        """
+        Streaming variant of listen()
+        Waits for local VAD onset, then streams pre-roll + speech to
+        streaming_recognize while the user talks. The turn ends on the
+        first final result (single_utterance) or local end of speech.
+        """
+        print("\nUser: ", end="", flush=True)
+        
+        window, carried = self._start_turn()
+        
+        print("Listening...", end="", flush=True)
+        
+        start_time = time.time()
+        first_audio = self.detector.feed(carried)
+        
+        # Wait for speech locally so silence is never uploaded
+        try:
+            while not self.vad.speech_started:
+                if time.time() - start_time > timeout:
+                    print("\n[Timeout - 2 minutes of silence]")
+                    return None
+                data = window.read(timeout=0.5)
+                if data is not None:
+                    first_audio = self.detector.feed(data)
+        except KeyboardInterrupt:
+            print("\n[Recording stopped by user]")
+            return None
+        
+        stop = threading.Event()
+        self.transport.reset()
+        encoder = audio_codec.StreamEncoder(self.stt_codec, self.RATE, self.CHANNELS,
+                                            stats=self.transport)
+        # The generator runs on the gRPC request thread: write() there and
+        # close() below must not overlap, and nothing is written after stop
+        encoder_lock = threading.Lock()
+        
+        def request_generator():
+            chunk = first_audio
+            while True:
+                if chunk:
+                    self.capture.append(chunk)
+                    with encoder_lock:
+                        encoded = b"" if stop.is_set() else encoder.write(chunk)
+                    if encoded:
+                        yield speech.StreamingRecognizeRequest(audio_content=encoded)
+                if stop.is_set() or self.vad.speech_ended:
+                    # The encoded tail goes out as the last request
+                    with encoder_lock:
+                        tail = encoder.close()
+                    if tail:
+                        yield speech.StreamingRecognizeRequest(audio_content=tail)
+                    return
+                data = window.read(timeout=0.5)
+                chunk = self.detector.feed(data) if data is not None else b""
+        
+        streaming_config = speech.StreamingRecognitionConfig(
+            config=self._recognition_config(),
+            interim_results=True,
+            single_utterance=True
+        )
+        end_of_utterance = speech.StreamingRecognizeResponse.SpeechEventType.END_OF_SINGLE_UTTERANCE
+        
+        transcript = None
+        try:
+            responses = self.stt_client.streaming_recognize(streaming_config, request_generator())
+            
+            for response in responses:
+                # Server heard the end of speech: stop sending audio
+                if response.speech_event_type == end_of_utterance:
+                    stop.set()
+                
+                if not response.results or not response.results[0].alternatives:
+                    continue
+                
+                result = response.results[0]
+                text = result.alternatives[0].transcript
+                
+                if result.is_final:
+                    transcript = text
+                    stop.set()
+                    break
+                
+                self.endpointer.update_transcript(text)
+                print(f"\r{text}", end="", flush=True)
+                if self.on_interim:
+                    self.on_interim(text)
+                    
+        except KeyboardInterrupt:
+            print("\n[Recording stopped by user]")
+            return None
+        except Exception as e:
+            print(f"\n[Error transcribing: {e}]")
+            return None
         finally:
-            # Clean up temp file
-            if os.path.exists(temp_audio):
-                os.remove(temp_audio)
+            stop.set()
+            # Waits for a write in progress; a no-op if the generator already closed it
+            with encoder_lock:
+                encoder.close()
+        
+        self._report_transport()
+        self.detector.finish_turn()
+        
+        if self.archive_audio:
+            self.last_wav = self.capture.to_wav()
+        
+        if transcript:
+            print(f"\r{transcript}")
+            return transcript
+        
+        print("\n[Could not understand audio]")
+        return None
+    
+    
+    def _recognition_config(self):
+        """STT config matching the upload codec"""
+        return speech.RecognitionConfig(
+            encoding=getattr(speech.RecognitionConfig.AudioEncoding,
+                             audio_codec.stt_encoding(self.stt_codec)),
+            sample_rate_hertz=self.RATE,
+            language_code=self.language_code,
+        )
+    
+    
+    def _report_transport(self):
+        """Print upload savings when compression is enabled"""
+        if self.stt_codec != 'pcm':
+            print(f"\n[STT upload ({self.stt_codec}): {self.transport.summary()}]")
+    
+    
+    def close(self):
+        """Stop speech output and release audio devices"""
+        self.tts.close()
+        self.tts_backend.close()
+        self.devices.close()
     
     
     def test_tts(self):
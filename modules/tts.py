@@ -0,0 +1,453 @@
+"""
+TTS Module
+Speech synthesis backends that render text to PCM in memory, and a simple
+blocking player for the gTTS scripts (no response.mp3, no playsound)
+"""
+
+import io
+import itertools
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import wave
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from gtts import gTTS
+
+# Add parent directory to path to import from modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import audio_codec
+from modules.audio_device import AudioDeviceManager
+from modules.resample import StreamingResampler, int16_to_float32, float32_to_int16, to_mono
+from modules.tts_cache import TTSCache
+
+GTTS_RATE = 24000  # gTTS returns 24 kHz mono MP3
+
+
+# ---------- Backends ----------
+# A backend renders text to 16-bit mono PCM at backend.rate. max_workers is
+# how many render() calls may run at once.
+
+class GTTSBackend:
+    """gTTS: MP3 into a BytesIO, decoded in memory (network bound, thread-safe)"""
+
+    max_workers = 4
+
+    def __init__(self, lang='ml', rate=GTTS_RATE, cache=None):
+        """
+        Args:
+            rate: PCM rate audio is decoded to
+            cache: Optional TTSCache for MP3 bytes
+        """
+        self.lang = lang
+        self.rate = rate
+        self.cache = cache
+
+    def synthesize(self, text):
+        """Text -> MP3 bytes (cached when a cache is configured)"""
+        if self.cache is not None:
+            return self.cache.get_or_create(text, self.lang, self._gtts)
+        return self._gtts(text)
+
+    def _gtts(self, text):
+        buffer = io.BytesIO()
+        gTTS(text=text, lang=self.lang).write_to_fp(buffer)
+        return buffer.getvalue()
+
+    def render(self, text):
+        return audio_codec.decode(self.synthesize(text), rate=self.rate)
+
+    def prewarm(self, phrases, background=True):
+        """Fill the cache with canned phrases"""
+        if self.cache is not None:
+            return self.cache.prewarm(phrases, self.lang, self._gtts, background=background)
+
+    def is_cached(self, text):
+        return self.cache is not None and (text, self.lang) in self.cache
+
+
+def _wav_to_pcm(data, rate):
+    """WAV bytes -> 16-bit mono PCM at rate"""
+    with wave.open(io.BytesIO(data), 'rb') as wf:
+        source_rate, channels = wf.getframerate(), wf.getnchannels()
+        if wf.getsampwidth() != 2:
+            raise ValueError("unsupported sample width")
+        # Streamed WAV headers may carry a placeholder length: read what is there
+        pcm = wf.readframes(max(wf.getnframes(), len(data)))
+    return _convert(pcm, source_rate, channels, rate)
+
+
+def _convert(pcm, source_rate, channels, rate):
+    if channels != 1 or source_rate != rate:
+        samples = to_mono(int16_to_float32(pcm[:len(pcm) // (2 * channels) * 2 * channels]), channels)
+        if source_rate != rate:
+            samples = StreamingResampler(source_rate, rate).process(samples)
+        pcm = float32_to_int16(samples)
+    return pcm
+
+
+class LocalBackend:
+    """
+    Offline CPU engine run as a subprocess (no network round trip).
+    espeak-ng writes WAV to stdout; Piper writes raw PCM at the model's rate.
+    """
+
+    max_workers = 2
+
+    ENGINES = ('espeak-ng', 'piper')
+
+    def __init__(self, engine='espeak-ng', voice='ml', rate=GTTS_RATE, native_rate=22050,
+                 speed=None):
+        """
+        Args:
+            engine: 'espeak-ng' or 'piper'
+            voice: espeak-ng voice name, or path to a Piper .onnx model
+            rate: PCM rate audio is converted to
+            native_rate: Piper model sample rate (see the model's .json)
+            speed: espeak-ng words per minute
+        """
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown local TTS engine '{engine}', expected one of {list(self.ENGINES)}")
+        self.engine = engine
+        self.voice = voice
+        self.rate = rate
+        self.native_rate = native_rate
+        self.speed = speed
+
+    @property
+    def available(self):
+        return shutil.which(self.engine) is not None
+
+    def render(self, text):
+        if self.engine == 'espeak-ng':
+            command = ['espeak-ng', '-v', self.voice, '--stdout']
+            if self.speed:
+                command += ['-s', str(self.speed)]
+            result = subprocess.run(command + [text], stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE, check=True)
+            return _wav_to_pcm(result.stdout, self.rate)
+
+        result = subprocess.run(['piper', '--model', self.voice, '--output_raw'],
+                                input=text.encode('utf-8'), stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, check=True)
+        return _convert(result.stdout, self.native_rate, 1, self.rate)
+
+
+class TieredBackend:
+    """
+    Network primary (gTTS) with a local low-latency tier.
+
+    Phrase classes listed in local_classes (short confirmations, error
+    prompts) go straight to the local engine unless the primary already has
+    them cached. Everything else is tried on the primary; if it misses the
+    latency budget or fails, the local engine speaks instead while the
+    primary request finishes in the background and fills the cache.
+    """
+
+    def __init__(self, primary, local, budget_ms=800, local_classes=('short', 'error'),
+                 short_words=3, error_phrases=()):
+        """
+        Args:
+            primary / local: Backends with render(text) -> PCM at the same rate
+            budget_ms: Longest wait for the primary before falling back
+            local_classes: Phrase classes always rendered locally
+            short_words: Phrases with at most this many words are 'short'
+            error_phrases: Exact texts classed as 'error'
+        """
+        if local.rate != primary.rate:
+            raise ValueError("primary and local TTS must render at the same rate")
+        self.primary = primary
+        self.local = local if local.available else None
+        self.rate = primary.rate
+        self.max_workers = primary.max_workers
+        self.budget_s = budget_ms / 1000
+        self.local_classes = set(local_classes)
+        self.short_words = short_words
+        self.error_phrases = {phrase.strip() for phrase in error_phrases}
+        self._pool = ThreadPoolExecutor(max_workers=primary.max_workers, thread_name_prefix='tts-primary')
+
+        if self.local is None:
+            print(f"⚠️ Local TTS engine '{local.engine}' not found - network TTS only")
+
+        # Metrics
+        self.local_renders = 0
+        self.fallbacks = 0
+
+    def classify(self, text):
+        text = text.strip()
+        if text in self.error_phrases:
+            return 'error'
+        # Whitespace tokens: \w splits Malayalam words at vowel signs and viramas
+        if len(text.split()) <= self.short_words:
+            return 'short'
+        return 'default'
+
+    def render(self, text):
+        cached = getattr(self.primary, 'is_cached', lambda t: False)(text)
+        if self.local is None or cached:
+            return self.primary.render(text)
+
+        if self.classify(text) in self.local_classes:
+            self.local_renders += 1
+            return self.local.render(text)
+
+        future = self._pool.submit(self.primary.render, text)
+        try:
+            return future.result(timeout=self.budget_s)
+        except FutureTimeout:
+            reason = f"over {self.budget_s * 1000:.0f} ms"
+        except Exception as e:
+            reason = str(e)
+        self.fallbacks += 1
+        print(f"⚡ Local TTS fallback ({reason})")
+        return self.local.render(text)
+
+    def prewarm(self, phrases, background=True):
+        if hasattr(self.primary, 'prewarm'):
+            return self.primary.prewarm(phrases, background=background)
+        return None
+
+    def stats(self):
+        return {"local_renders": self.local_renders, "fallbacks": self.fallbacks}
+
+
+class Pyttsx3Backend:
+    """
+    pyttsx3 rendered to WAV with save_to_file instead of speaking directly.
+    pyttsx3 is not thread-safe, so the engine lives on one dedicated thread
+    and every call is marshalled onto it. Pre-warming runs at low priority
+    so it never delays speech that is waiting to be played.
+
+    Drivers that do not write 16-bit WAV (macOS NSSpeechSynthesizer writes
+    AIFF) fall back to speaking directly with say()/runAndWait(); render()
+    then returns no PCM, and such speech cannot be cancelled mid-utterance.
+    """
+
+    max_workers = 1
+
+    def __init__(self, rate=16000, speech_rate=150, volume=1.0, voice_index=0,
+                 lang='en-IN', cache=None):
+        """
+        Args:
+            rate: PCM rate audio is converted to
+            speech_rate / volume / voice_index: pyttsx3 engine properties
+            cache: Optional TTSCache for rendered WAV bytes
+        """
+        self.rate = rate
+        self.lang = lang
+        self.cache = cache
+        self._settings = (speech_rate, volume, voice_index)
+        self._engine = None
+        self._voice = None
+        self.direct = False  # save_to_file output unusable: speak directly
+        self._jobs = queue.PriorityQueue()
+        self._order = itertools.count()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # Job priorities on the engine thread
+    URGENT = 0
+    BACKGROUND = 1
+
+    def _run(self):
+        while True:
+            _, _, fn, args, future = self._jobs.get()
+            if fn is None:
+                return
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+    def _submit(self, priority, fn, *args):
+        future = Future()
+        self._jobs.put((priority, next(self._order), fn, args, future))
+        return future
+
+    def _get_engine(self):
+        if self._engine is None:
+            import pyttsx3  # Only needed when this backend is used
+            speech_rate, volume, voice_index = self._settings
+            self._engine = pyttsx3.init()
+            self._engine.setProperty('rate', speech_rate)
+            self._engine.setProperty('volume', volume)
+            voices = self._engine.getProperty('voices')
+            if len(voices) > voice_index:
+                self._engine.setProperty('voice', voices[voice_index].id)
+            self._voice = self._engine.getProperty('voice')
+        return self._engine
+
+    def _cache_key(self):
+        """(voice, rate) part of the cache key"""
+        return {'voice': self._voice, 'rate': self._settings[0]}
+
+    def _render_wav(self, text):
+        """Synthesize text to WAV bytes, or None if the driver gave no 16-bit WAV (engine thread only)"""
+        engine = self._get_engine()
+        handle, path = tempfile.mkstemp(suffix='.wav')
+        os.close(handle)
+        try:
+            engine.save_to_file(text, path)
+            engine.runAndWait()
+            with open(path, 'rb') as f:
+                data = f.read()
+        finally:
+            os.remove(path)
+        # Some drivers write AIFF (or nothing)
+        try:
+            with wave.open(io.BytesIO(data), 'rb') as wf:
+                if wf.getsampwidth() == 2 and wf.getnframes():
+                    return data
+        except (wave.Error, EOFError):
+            pass
+        if not self.direct:
+            print("⚠️ pyttsx3 driver does not write 16-bit WAV - speaking directly")
+            self.direct = True
+        return None
+
+    def _speak_or_render(self, text):
+        """WAV bytes, or None after speaking text directly (engine thread only)"""
+        engine = self._get_engine()
+        data = None
+        if not self.direct:
+            if self.cache is None:
+                data = self._render_wav(text)
+            else:
+                data = self.cache.get_or_create(text, self.lang, self._render_wav, **self._cache_key())
+        if data is None:
+            engine.say(text)
+            engine.runAndWait()
+        return data
+
+    def render(self, text):
+        data = self._submit(self.URGENT, self._speak_or_render, text).result()
+        return _wav_to_pcm(data, self.rate) if data else b""
+
+    def prewarm(self, phrases, background=True):
+        """
+        Render phrases into the cache on the engine thread
+        One low-priority job per phrase, so speech requests can overtake it.
+        """
+        if self.cache is None:
+            return None
+
+        def run(phrase):
+            self._get_engine()
+            if self.direct:
+                return
+            self.cache.prewarm([phrase], self.lang, self._render_wav, background=False,
+                               quiet=True, **self._cache_key())
+
+        futures = [self._submit(self.BACKGROUND, run, phrase) for phrase in phrases]
+        done = self._submit(self.BACKGROUND, lambda: print(f"✓ TTS cache warm ({len(phrases)} phrases)"))
+        if not background:
+            done.result()
+        return futures
+
+    def close(self):
+        self._jobs.put((self.BACKGROUND + 1, next(self._order), None, (), None))
+
+
+# ---------- Blocking player ----------
+
+class TTSPlayer:
+    """
+    Synthesizes with gTTS and plays through one long-lived output stream.
+
+    Each call uses its own buffers, so several sessions can synthesize at
+    once. Playback is written in short frames and stops at the next frame
+    after cancel() (barge-in).
+    """
+
+    def __init__(self, lang='ml', devices=None, rate=GTTS_RATE, cache=None, frame_ms=50):
+        """
+        Args:
+            devices: AudioDeviceManager to play on (an output-only one is created if omitted)
+            rate: PCM rate audio is decoded to
+            cache: Optional TTSCache for MP3 bytes
+        """
+        self.devices = devices or AudioDeviceManager(rate=rate, output_rate=rate)
+        self.backend = GTTSBackend(lang=lang, rate=self.devices.output_rate, cache=cache)
+        self.lang = lang
+        self.cache = cache
+        self.frame_bytes = int(self.devices.output_rate * frame_ms / 1000) * 2
+        self._cancelled = threading.Event()
+
+    def synthesize(self, text):
+        """Text -> MP3 bytes"""
+        return self.backend.synthesize(text)
+
+    def prewarm(self, phrases, background=True):
+        return self.backend.prewarm(phrases, background=background)
+
+    def render(self, text):
+        """Text -> PCM at the output device's rate"""
+        return self.backend.render(text)
+
+    def play(self, pcm):
+        """
+        Write PCM to the output device (blocking)
+        Returns True if playback was cancelled
+        """
+        for offset in range(0, len(pcm), self.frame_bytes):
+            if self._cancelled.is_set():
+                return True
+            self.devices.write(pcm[offset:offset + self.frame_bytes])
+        return self._cancelled.is_set()
+
+    def speak(self, text):
+        """Synthesize and play; returns True if cancelled"""
+        self._cancelled.clear()
+        return self.play(self.render(text))
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def reset(self):
+        """Allow playback again after cancel()"""
+        self._cancelled.clear()
+
+    def close(self):
+        self.devices.close()
+
+
+_default_player = None
+_default_lock = threading.Lock()
+
+
+def default_player():
+    """Process-wide Malayalam player with the shared on-disk cache"""
+    global _default_player
+    with _default_lock:
+        if _default_player is None:
+            cache = TTSCache(os.getenv('TTS_CACHE_DIR', 'tts_cache'), name='gtts',
+                             max_disk_mb=int(os.getenv('TTS_CACHE_MAX_MB', 200)))
+            _default_player = TTSPlayer(lang='ml', cache=cache)
+    return _default_player
+
+
+def speak_malayalam(text):
+    """Speak Malayalam text through the default player"""
+    return default_player().speak(text)
+
+
+# Test the module
+if __name__ == "__main__":
+    import time
+
+    player = default_player()
+    for text in ["നമസ്കാരം! എങ്ങനെ സഹായിക്കാം?", "നമസ്കാരം! എങ്ങനെ സഹായിക്കാം?"]:
+        started = time.perf_counter()
+        pcm = player.render(text)
+        print(f"render {(time.perf_counter() - started) * 1000:6.1f} ms, "
+              f"{len(pcm) / 2 / player.devices.output_rate:.2f} s of audio")
+        player.play(pcm)
+    print(player.cache.stats())
+    player.close()
@@ -0,0 +1,281 @@
+"""
+TTS Cache Module
+Two-tier cache for synthesized speech: in-memory LRU in front of a
+content-addressed disk store, keyed by (normalized text, language, voice, rate)
+"""
+
+import collections
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import unicodedata
+
+
+def normalize_text(text):
+    """Unicode NFC + collapsed whitespace, so equivalent strings share an entry"""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFC', text)).strip()
+
+
+class TTSCache:
+    """
+    Caches synthesized audio bytes (MP3, WAV, ...) for repeated phrases.
+
+    Memory tier: LRU bounded by total bytes. Disk tier: one file per entry,
+    named by the SHA-256 of the key, evicted least-recently-used first once
+    the directory grows past max_disk_mb. Disk hits are promoted to memory.
+    The disk size is scanned once at startup and then tracked per write; the
+    directory is only re-scanned when that total goes over budget, and is
+    then trimmed to 90% of it.
+    """
+
+    def __init__(self, directory='tts_cache', name=None, memory_mb=16, max_disk_mb=200,
+                 extension='.mp3'):
+        """
+        Args:
+            directory: Disk store location (None for a memory-only cache)
+            name: Subdirectory of this cache, so caches sharing a directory
+                  keep separate budgets
+            memory_mb: Memory tier budget
+            max_disk_mb: Disk tier budget
+            extension: File extension for stored audio
+        """
+        self.directory = os.path.join(directory, name) if directory and name else directory
+        self.memory_bytes = int(memory_mb * 1024 * 1024)
+        self.max_disk_bytes = int(max_disk_mb * 1024 * 1024)
+        self.extension = extension
+
+        self._memory = collections.OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.Lock()
+        self._disk_size = 0
+        self._evict_lock = threading.Lock()
+
+        # Metrics
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self._evict_disk()  # Startup scan (and trim if the budget shrank)
+
+    # ---------- Keys ----------
+
+    @staticmethod
+    def key(text, lang, voice='', rate=''):
+        raw = "\x1f".join([normalize_text(text), lang, str(voice), str(rate)])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + self.extension)
+
+    # ---------- Lookup ----------
+
+    def get(self, text, lang, voice='', rate=''):
+        """Cached audio bytes, or None"""
+        key = self.key(text, lang, voice, rate)
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return data
+
+        data = self._read_disk(key)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, data)
+        return data
+
+    def put(self, text, lang, data, voice='', rate=''):
+        """Store synthesized audio in both tiers"""
+        if not data:
+            return
+        key = self.key(text, lang, voice, rate)
+        with self._lock:
+            self._remember(key, data)
+        self._write_disk(key, data)
+
+    def get_or_create(self, text, lang, synthesize, voice='', rate=''):
+        """
+        Cached audio for text, synthesizing (and storing) it on a miss
+        Args:
+            synthesize: text -> audio bytes
+        """
+        data = self.get(text, lang, voice, rate)
+        if data is None:
+            data = synthesize(text)
+            self.put(text, lang, data, voice, rate)
+        return data
+
+    def __contains__(self, item):
+        """(text, lang[, voice, rate]) in cache - does not count as a hit"""
+        key = self.key(*item)
+        with self._lock:
+            if key in self._memory:
+                return True
+        return bool(self.directory) and os.path.exists(self._path(key))
+
+    # ---------- Pre-warming ----------
+
+    def prewarm(self, phrases, lang, synthesize, voice='', rate='', background=True, quiet=False):
+        """
+        Synthesize canned phrases ahead of time (network errors are skipped)
+        Returns the worker thread when background=True
+        """
+        def run():
+            created = 0
+            for phrase in phrases:
+                if (phrase, lang, voice, rate) in self:
+                    continue
+                try:
+                    self.put(phrase, lang, synthesize(phrase), voice, rate)
+                    created += 1
+                except Exception as e:
+                    print(f"⚠️ TTS pre-warm failed for '{phrase[:30]}': {e}")
+            if not quiet:
+                print(f"✓ TTS cache warm ({len(phrases)} phrases, {created} synthesized)")
+
+        if not background:
+            run()
+            return None
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    # ---------- Memory tier ----------
+
+    def _remember(self, key, data):
+        """Insert into the LRU (caller holds the lock)"""
+        if len(data) > self.memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_size -= len(old)
+        self._memory[key] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    # ---------- Disk tier ----------
+
+    def _read_disk(self, key):
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # Recency for eviction
+            return data
+        except OSError:
+            return None
+
+    def _write_disk(self, key, data):
+        if not self.directory:
+            return
+        path = self._path(key)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write-then-rename so readers never see a partial file
+            handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(handle, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"⚠️ TTS cache write failed: {e}")
+            return
+        with self._lock:
+            self._disk_size += len(data) - replaced
+            over = self._disk_size > self.max_disk_bytes
+        if over:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        """Re-scan the directory, drop the least recently used files over budget"""
+        if not self._evict_lock.acquire(blocking=False):
+            return  # Another writer is already trimming
+        try:
+            total = self._trim()
+        finally:
+            self._evict_lock.release()
+        with self._lock:
+            self._disk_size = total
+
+    def _trim(self):
+        """Scan and evict; returns the remaining size"""
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(self.extension):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        if total <= self.max_disk_bytes:
+            return total
+        # Trim to 90% so the next re-scan is not triggered by the next write
+        target = self.max_disk_bytes * 0.9
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+            if total <= target:
+                break
+        return total
+
+    # ---------- Metrics ----------
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_kb": round(self._memory_size / 1024, 1),
+            "disk_kb": round(self._disk_size / 1024, 1),
+        }
+
+
+# Test the module
+if __name__ == "__main__":
+    import shutil
+    import time
+
+    directory = tempfile.mkdtemp(prefix="tts_cache_")
+    cache = TTSCache(directory, name='gtts', memory_mb=0.001, max_disk_mb=0.01)
+
+    def fake_tts(text):
+        time.sleep(0.2)  # Stand-in for a gTTS round trip
+        return text.encode('utf-8') * 50
+
+    phrases = ["Hello! Welcome to MYG Kerala.", "Thank you for visiting MYG Kerala. Have a great day!"]
+    cache.prewarm(phrases, 'en', fake_tts, background=False)
+
+    for text in ["Hello!  Welcome to MYG Kerala.", "Something new", phrases[1]]:
+        started = time.perf_counter()
+        cache.get_or_create(text, 'en', fake_tts)
+        print(f"{text[:30]:<32} {(time.perf_counter() - started) * 1000:7.1f} ms")
+
+    print(cache.stats())
+    shutil.rmtree(directory)
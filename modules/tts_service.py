@@ -0,0 +1,263 @@
+"""
+TTS Service Module
+Non-blocking speech output: utterances are queued, synthesized ahead of
+playback on a bounded worker pool and played in order on one thread
+"""
+
+import collections
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+
+class TTSRequest:
+    """Handle for one queued utterance (future-like)"""
+
+    def __init__(self, text):
+        self.text = text
+        self.future = None  # Synthesis future, set once a worker is assigned
+        self.cancelled = False
+        self.error = None
+        self.timings = {'submitted': time.perf_counter()}
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        """Block until played (or cancelled); True if it played to the end"""
+        self._done.wait(timeout)
+        return self.done and not self.cancelled and self.error is None
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def _mark(self, name):
+        self.timings[name] = time.perf_counter()
+
+    @property
+    def metrics(self):
+        """Milliseconds: queued before synthesis, synthesis, submit-to-audio, playback"""
+        t = self.timings
+
+        def span(start, end):
+            if start in t and end in t:
+                return round((t[end] - t[start]) * 1000, 1)
+            return None
+
+        return {
+            "queue_ms": span('submitted', 'synth_start'),
+            "synth_ms": span('synth_start', 'synth_end'),
+            "first_audio_ms": span('submitted', 'play_start'),
+            "play_ms": span('play_start', 'play_end'),
+            "cancelled": self.cancelled,
+        }
+
+
+class TTSService:
+    """
+    One TTS interface over any backend (modules.tts GTTSBackend,
+    Pyttsx3Backend): submit() returns immediately, the next lookahead
+    utterances are rendered while the current one plays, and cancel()
+    drops everything queued and stops playback at the next frame.
+    """
+
+    def __init__(self, backend, devices, workers=2, lookahead=2, frame_ms=50):
+        """
+        Args:
+            backend: Object with render(text) -> 16-bit mono PCM, .rate and .max_workers
+            devices: AudioDeviceManager to play on (output rate must match backend.rate)
+            workers: Synthesis threads (capped by backend.max_workers)
+            lookahead: Queued utterances synthesized ahead of playback
+        """
+        self.backend = backend
+        self.devices = devices
+        self.lookahead = max(1, lookahead)
+        self.frame_bytes = int(backend.rate * frame_ms / 1000) * 2
+        self._pool = ThreadPoolExecutor(max_workers=max(1, min(workers, backend.max_workers)),
+                                        thread_name_prefix='tts')
+
+        self._queue = collections.deque()  # Waiting for playback
+        self._current = None
+        self._active = False  # Between on_start and on_idle
+        self._cond = threading.Condition()
+        self._closed = False
+        self._player = None
+
+        self._start_callbacks = []
+        self._idle_callbacks = []
+
+        # Metrics of finished requests, most recent last
+        self.history = collections.deque(maxlen=100)
+
+    # ---------- Callbacks ----------
+
+    def on_start(self, callback):
+        """callback() when playback starts after being idle (e.g. start barge-in)"""
+        self._start_callbacks.append(callback)
+
+    def on_idle(self, callback):
+        """callback() when the last queued utterance finishes or is cancelled"""
+        self._idle_callbacks.append(callback)
+
+    # ---------- Public API ----------
+
+    def submit(self, text):
+        """Queue text for synthesis and playback; returns a TTSRequest"""
+        request = TTSRequest(text)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("TTS service is closed")
+            self._queue.append(request)
+            self._schedule()
+            if self._player is None:
+                self._player = threading.Thread(target=self._run, daemon=True)
+                self._player.start()
+            self._cond.notify_all()
+        return request
+
+    def speak(self, text):
+        """Blocking convenience; returns True if playback was cancelled"""
+        request = self.submit(text)
+        request.wait()
+        return request.cancelled
+
+    def cancel(self):
+        """Drop queued utterances and stop the one playing"""
+        with self._cond:
+            pending = list(self._queue)
+            self._queue.clear()
+            if self._current is not None:
+                self._current.cancelled = True
+            self._cond.notify_all()
+        for request in pending:
+            request.cancelled = True
+            if request.future is not None:
+                request.future.cancel()
+            self._finish(request)
+
+    @property
+    def busy(self):
+        with self._cond:
+            return self._current is not None or bool(self._queue)
+
+    def wait_idle(self, timeout=None):
+        """Block until everything queued has played"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._current is None and not self._queue,
+                                       timeout=timeout)
+
+    def close(self):
+        self.cancel()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._pool.shutdown(wait=False)
+
+    # ---------- Synthesis ----------
+
+    def _schedule(self):
+        """Start synthesis for the next lookahead queued requests (lock held)"""
+        for request in list(self._queue)[:self.lookahead]:
+            if request.future is None:
+                request.future = self._pool.submit(self._synthesize, request)
+
+    def _synthesize(self, request):
+        request._mark('synth_start')
+        try:
+            return self.backend.render(request.text)
+        finally:
+            request._mark('synth_end')
+
+    # ---------- Playback ----------
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or self._closed)
+                if self._closed:
+                    return
+                was_idle = not self._active
+                self._active = True
+                request = self._current = self._queue.popleft()
+                if request.future is None:
+                    request.future = self._pool.submit(self._synthesize, request)
+                self._schedule()
+
+            if was_idle:
+                self._fire(self._start_callbacks)
+
+            try:
+                pcm = request.future.result()
+                self._play(request, pcm)
+            except CancelledError:
+                request.cancelled = True
+            except Exception as e:
+                request.error = e
+                print(f"✗ TTS error: {e}")
+
+            with self._cond:
+                self._current = None
+                idle = not self._queue
+                if idle:
+                    self._active = False
+                self._cond.notify_all()
+            if idle:
+                # Before the request completes, so a caller waiting on it
+                # sees barge-in etc. already stopped
+                self._fire(self._idle_callbacks)
+            self._finish(request)
+
+    def _play(self, request, pcm):
+        request._mark('play_start')
+        for offset in range(0, len(pcm), self.frame_bytes):
+            if request.cancelled:
+                break
+            self.devices.write(pcm[offset:offset + self.frame_bytes])
+        request._mark('play_end')
+
+    def _finish(self, request):
+        if request.done:
+            return
+        self.history.append(request.metrics)
+        request._done.set()
+
+    @staticmethod
+    def _fire(callbacks):
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"✗ TTS callback error: {e}")
+
+
+# Test the module
+if __name__ == "__main__":
+    class SlowBackend:
+        """Stand-in engine: 300 ms per utterance, 100 ms of audio per word"""
+        rate = 16000
+        max_workers = 4
+
+        def render(self, text):
+            time.sleep(0.3)
+            return b"\0\0" * (1600 * len(text.split()))
+
+    class NullDevices:
+        def write(self, data):
+            time.sleep(len(data) / 2 / 16000)
+
+    service = TTSService(SlowBackend(), NullDevices(), workers=2, lookahead=2)
+    service.on_start(lambda: print("▶ playback started"))
+    service.on_idle(lambda: print("■ playback idle"))
+
+    started = time.perf_counter()
+    requests = [service.submit(f"sentence number {i} with a few more words") for i in range(4)]
+    print(f"submit returned after {(time.perf_counter() - started) * 1000:.1f} ms")
+    service.wait_idle()
+    for request in requests:
+        print(request.metrics)
+
+    # Cancellation mid-queue
+    requests = [service.submit("one two three four five six") for _ in range(3)]
+    time.sleep(0.5)
+    service.cancel()
+    print([r.wait(1) for r in requests], [r.cancelled for r in requests])
+    service.close()
@@ -0,0 +1,75 @@
+"""
+Uplink Gate Module
+Client-side VAD gating: only speech (plus pre/post-roll) is sent upstream,
+silences become activity_start / activity_end control messages
+"""
+
+from modules.vad import VoiceActivityDetector
+
+ACTIVITY_START = "activity_start"
+ACTIVITY_END = "activity_end"
+
+
+class UplinkGate:
+    """
+    Turns a continuous microphone stream into a sequence of
+    ('control', ACTIVITY_START), ('audio', bytes)..., ('control', ACTIVITY_END)
+    events. Nothing is emitted while the room is silent.
+    """
+
+    def __init__(self, rate=16000, frame_ms=30, preroll_ms=300, postroll_ms=500,
+                 aggressiveness=2, energy_threshold=500):
+        """
+        Args:
+            preroll_ms: Audio sent from before the detected onset
+            postroll_ms: Trailing non-speech sent before the activity ends
+        """
+        self.vad = VoiceActivityDetector(
+            rate=rate,
+            frame_ms=frame_ms,
+            aggressiveness=aggressiveness,
+            preroll_ms=preroll_ms,
+            hangover_ms=postroll_ms,
+            energy_threshold=energy_threshold
+        )
+        self.active = False
+        self.total_bytes = 0
+        self.sent_bytes = 0
+
+    def process(self, chunk):
+        """Feed a mic chunk; returns a list of (kind, payload) events to send"""
+        self.total_bytes += len(chunk)
+        return self._process(chunk)
+
+    def _process(self, chunk):
+        events = []
+
+        voiced = self.vad.process(chunk)
+        if self.vad.speech_started and not self.active:
+            self.active = True
+            events.append(('control', ACTIVITY_START))
+        if voiced:
+            self.sent_bytes += len(voiced)
+            events.append(('audio', voiced))
+        if self.vad.speech_ended:
+            self.active = False
+            events.append(('control', ACTIVITY_END))
+            leftover = self.vad.leftover
+            self.vad.reset()
+            if leftover:
+                # The rest of the chunk starts the next detection cycle
+                events.extend(self._process(leftover))
+
+        return events
+
+    def flush(self):
+        """Close an open activity (e.g. on disconnect)"""
+        if not self.active:
+            return []
+        self.active = False
+        self.vad.reset()
+        return [('control', ACTIVITY_END)]
+
+    def summary(self):
+        suppressed = 1 - self.sent_bytes / self.total_bytes if self.total_bytes else 0.0
+        return f"{self.sent_bytes / 1024:.1f} of {self.total_bytes / 1024:.1f} KB sent ({suppressed:.0%} gated)"
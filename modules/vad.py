@@ -0,0 +1,172 @@
+"""
+Voice Activity Detection Module
+Frame-level speech detection (webrtcvad) with pre-roll and hangover smoothing
+"""
+
+import collections
+from array import array
+
+try:
+    import webrtcvad
+except ImportError:
+    webrtcvad = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class VoiceActivityDetector:
+    """
+    Splits 16-bit mono PCM into fixed 10/20/30 ms frames and tracks whether
+    the speaker is currently talking.
+
+    Chunks of any size can be fed to process(); partial frames are carried
+    over to the next call. Frames seen before speech starts are held in a
+    pre-roll ring buffer and returned together with the first voiced frame,
+    so the first syllable is not clipped.
+    """
+
+    FRAME_SIZES_MS = (10, 20, 30)
+    WEBRTC_RATES = (8000, 16000, 32000, 48000)
+
+    def __init__(self, rate=16000, frame_ms=30, aggressiveness=2,
+                 preroll_ms=300, onset_ms=90, hangover_ms=1000,
+                 energy_threshold=500, energy_gate=False):
+        """
+        Args:
+            rate: Sample rate of the incoming audio
+            frame_ms: Frame length, must be 10, 20 or 30 ms
+            aggressiveness: webrtcvad mode 0-3 (3 = most aggressive filtering)
+            preroll_ms: Audio kept from before speech onset
+            onset_ms: Voiced audio needed before speech is considered started
+            hangover_ms: Trailing non-speech needed before speech is considered ended
+            energy_threshold: Mean amplitude used by the energy fallback
+            energy_gate: Also require energy_threshold when webrtcvad is used
+        """
+        if frame_ms not in self.FRAME_SIZES_MS:
+            raise ValueError(f"frame_ms must be one of {self.FRAME_SIZES_MS}, got {frame_ms}")
+
+        self.rate = rate
+        self.frame_ms = frame_ms
+        self.frame_bytes = int(rate * frame_ms / 1000) * 2
+        self.energy_threshold = energy_threshold
+        self.energy_gate = energy_gate
+
+        # Use webrtcvad when available and the rate is supported, else energy
+        if webrtcvad is not None and rate in self.WEBRTC_RATES:
+            self._vad = webrtcvad.Vad(aggressiveness)
+            self.backend = "webrtcvad"
+        else:
+            self._vad = None
+            self.backend = "numpy-energy" if np is not None else "energy"
+
+        self.aggressiveness = aggressiveness
+        self._onset_frames = max(1, onset_ms // frame_ms)
+        self.set_hangover_ms(hangover_ms)
+        self._preroll = collections.deque(maxlen=max(1, preroll_ms // frame_ms))
+
+        self.reset()
+
+    def reset(self):
+        """Clear state before a new utterance"""
+        self._pending = b""
+        self._preroll.clear()
+        self._voiced_run = 0
+        self._silent_run = 0
+        self.speech_frames = 0  # Frames since speech onset
+        self.voiced_frames = 0  # Voiced frames since speech onset
+        self.speech_bursts = 0  # Silence -> speech transitions (rough syllable count)
+        self.in_speech = False
+        self.speech_started = False
+        self.speech_ended = False
+        self.leftover = b""  # Audio of the last chunk after speech_ended
+
+    def set_hangover_ms(self, hangover_ms):
+        """Change the trailing non-speech needed to end an utterance"""
+        self._hangover_frames = max(1, int(hangover_ms // self.frame_ms))
+
+    def set_aggressiveness(self, mode):
+        """Change webrtcvad filtering mode (no effect on the energy fallback)"""
+        self.aggressiveness = mode
+        if self._vad is not None:
+            self._vad.set_mode(mode)
+
+    def frame_energy(self, frame):
+        """Mean absolute amplitude of a 16-bit PCM frame"""
+        if np is not None:
+            samples = np.frombuffer(frame, dtype=np.int16)
+            return float(np.abs(samples.astype(np.int32)).mean()) if samples.size else 0.0
+        samples = array('h', frame)
+        return sum(map(abs, samples)) / len(samples) if samples else 0.0
+
+    def is_speech(self, frame):
+        """Classify a single frame"""
+        if self._vad is not None:
+            voiced = self._vad.is_speech(frame, self.rate)
+            if voiced and self.energy_gate:
+                return self.frame_energy(frame) > self.energy_threshold
+            return voiced
+        return self.frame_energy(frame) > self.energy_threshold
+
+    def frames(self, chunk):
+        """Yield complete frames from chunk, keeping any remainder for later"""
+        data = self._pending + chunk if self._pending else chunk
+        view = memoryview(data)
+        end = len(data) - len(data) % self.frame_bytes
+        for offset in range(0, end, self.frame_bytes):
+            yield bytes(view[offset:offset + self.frame_bytes])
+        self._pending = bytes(view[end:])
+
+    def process(self, chunk):
+        """
+        Feed raw PCM audio
+        Returns the audio that belongs to the utterance (b"" while waiting
+        for speech). Check speech_started / speech_ended afterwards.
+        """
+        kept = []
+        self.leftover = b""
+        frames = self.frames(chunk)
+        for frame in frames:
+            if self.speech_ended:
+                self.leftover = frame + b"".join(frames)
+                break
+
+            voiced = self.is_speech(frame)
+
+            if not self.speech_started:
+                self._preroll.append(frame)
+                self._voiced_run = self._voiced_run + 1 if voiced else 0
+                if self._voiced_run >= self._onset_frames:
+                    self.speech_started = True
+                    self.in_speech = True
+                    kept.extend(self._preroll)
+                    self._preroll.clear()
+                    self.speech_bursts = 1
+                continue
+
+            kept.append(frame)
+            self.speech_frames += 1
+            if voiced:
+                self.voiced_frames += 1
+                if self._silent_run:
+                    self.speech_bursts += 1
+                self._silent_run = 0
+                self.in_speech = True
+            else:
+                self._silent_run += 1
+                if self._silent_run >= self._hangover_frames:
+                    self.in_speech = False
+                    self.speech_ended = True
+
+        if self.speech_ended:
+            # Audio after the utterance, for the caller's next cycle
+            self.leftover += self._pending
+            self._pending = b""
+        return b"".join(kept)
+
+    @property
+    def trailing_silence_ms(self):
+        """Non-speech audio seen since the last voiced frame"""
+        return self._silent_run * self.frame_ms
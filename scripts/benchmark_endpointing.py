@@ -0,0 +1,225 @@
+"""
+Endpointing / VAD benchmark
+Replays recorded audio through the SpeechHandler.listen capture logic
+faster than real time and reports CPU cost, endpoint latency and clipped
+onsets.
+
+Usage:
+    python scripts/benchmark_endpointing.py [files...] [--noise 100] [--trail 3]
+
+Each file is padded with lead/trail room noise. True speech bounds come from
+a sidecar <file>.json ({"speech_start": s, "speech_end": s}) when present,
+otherwise they are estimated from the signal envelope.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import wave
+from array import array
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from modules.endpointing import UtteranceDetector
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+DEFAULT_FILES = [
+    os.path.join(ROOT, 'ajnas_voice.opus'),
+    os.path.join(ROOT, 'ajnas_voice.mp3'),
+    os.path.join(ROOT, 'test_output.mp3'),
+]
+RATE = 16000
+CHUNK = 1024  # Same as SpeechHandler.CHUNK
+
+
+# ------------------ Audio loading ------------------
+
+def load_audio(path, rate=RATE):
+    """Decode a file to 16-bit mono PCM at rate"""
+    if path.lower().endswith('.wav'):
+        with wave.open(path, 'rb') as wf:
+            if (wf.getframerate(), wf.getnchannels(), wf.getsampwidth()) == (rate, 1, 2):
+                return wf.readframes(wf.getnframes())
+
+    # Compressed formats (and non-matching WAVs) go through pydub/ffmpeg
+    from pydub import AudioSegment
+    segment = AudioSegment.from_file(path)
+    segment = segment.set_frame_rate(rate).set_channels(1).set_sample_width(2)
+    return segment.raw_data
+
+
+def room_noise(seconds, level, rate=RATE, seed=0):
+    """Gaussian room noise with mean absolute amplitude of roughly level"""
+    rng = random.Random(seed)
+    sigma = level * 1.25  # mean |x| of a gaussian is ~0.8 sigma
+    samples = array('h', (max(-32768, min(32767, int(rng.gauss(0, sigma))))
+                          for _ in range(int(seconds * rate))))
+    return samples.tobytes()
+
+
+def speech_bounds(path, pcm, rate=RATE):
+    """(start, end) of speech in seconds, from a sidecar label or the envelope"""
+    label = path + '.json'
+    if os.path.exists(label):
+        with open(label, 'r', encoding='utf-8') as f:
+            bounds = json.load(f)
+        return bounds['speech_start'], bounds['speech_end']
+
+    samples = array('h', pcm)
+    window = rate // 100  # 10 ms
+    levels = [sum(map(abs, samples[i:i + window])) / window
+              for i in range(0, len(samples) - window + 1, window)]
+    if not levels:
+        return 0.0, 0.0
+    threshold = max(max(levels) * 0.05, 200)
+    active = [i for i, level in enumerate(levels) if level > threshold]
+    if not active:
+        return 0.0, 0.0
+    return active[0] * 0.01, (active[-1] + 1) * 0.01
+
+
+# ------------------ Stand-in microphone ------------------
+
+class FileAudioSource:
+    """Serves PCM in CHUNK-sized reads with the CaptureWindow interface, without waiting"""
+
+    def __init__(self, pcm, chunk=CHUNK):
+        self._pcm = pcm
+        self._chunk_bytes = chunk * 2
+        self._offset = 0
+
+    @property
+    def position_bytes(self):
+        return self._offset
+
+    def read(self, timeout=None):
+        if self._offset >= len(self._pcm):
+            return None
+        data = self._pcm[self._offset:self._offset + self._chunk_bytes]
+        self._offset += len(data)
+        return data
+
+
+# ------------------ Detectors ------------------
+
+class LegacyDetector:
+    """Original listen() logic: mean amplitude > 500, 3 s of silence, keeps everything"""
+
+    def __init__(self, rate=RATE, chunk=CHUNK, threshold=500, max_silence=3):
+        self.rate = rate
+        self.chunk = chunk
+        self.threshold = threshold
+        self.max_silence = max_silence
+        self.start_turn()
+
+    def start_turn(self):
+        self.speech_started = False
+        self.speech_ended = False
+        self._silence = 0
+
+    def feed(self, data):
+        level = sum(abs(int.from_bytes(data[i:i + 2], 'little', signed=True))
+                    for i in range(0, len(data), 2)) / len(data) * 2
+        if level > self.threshold:
+            self.speech_started = True
+            self._silence = 0
+        elif self.speech_started:
+            self._silence += 1
+        if self.speech_started and self._silence > self.max_silence * (self.rate / self.chunk):
+            self.speech_ended = True
+        return data
+
+
+DETECTORS = {
+    'legacy': LegacyDetector,
+    'adaptive': UtteranceDetector,
+}
+
+
+# ------------------ Benchmark ------------------
+
+def run_case(detector, pcm, true_start, true_end, rate=RATE, tolerance=0.02):
+    """Replay one padded recording; returns a result dict"""
+    source = FileAudioSource(pcm)
+    detector.start_turn()
+    kept_start = None
+    endpoint = None
+
+    cpu_started = time.process_time()
+    while True:
+        data = source.read()
+        if data is None:
+            break
+        voiced = detector.feed(data)
+        if kept_start is None and voiced:
+            # Kept audio ends at the last whole frame the detector processed
+            pending = len(getattr(getattr(detector, 'vad', None), '_pending', b''))
+            kept_start = (source.position_bytes - pending - len(voiced)) / 2 / rate
+        if detector.speech_ended:
+            endpoint = source.position_bytes / 2 / rate
+            break
+    cpu = time.process_time() - cpu_started
+    audio_seconds = source.position_bytes / 2 / rate
+
+    return {
+        "cpu_ms_per_audio_s": cpu * 1000 / audio_seconds if audio_seconds else 0.0,
+        "endpoint_latency_ms": (endpoint - true_end) * 1000 if endpoint is not None else None,
+        "clipped": kept_start is not None and kept_start > true_start + tolerance,
+        "detected": detector.speech_started,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('files', nargs='*', default=DEFAULT_FILES)
+    parser.add_argument('--detector', choices=['all'] + list(DETECTORS), default='all')
+    parser.add_argument('--noise', type=float, default=100, help='room noise mean amplitude')
+    parser.add_argument('--lead', type=float, default=1.0, help='seconds of noise before speech')
+    parser.add_argument('--trail', type=float, default=4.0, help='seconds of noise after speech')
+    args = parser.parse_args()
+
+    names = list(DETECTORS) if args.detector == 'all' else [args.detector]
+
+    cases = []
+    for path in args.files:
+        try:
+            pcm = load_audio(path)
+        except Exception as e:
+            print(f"✗ Skipping {os.path.basename(path)}: {e}")
+            continue
+        start, end = speech_bounds(path, pcm)
+        padded = room_noise(args.lead, args.noise, seed=1) + pcm + room_noise(args.trail, args.noise, seed=2)
+        cases.append((os.path.basename(path), padded, args.lead + start, args.lead + end))
+        print(f"✓ {os.path.basename(path)}: speech {start:.2f}-{end:.2f}s")
+
+    if not cases:
+        print("No audio to benchmark")
+        return
+
+    print("\n" + "=" * 78)
+    print(f"{'detector':<10} {'file':<22} {'cpu ms/s':>9} {'endpoint ms':>12} {'clipped':>8}")
+    print("=" * 78)
+
+    for name in names:
+        results = []
+        for file_name, pcm, true_start, true_end in cases:
+            result = run_case(DETECTORS[name](), pcm, true_start, true_end)
+            results.append(result)
+            latency = result["endpoint_latency_ms"]
+            latency_text = f"{latency:.0f}" if latency is not None else "none"
+            print(f"{name:<10} {file_name:<22} {result['cpu_ms_per_audio_s']:>9.2f} "
+                  f"{latency_text:>12} {str(result['clipped']):>8}")
+
+        latencies = [r["endpoint_latency_ms"] for r in results if r["endpoint_latency_ms"] is not None]
+        cpu = sum(r["cpu_ms_per_audio_s"] for r in results) / len(results)
+        clipped = sum(r["clipped"] for r in results) / len(results)
+        mean_latency = f"{sum(latencies) / len(latencies):.0f}" if latencies else "n/a"
+        print(f"{name:<10} {'MEAN':<22} {cpu:>9.2f} {mean_latency:>12} {clipped:>7.0%}")
+        print("-" * 78)
+
+
+if __name__ == "__main__":
+    main()
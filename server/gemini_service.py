@@ -1,23 +1,27 @@
 # server/gemini_service.py
 import asyncio
 import threading
-from google import genai
 from google.genai import types
+from modules.llm_gateway import get_gateway
 
 class GeminiLiveService:
-    def __init__(self, client_ws, api_key: str):
+    def __init__(self, client_ws, api_key: str, manual_activity: bool = False):
         """
         Gemini Live API സെഷൻ ആരംഭിക്കുന്നു.
         :param client_ws: പ്രാദേശിക പൈത്തൺ ക്ലയിൻ്റുമായുള്ള WebSocket കണക്ഷൻ (Flask-Sock).
         :param api_key: നിങ്ങളുടെ Gemini API കീ.
+        :param manual_activity: ക്ലയിൻ്റ് VAD ഗേറ്റിംഗ് ചെയ്യുന്നു - server-side VAD ഓഫ് ചെയ്ത്
+                                activity_start/activity_end സിഗ്നലുകൾ ഉപയോഗിക്കുന്നു.
         """
         self.client_ws = client_ws
-        self.client = genai.Client(api_key=api_key)
+        # പ്രോസസ്സിലുടനീളം പങ്കിടുന്ന ക്ലയിൻ്റ് - ഓരോ സെഷനും പുതിയ client setup ഒഴിവാക്കുന്നു
+        self.client = get_gateway(api_key).client
         # ലൈവ് വോയിസ് ഇന്ററാക്ഷൻ പിന്തുണയ്ക്കുന്ന മോഡൽ
         self.model = "gemini-live-2.5-flash-preview" 
         self.loop = asyncio.new_event_loop()
         self.audio_queue = asyncio.Queue()
         self.is_streaming = True
+        self.manual_activity = manual_activity
 
     def send_audio_to_gemini(self, audio_data: bytes):
         """മൈക്രോഫോണിൽ നിന്നുള്ള ലൈവ് ഓഡിയോ ഡാറ്റ ക്യൂവിലേക്ക് ചേർക്കുന്നു."""
@@ -25,6 +29,11 @@ class GeminiLiveService:
             # ത്രെഡ്-സേഫ് ആയി ഓഡിയോ ഡാറ്റ അസിൻക്രണസ് ക്യൂവിലേക്ക് ചേർക്കുന്നു
             self.loop.call_soon_threadsafe(self.audio_queue.put_nowait, audio_data)
 
+    def send_activity(self, kind: str):
+        """ക്ലയിൻ്റിൻ്റെ activity_start / activity_end സിഗ്നൽ ഓഡിയോയുടെ അതേ ക്രമത്തിൽ ക്യൂവിലേക്ക് ചേർക്കുന്നു."""
+        if self.is_streaming and self.manual_activity:
+            self.loop.call_soon_threadsafe(self.audio_queue.put_nowait, kind)
+
     def close_session(self):
         """ഓഡിയോ സ്ട്രീമിംഗ് അവസാനിപ്പിക്കാൻ സിഗ്നൽ നൽകുന്നു."""
         self.is_streaming = False
@@ -38,6 +47,14 @@ class GeminiLiveService:
             if chunk is None:
                 break 
 
+            # ക്ലയിൻ്റ് ഗേറ്റിംഗ് സിഗ്നലുകൾ (സംസാരത്തിൻ്റെ തുടക്കം / അവസാനം)
+            if chunk == "activity_start":
+                yield types.RealtimeInput(activity_start=types.ActivityStart())
+                continue
+            if chunk == "activity_end":
+                yield types.RealtimeInput(activity_end=types.ActivityEnd())
+                continue
+
             # ഓഡിയോ ഡാറ്റ 16-bit PCM, 16kHz, mono ഫോർമാറ്റിൽ സജ്ജീകരിക്കുന്നു
             yield types.RealtimeInput(
                 audio=types.Audio(
@@ -99,6 +116,12 @@ class GeminiLiveService:
                     #     )
                     # )
                 ),
+                # ക്ലയിൻ്റ് ഗേറ്റിംഗ് ഉള്ളപ്പോൾ സെർവർ VAD ഓഫ്; turn-കൾ activity സിഗ്നലുകൾ വഴി
+                realtime_input_config=types.RealtimeInputConfig(
+                    automatic_activity_detection=types.AutomaticActivityDetection(
+                        disabled=self.manual_activity
+                    )
+                ),
                 # സംഭാഷണ ശൈലി സജ്ജീകരിക്കുന്നതിനുള്ള സിസ്റ്റം ഇൻസ്ട്രക്ഷൻ
                 system_instruction=types.Content(
                     parts=[types.Part.from_text("നിങ്ങൾ ഒരു ലാപ്‌ടോപ്പ് വിൽപ്പനക്കാരനാണ്. ഉപഭോക്താവുമായി സ്നേഹത്തോടെയും ശ്രദ്ധയോടെയും മലയാളത്തിൽ സംസാരിക്കുക. കൂടുതൽ വിവരങ്ങൾ ചോദിച്ചുകൊണ്ട് സംഭാഷണം മുന്നോട്ട് കൊണ്ടുപോകുക.")]
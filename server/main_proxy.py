@@ -1,11 +1,17 @@
 # server/main_proxy.py
 import os
+import sys
+import json
 import threading
-from flask import Flask
+from flask import Flask, request
 from flask_sock import Sock
 from dotenv import load_dotenv
 from .gemini_service import GeminiLiveService # നിങ്ങളുടെ സർവീസ് ഫയലിൽ നിന്ന് ക്ലാസ് ഇമ്പോർട്ട് ചെയ്യുന്നു
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import audio_codec
+
 # .env ഫയലിൽ നിന്ന് പരിസ്ഥിതി വേരിയബിളുകൾ ലോഡ് ചെയ്യുന്നു
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
@@ -26,8 +32,21 @@ def live_proxy_session(ws):
     
     print("\n--- Client Connected! Starting Gemini Live Session ---")
     
+    # ക്ലയിൻ്റ് കംപ്രസ് ചെയ്ത് അയച്ചാൽ Gemini-ക്ക് മുമ്പ് PCM ആയി ഡീകോഡ് ചെയ്യുന്നു
+    codec = request.args.get('codec', 'pcm')
+    if codec not in audio_codec.CODECS:
+        print(f"Rejecting client: unknown codec '{codec}'")
+        ws.close()
+        return
+    
+    # ക്ലയിൻ്റ് VAD ഗേറ്റിംഗ് ഉപയോഗിക്കുന്നുവെങ്കിൽ activity സന്ദേശങ്ങൾ Gemini-ലേക്ക് കൈമാറുന്നു
+    gating = request.args.get('gating', '0') == '1'
+    
     # 1. Gemini Live Service ആരംഭിക്കുന്നു
-    service = GeminiLiveService(client_ws=ws, api_key=GEMINI_API_KEY)
+    service = GeminiLiveService(client_ws=ws, api_key=GEMINI_API_KEY, manual_activity=gating)
+    
+    # ഡീകോഡ് ചെയ്ത PCM ലഭ്യമാകുന്ന ഉടൻ Gemini-ലേക്ക് കൈമാറുന്നു
+    decoder = audio_codec.StreamDecoder(codec, rate=16000, on_output=service.send_audio_to_gemini)
     
     # 2. Gemini API-യിലേക്കുള്ള കണക്ഷൻ ഒരു ബാക്ക്ഗ്രൗണ്ട് ത്രെഡിൽ ആരംഭിക്കുന്നു
     # ഇത് പ്രധാന ത്രെഡിന് ക്ലയിൻ്റിൽ നിന്ന് ലൈവ് ഓഡിയോ സ്വീകരിക്കുന്നത് തുടരാൻ അനുവദിക്കുന്നു
@@ -45,11 +64,22 @@ def live_proxy_session(ws):
                 break
             
             if isinstance(audio_data, bytes):
-                # ലഭിച്ച ഓഡിയോ chunk Gemini സർവീസിലേക്ക് കൈമാറുന്നു
-                service.send_audio_to_gemini(audio_data)
+                # ലഭിച്ച ഓഡിയോ chunk PCM ആക്കി Gemini സർവീസിലേക്ക് കൈമാറുന്നു
+                decoder.write(audio_data)
             else:
-                 # ടെക്സ്റ്റ് ഡാറ്റ വന്നാൽ (ഉദാഹരണത്തിന് സ്റ്റോപ്പ് കമാൻഡ്)
-                print(f"Received non-audio data: {audio_data}")
+                # ടെക്സ്റ്റ് ഡാറ്റ: activity_start / activity_end കൺട്രോൾ സന്ദേശങ്ങൾ
+                try:
+                    control = json.loads(audio_data).get('type')
+                except (ValueError, AttributeError):
+                    control = None
+                if gating and control in ('activity_start', 'activity_end'):
+                    if control == 'activity_end':
+                        # ക്ലയിൻ്റ് ഓരോ സംസാരവും പ്രത്യേക സ്ട്രീമായി എൻകോഡ് ചെയ്യുന്നു: ഡീകോഡർ
+                        # ഫ്ലഷ് ചെയ്ത് അവസാന PCM-ഉം ക്യൂവിൽ ചേർത്ത ശേഷമേ activity_end അയയ്ക്കൂ
+                        decoder.flush()
+                    service.send_activity(control)
+                else:
+                    print(f"Received non-audio data: {audio_data}")
                 
 
         except Exception as e:
@@ -58,6 +88,11 @@ def live_proxy_session(ws):
             break
 
     # 4. ക്ലയിൻ്റ് ഡിസ്കണക്ട് ചെയ്യുമ്പോൾ ക്ലീനപ്പ്
+    tail = decoder.close()
+    if tail:
+        service.send_audio_to_gemini(tail)
+    if codec != 'pcm':
+        print(f"Uplink ({codec}): {decoder.stats.summary()}")
     service.close_session() # Gemini സർവീസിനോട് സ്ട്രീമിംഗ് നിർത്താൻ പറയുന്നു
     service_thread.join()   # Gemini ത്രെഡ് പൂർത്തിയാക്കാൻ കാത്തിരിക്കുന്നു
     print("--- Client Disconnected. Session Ended ---")
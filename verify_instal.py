@@ -10,7 +10,8 @@ def check_imports():
         'pyaudio': 'PyAudio',
         'webrtcvad': 'WebRTC VAD',
         'dotenv': 'Python-dotenv',
-        'pydub': 'Pydub'
+        'pydub': 'Pydub',
+        'miniaudio': 'miniaudio (in-process MP3 decoding)'
     }
     
     print("Checking installed packages...\n")
@@ -21,6 +22,13 @@ def check_imports():
         except ImportError:
             print(f"✗ {name}: NOT INSTALLED")
     
+    # ffmpeg is a system package: codecs, pydub and the MP3 fallback need it
+    import shutil
+    if shutil.which('ffmpeg'):
+        print("✓ ffmpeg: Installed")
+    else:
+        print("✗ ffmpeg: NOT INSTALLED (apt install ffmpeg / brew install ffmpeg)")
+    
     print("\n" + "="*50)
     print("Python Version:", sys.version)
     
@@ -1,20 +1,10 @@
 import os
-import queue
-import pyaudio
 from google.cloud import speech
-from gtts import gTTS
-from playsound import playsound
-from google import genai
+from modules.llm_gateway import get_gateway
 import chromadb
 from chromadb.utils import embedding_functions
-
-# ------------------ TTS ------------------
-def speak_malayalam(text):
-    tts = gTTS(text=text, lang='ml')
-    filename = "response.mp3"
-    tts.save(filename)
-    playsound(filename)
-    os.remove(filename)
+from modules.microphone_stream import MicrophoneStream
+from modules.tts import speak_malayalam
 
 # ------------------ Gemini + RAG ------------------
 def gemini_response(user_text):
@@ -50,66 +40,12 @@ def gemini_response(user_text):
     """
 
     # Call Gemini
-    client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=prompt
-    )
-
-    return response.text
+    return get_gateway(os.getenv("GEMINI_API_KEY")).generate(prompt, model="gemini-2.5-flash")
 
 # ------------------ Real-time STT ------------------
 RATE = 16000
 CHUNK = int(RATE / 10)  # 100ms
 
-class MicrophoneStream:
-    """Opens a recording stream as a generator yielding audio chunks."""
-    def __init__(self, rate, chunk):
-        self._rate = rate
-        self._chunk = chunk
-        self._buff = queue.Queue()
-        self.closed = True
-
-    def __enter__(self):
-        self._audio_interface = pyaudio.PyAudio()
-        self._audio_stream = self._audio_interface.open(
-            format=pyaudio.paInt16,
-            channels=1,
-            rate=self._rate,
-            input=True,
-            frames_per_buffer=self._chunk,
-            stream_callback=self._fill_buffer,
-        )
-        self.closed = False
-        return self
-
-    def __exit__(self, type, value, traceback):
-        self._audio_stream.stop_stream()
-        self._audio_stream.close()
-        self.closed = True
-        self._buff.put(None)
-        self._audio_interface.terminate()
-
-    def _fill_buffer(self, in_data, frame_count, time_info, status_flags):
-        self._buff.put(in_data)
-        return None, pyaudio.paContinue
-
-    def generator(self):
-        while not self.closed:
-            chunk = self._buff.get()
-            if chunk is None:
-                return
-            data = [chunk]
-            while True:
-                try:
-                    chunk = self._buff.get(block=False)
-                    if chunk is None:
-                        return
-                    data.append(chunk)
-                except queue.Empty:
-                    break
-            yield b''.join(data)
-
 def listen_print_loop(responses):
     """Iterates through server responses and sends final transcript to Gemini + TTS"""
     for response in responses: